@@ -0,0 +1,184 @@
+import os
+import numpy as np
+import pandas as pd
+
+from pipeline import Pipeline, PIPELINE_CACHE_DIR, file_fingerprint
+from feature_matrix import FEATURE_COLUMNS, build_feature_matrix
+
+# 🔍 Ramos relevantes dos arquivos DAOD_HION14
+HION_BRANCHES = [
+    "MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi", "MuonsAuxDyn.charge",
+    "MuonSpectrometerTrackParticlesAuxDyn.qOverP",
+    "CaloSumsAuxDyn.et", "EventInfoAuxDyn.CentralityMin", "EventInfoAuxDyn.CentralityMax",
+    "InDetTrackParticlesAuxDyn.qOverP",
+    "PrimaryVerticesAuxDyn.x", "PrimaryVerticesAuxDyn.y", "PrimaryVerticesAuxDyn.z"
+]
+
+
+def load_events(dataset_path, branches, entry_stop, fingerprint, tree_name="CollectionTree"):
+    """
+    Abre o arquivo ROOT e lê os ramos disponíveis (arrays jagged do awkward).
+
+    :param dataset_path: Arquivo local ou URL (http://, root://), lida só nos baskets dos ramos pedidos.
+    :param fingerprint: Só entra na chave do cache (muda quando o arquivo muda).
+    """
+    from remote_source import open_root
+
+    with open_root(dataset_path) as file:
+        if tree_name not in file:
+            raise ValueError(f"🚨 Árvore {tree_name} não encontrada no arquivo!")
+        tree = file[tree_name]
+
+        valid_branches = [b for b in branches if b in tree.keys()]
+        print(f"🔹 Usando os ramos disponíveis: {valid_branches}")
+        if not valid_branches:
+            raise ValueError("🚨 Nenhum ramo válido encontrado para análise!")
+
+        return tree.arrays(valid_branches, library="ak", entry_stop=entry_stop)
+
+
+def flatten_events(events, verbose=True):
+    """
+    Reduz cada ramo a um valor por evento (média das listas) e preenche ausentes com 0.
+
+    Equivalente vetorizado do antigo tratar_lista aplicado célula a célula.
+    """
+    import awkward as ak
+
+    colunas = {}
+    for field in events.fields:
+        arr = events[field]
+        if arr.ndim > 1:
+            arr = ak.mean(arr, axis=1)
+        colunas[field] = ak.to_numpy(ak.fill_none(arr, np.nan)).astype(np.float64)
+
+    data = pd.DataFrame(colunas).fillna(0)
+    if verbose:
+        print(f"\n✅ Total de eventos após tratamento: {len(data)}")
+    return data
+
+
+def derive_variables(data):
+    """Cria as variáveis derivadas usadas nas análises."""
+    data = data.copy()
+    data["energia_total"] = data["CaloSumsAuxDyn.et"]
+    data["pT_medio"] = data["MuonsAuxDyn.pt"]
+    return data
+
+
+def statistical_tests(data, seed):
+    """KS e Anderson-Darling contra a simulação do Modelo Padrão, e correlação pT x Energia."""
+    from scipy.stats import ks_2samp, pearsonr, anderson_ksamp
+
+    num_eventos = len(data)
+    muon_pt_sim = np.random.default_rng(seed).normal(50, 10, size=num_eventos)
+
+    ks_stat, p_value = ks_2samp(data["pT_medio"].sample(num_eventos, random_state=seed), muon_pt_sim)
+    ad_result = anderson_ksamp([data["pT_medio"], muon_pt_sim])
+    corr, p_corr = pearsonr(data["pT_medio"], data["energia_total"])
+
+    return {
+        "ks_stat": float(ks_stat), "p_value": float(p_value),
+        "ad_stat": float(ad_result.statistic), "ad_significance": float(ad_result.significance_level),
+        "corr": float(corr), "p_corr": float(p_corr),
+    }
+
+
+def embed(data, matrix_path, knn_cache_dir, methods):
+    """Projeções não lineares em paralelo sobre a matriz de features compartilhada."""
+    from embeddings import run_embeddings_parallel
+
+    build_feature_matrix(data, FEATURE_COLUMNS, matrix_path)
+    return run_embeddings_parallel(matrix_path, methods=tuple(methods), knn_cache_dir=knn_cache_dir)
+
+
+def cluster(data, matrix_path, knn_cache_dir, min_cluster_size):
+    """HDBSCAN sobre o grafo kNN compartilhado."""
+    from hdbscan import HDBSCAN
+    from knn_graph import build_knn_graph, connect_knn_components, knn_sparse_graph
+
+    features = np.array(build_feature_matrix(data, FEATURE_COLUMNS, matrix_path))
+    indices, distances = build_knn_graph(features, n_neighbors=max(min_cluster_size, 15), cache_dir=knn_cache_dir)
+    grafo = connect_knn_components(knn_sparse_graph(indices, distances), features)
+    return HDBSCAN(min_cluster_size=min_cluster_size, metric="precomputed").fit_predict(grafo)
+
+
+def plot_projections(data, projecoes):
+    """Figuras 3D (Plotly) de cada projeção, coloridas pela energia."""
+    import plotly.express as px
+
+    nomes = {"tsne": ("TSNE", "t-SNE"), "umap": ("UMAP", "UMAP"), "isomap": ("ISOMAP", "Isomap")}
+    figuras = {}
+    for method, resultado in projecoes.items():
+        prefixo, titulo = nomes[method]
+        colunas = [f"{prefixo}{i + 1}" for i in range(resultado.shape[1])]
+        df = pd.DataFrame(resultado, columns=colunas)
+        df["energia"] = data["energia_total"].to_numpy()
+        figuras[method] = px.scatter_3d(df, x=colunas[0], y=colunas[1], z=colunas[2], color="energia",
+                                        title=f"Projeção 3D via {titulo}")
+    return figuras
+
+
+def auto_entry_stop(dataset_path, branches, tree_name="CollectionTree"):
+    """
+    Quantos eventos cabem no orçamento de memória (MemoryGovernor), pelos metadados dos ramos.
+
+    O valor entra na chave de cache de todos os estágios, então precisa ser
+    estável entre execuções: None se o arquivo inteiro cabe; sem
+    HEP_MEMORY_BUDGET (orçamento tirado da memória livre, que varia), é
+    arredondado para baixo até uma potência de 2.
+    """
+    from memory_governor import MEMORY_BUDGET_ENV, MemoryGovernor
+    from remote_source import open_root
+
+    with open_root(dataset_path) as file:
+        tree = file[tree_name]
+        valid_branches = [b for b in branches if b in tree.keys()]
+        governor = MemoryGovernor()
+        entry_stop = governor.entry_stop(tree, valid_branches)
+        num_entries = tree.num_entries
+
+    if entry_stop >= num_entries:
+        print(f"🔹 Os {num_entries} eventos cabem no orçamento ({governor}).")
+        return None
+    if not os.environ.get(MEMORY_BUDGET_ENV):
+        entry_stop = 1 << (entry_stop.bit_length() - 1)
+    print(f"🔹 {entry_stop} de {num_entries} eventos cabem no orçamento ({governor}).")
+    return entry_stop
+
+
+def build_analysis_pipeline(dataset_path, branches=HION_BRANCHES, entry_stop="auto", cache_dir=PIPELINE_CACHE_DIR,
+                            matrix_path="cache/features_main.npy", knn_cache_dir="cache/knn"):
+    """
+    Monta o DAG padrão: load → flatten → derive → (test, embed → plot, cluster).
+
+    :param dataset_path: Arquivo ROOT de entrada (local ou URL remota).
+    :param branches: Ramos a ler.
+    :param entry_stop: Limite de eventos (None = arquivo inteiro, "auto" = escolhido pelo orçamento de memória).
+    :param cache_dir: Diretório do cache dos estágios.
+    :param matrix_path: Arquivo .npy da matriz de features (embed e cluster usam cópias com sufixo próprio).
+    :param knn_cache_dir: Diretório do cache do grafo kNN.
+    :return: Pipeline pronto para run().
+    """
+    if entry_stop == "auto":
+        entry_stop = auto_entry_stop(dataset_path, branches)
+
+    # Cada estágio escreve a própria matriz: embed e cluster podem rodar em processos diferentes
+    base, extensao = os.path.splitext(matrix_path)
+
+    pipeline = Pipeline(cache_dir=cache_dir)
+    pipeline.add("load", load_events, params={
+        "dataset_path": dataset_path, "branches": list(branches), "entry_stop": entry_stop,
+        "fingerprint": file_fingerprint(dataset_path),
+    }, persist=False)
+    pipeline.add("flatten", flatten_events, deps=["load"])
+    pipeline.add("derive", derive_variables, deps=["flatten"])
+    pipeline.add("test", statistical_tests, deps=["derive"], params={"seed": 42})
+    pipeline.add("embed", embed, deps=["derive"], params={
+        "matrix_path": f"{base}_embed{extensao}", "knn_cache_dir": knn_cache_dir, "methods": ["tsne", "umap", "isomap"],
+    })
+    pipeline.add("cluster", cluster, deps=["derive"], params={
+        "matrix_path": f"{base}_cluster{extensao}", "knn_cache_dir": knn_cache_dir, "min_cluster_size": 10,
+    })
+    pipeline.add("plot", plot_projections, deps=["derive", "embed"])
+    return pipeline
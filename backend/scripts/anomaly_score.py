@@ -0,0 +1,165 @@
+import os
+import heapq
+import pickle
+import numpy as np
+import pandas as pd
+
+# Modelo e ranking salvos junto dos dados processados
+ANOMALY_DIR = "/app/data/processed_parquet_parts/_anomaly"
+ANOMALY_MODEL_FILE = "isolation_forest.pkl"
+TOP_ANOMALIES_FILE = "top_anomalies.parquet"
+
+# Features pontuadas (mesmas de processed_parquet.FEATURE_COLUMNS). A isolation forest
+# corta cada feature dentro do seu intervalo, então não precisa de padronização
+ANOMALY_COLUMNS = ["MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"]
+
+# Amostra usada no ajuste, tamanho dos blocos pontuados e eventos mantidos no ranking
+ANOMALY_SAMPLE_SIZE = 200_000
+ANOMALY_CHUNK_ROWS = 100_000
+ANOMALY_TOP_N = 1000
+
+
+def sample_events(files, columns=ANOMALY_COLUMNS, sample_size=ANOMALY_SAMPLE_SIZE, seed=42):
+    """
+    Amostra uniforme de eventos de vários Parquet, lendo só as colunas pedidas.
+
+    O número de linhas de cada arquivo vem dos metadados; cada arquivo
+    contribui proporcionalmente ao seu tamanho.
+
+    :param files: Arquivos Parquet.
+    :param columns: Colunas lidas.
+    :param sample_size: Tamanho total da amostra.
+    :param seed: Semente.
+    :return: DataFrame com a amostra.
+    """
+    import pyarrow.parquet as pq
+
+    linhas = np.array([pq.ParquetFile(f).metadata.num_rows for f in files], dtype=np.int64)
+    total = int(linhas.sum())
+    rng = np.random.default_rng(seed)
+    escolhidas = np.sort(rng.choice(total, size=min(sample_size, total), replace=False))
+    inicios = np.concatenate([[0], np.cumsum(linhas)[:-1]])
+
+    partes = []
+    for path, inicio, n in zip(files, inicios, linhas):
+        locais = escolhidas[(escolhidas >= inicio) & (escolhidas < inicio + n)] - inicio
+        if len(locais):
+            partes.append(pq.read_table(path, columns=columns).take(locais).to_pandas())
+    return pd.concat(partes, ignore_index=True)
+
+
+def fit_anomaly_model(files, columns=ANOMALY_COLUMNS, sample_size=ANOMALY_SAMPLE_SIZE, seed=42,
+                      model_dir=ANOMALY_DIR):
+    """
+    Ajusta a isolation forest uma única vez, numa amostra de todo o dataset, e salva o modelo.
+
+    :param files: Arquivos Parquet de entrada.
+    :param columns: Features usadas.
+    :param sample_size: Tamanho da amostra de ajuste.
+    :param seed: Semente (amostra e árvores).
+    :param model_dir: Diretório onde o modelo é salvo.
+    :return: Modelo ajustado.
+    """
+    from sklearn.ensemble import IsolationForest
+
+    amostra = sample_events(files, columns, sample_size, seed)
+    X = np.nan_to_num(amostra[columns].to_numpy(dtype=np.float32))
+    print(f"⚠️ Ajustando isolation forest em {len(X)} eventos...")
+    model = IsolationForest(n_estimators=200, max_samples=256, random_state=seed, n_jobs=-1).fit(X)
+    # O n_jobs do modelo só vale no ajuste; a pontuação define o próprio paralelismo (score_events)
+    model.set_params(n_jobs=1)
+
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, ANOMALY_MODEL_FILE), "wb") as f:
+        pickle.dump({"columns": list(columns), "model": model}, f)
+    print("✅ Modelo de anomalia salvo.")
+    return model
+
+
+def load_anomaly_model(model_dir=ANOMALY_DIR):
+    """Modelo salvo por fit_anomaly_model, ou None se não existir."""
+    path = os.path.join(model_dir, ANOMALY_MODEL_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)["model"]
+
+
+def score_events(model, X, chunk_rows=ANOMALY_CHUNK_ROWS, n_jobs=None):
+    """
+    Pontua os eventos em blocos, com as árvores de cada bloco em paralelo (maior = mais anômalo).
+
+    Só o percurso de cada árvore (Tree.apply, em Cython) libera o GIL; a
+    validação da entrada e a soma das profundidades seguram o GIL. Por isso o
+    paralelismo é o que o scikit-learn prevê para score_samples: uma thread
+    por árvore (backend threading do joblib) dentro de cada bloco, sem copiar
+    o modelo nem os dados entre processos. Versões do scikit-learn sem esse
+    suporte pontuam em sequência.
+
+    :param model: Isolation forest ajustada.
+    :param X: Matriz (n_eventos, n_features) ou DataFrame com as features.
+    :param chunk_rows: Eventos por bloco.
+    :param n_jobs: Número de threads por bloco (padrão: núcleos).
+    :return: Array float32 com o anomaly_score de cada evento.
+    """
+    from joblib import parallel_backend
+
+    X = np.nan_to_num(np.asarray(X, dtype=np.float32))
+    scores = np.empty(len(X), dtype=np.float32)
+    with parallel_backend("threading", n_jobs=n_jobs or os.cpu_count() or 1):
+        for i in range(0, len(X), chunk_rows):
+            scores[i:i + chunk_rows] = -model.score_samples(X[i:i + chunk_rows])
+    return scores
+
+
+class TopAnomalies:
+    """
+    Os N eventos mais anômalos do dataset, mantidos num heap de tamanho fixo.
+
+    Cada bloco só entra no heap depois de reduzido aos seus N maiores scores
+    que superam o menor score do heap, então a memória não cresce com o
+    dataset.
+    """
+
+    def __init__(self, n=ANOMALY_TOP_N):
+        self.n = n
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, scores, file, rows=None):
+        """
+        Oferece os scores de um bloco ao ranking.
+
+        :param scores: anomaly_score dos eventos.
+        :param file: Arquivo de origem.
+        :param rows: Linhas dos eventos no arquivo (padrão: 0..len(scores)-1).
+        """
+        scores = np.asarray(scores, dtype=np.float32)
+        rows = np.arange(len(scores)) if rows is None else np.asarray(rows)
+        if len(self.heap) >= self.n:
+            acima = np.flatnonzero(scores > self.heap[0][0])
+            scores, rows = scores[acima], rows[acima]
+        if len(scores) > self.n:
+            maiores = np.argpartition(scores, -self.n)[-self.n:]
+            scores, rows = scores[maiores], rows[maiores]
+
+        for score, row in zip(scores.tolist(), rows.tolist()):
+            item = (score, file, row)
+            if len(self.heap) < self.n:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+
+    def to_frame(self):
+        """Ranking em ordem decrescente de anomaly_score."""
+        return pd.DataFrame(sorted(self.heap, reverse=True), columns=["anomaly_score", "file", "row"])
+
+    def save(self, output_dir=ANOMALY_DIR):
+        """Grava o ranking em TOP_ANOMALIES_FILE e devolve o caminho."""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, TOP_ANOMALIES_FILE)
+        self.to_frame().to_parquet(path, index=False)
+        print(f"✅ Top {len(self)} eventos anômalos salvos: {path}")
+        return path
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import traceback
+import subprocess
+from collections import deque
+import numpy as np
+
+# Resultados (um .npz por conjunto de parâmetros) e progresso dos jobs do dashboard
+JOB_CACHE_DIR = os.environ.get("HEP_JOB_CACHE_DIR", "/app/data/dashboard_jobs")
+
+# Jobs executados ao mesmo tempo (cada um num processo próprio)
+JOB_WORKERS = 1
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+
+def job_key(kind, params, input_fingerprint):
+    """Chave do resultado: tipo do job, parâmetros e dados de entrada."""
+    conteudo = json.dumps({"kind": kind, "params": params, "input": input_fingerprint}, sort_keys=True)
+    return hashlib.sha256(conteudo.encode()).hexdigest()[:20]
+
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+class Progress:
+    """Progresso de um job, gravado num .json que o processo do dashboard lê a cada consulta."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, fraction, message=""):
+        _write_json(self.path, {"state": "running", "progress": float(fraction), "message": message})
+
+
+def recluster_job(matrix_path, progress, min_cluster_size=10, min_samples=None):
+    """
+    HDBSCAN sobre o grafo kNN da matriz, via a árvore salva de hdbscan_sweep.
+
+    Com min_samples fixo (padrão SWEEP_MIN_SAMPLES, o valor do pipeline),
+    testar outro min_cluster_size reaproveita a árvore já calculada e só
+    refaz a condensação.
+
+    :return: Dicionário {"cluster": rótulos}.
+    """
+    from feature_matrix import load_feature_matrix
+    from hdbscan_sweep import HDBSCANSweep, SWEEP_MIN_SAMPLES, SWEEP_N_NEIGHBORS
+
+    X = np.array(load_feature_matrix(matrix_path))
+    min_samples = int(min_samples or SWEEP_MIN_SAMPLES)
+    sweep = HDBSCANSweep(X, n_neighbors=max(SWEEP_N_NEIGHBORS, min_samples + 1),
+                         knn_cache_dir=os.path.join(JOB_CACHE_DIR, "knn"),
+                         tree_dir=os.path.join(JOB_CACHE_DIR, "hdbscan_trees"))
+    progress(0.1, "Grafo kNN")
+    sweep.graph()
+    progress(0.4, "Árvore HDBSCAN")
+    sweep.tree(min_samples)
+    progress(0.9, "Clusters")
+    labels, _, _ = sweep.cluster(int(min_cluster_size), min_samples)
+    return {"cluster": labels}
+
+
+def reembed_job(matrix_path, progress, n_neighbors=50, min_dist=0.02):
+    """
+    UMAP 3D sobre a matriz, com o grafo kNN pré-computado.
+
+    :return: Dicionário {"U1", "U2", "U3"}.
+    """
+    import umap
+    from feature_matrix import load_feature_matrix
+    from knn_graph import build_knn_graph, umap_precomputed_knn
+
+    X = np.array(load_feature_matrix(matrix_path))
+    n_neighbors = int(n_neighbors)
+    progress(0.1, "Grafo kNN")
+    indices, distances = build_knn_graph(X, n_neighbors=n_neighbors, cache_dir=os.path.join(JOB_CACHE_DIR, "knn"))
+    progress(0.3, "UMAP")
+    reducer = umap.UMAP(n_neighbors=n_neighbors, min_dist=float(min_dist), n_components=3, random_state=42,
+                        precomputed_knn=umap_precomputed_knn(indices, distances, n_neighbors))
+    embedding = reducer.fit_transform(X).astype(np.float32)
+    return {"U1": embedding[:, 0], "U2": embedding[:, 1], "U3": embedding[:, 2]}
+
+
+JOBS = {
+    "recluster": recluster_job,
+    "reembed": reembed_job,
+}
+
+
+def _run_job(kind, matrix_path, params, output_path, progress_path):
+    # Executado no processo do job
+    progress = Progress(progress_path)
+    try:
+        progress(0.0, "Iniciando")
+        resultado = JOBS[kind](matrix_path, progress, **params)
+        with open(output_path + ".tmp", "wb") as f:
+            np.savez(f, **resultado)
+        os.replace(output_path + ".tmp", output_path)
+        _write_json(progress_path, {"state": "done", "progress": 1.0, "message": "Concluído"})
+    except Exception as e:
+        _write_json(progress_path, {"state": "failed", "progress": 0.0, "message": str(e),
+                                    "traceback": traceback.format_exc()})
+
+
+class JobQueue:
+    """
+    Fila de jobs longos (reclusterização, reprojeção) fora do processo do servidor.
+
+    Cada job roda num interpretador novo (este módulo executado como
+    script): um fork herdaria as threads do servidor, e o spawn do
+    multiprocessing reimportaria o __main__ do dashboard, carregando os
+    dados de novo. O job reporta o progresso num .json e cancelar encerra
+    o processo. O resultado fica em
+    cache por (tipo, parâmetros, entrada): pedir de novo um conjunto já
+    calculado devolve o job concluído imediatamente. Os métodos podem ser
+    chamados de várias threads (callbacks do Dash em paralelo).
+    """
+
+    def __init__(self, cache_dir=JOB_CACHE_DIR, max_workers=JOB_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._jobs = {}
+        self._pending = deque()
+        # Reentrante: submit, status e cancel chamam _schedule com o lock já adquirido
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz"), os.path.join(self.cache_dir, f"{key}.progress.json")
+
+    def submit(self, kind, matrix_path, input_fingerprint, **params):
+        """
+        Enfileira um job (ou reaproveita o resultado em cache).
+
+        :param kind: Tipo do job (chave de JOBS).
+        :param matrix_path: Matriz de entrada (.npy).
+        :param input_fingerprint: Identificação do conteúdo da matriz.
+        :param params: Parâmetros do job.
+        :return: Chave do job (também a chave do resultado).
+        """
+        if kind not in JOBS:
+            raise ValueError(f"🚨 Job desconhecido: {kind}. Use um de {list(JOBS)}.")
+        key = job_key(kind, params, input_fingerprint)
+        output, _ = self._paths(key)
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if os.path.exists(output):
+                self._jobs[key] = {"kind": kind, "params": params, "state": "done", "process": None}
+            elif job is None or job["state"] in ("failed", "cancelled"):
+                self._jobs[key] = {"kind": kind, "params": params, "matrix_path": matrix_path,
+                                   "state": "queued", "process": None, "submitted": time.time()}
+                self._pending.append(key)
+            self._schedule()
+        return key
+
+    def _schedule(self):
+        # Recolhe processos encerrados e inicia os próximos da fila
+        with self._lock:
+            for key, job in self._jobs.items():
+                processo = job["process"]
+                if processo is not None and processo.poll() is not None:
+                    job["process"] = None
+                    if job["state"] == "running":
+                        job["state"] = self._read_progress(key).get("state", "failed")
+                        if job["state"] == "running":
+                            job["state"] = "failed"
+
+            rodando = sum(job["state"] == "running" for job in self._jobs.values())
+            while self._pending and rodando < self.max_workers:
+                key = self._pending.popleft()
+                job = self._jobs[key]
+                if job["state"] != "queued":
+                    continue
+                output, progress = self._paths(key)
+                job["process"] = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__), job["kind"], job["matrix_path"],
+                     json.dumps(job["params"]), output, progress],
+                    env={**os.environ, "PYTHONPATH": os.pathsep.join(p for p in sys.path if p)})
+                job["state"] = "running"
+                rodando += 1
+
+    def _read_progress(self, key):
+        _, progress = self._paths(key)
+        try:
+            with open(progress, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def status(self, key):
+        """
+        Estado de um job.
+
+        :param key: Chave devolvida por submit.
+        :return: Dicionário com state, progress e message.
+        """
+        with self._lock:
+            self._schedule()
+            job = self._jobs.get(key)
+            if job is None:
+                return {"state": "unknown", "progress": 0.0, "message": ""}
+            if job["state"] == "running":
+                # O processo pode já ter gravado o estado final antes de encerrar
+                progresso = self._read_progress(key)
+                return {"state": progresso.get("state", "running"), "progress": progresso.get("progress", 0.0),
+                        "message": progresso.get("message", "")}
+            if job["state"] == "failed":
+                return {"state": "failed", "progress": 0.0, "message": self._read_progress(key).get("message", "")}
+            if job["state"] == "queued":
+                return {"state": "queued", "progress": 0.0, "message": f"{self._pending.index(key) + 1}º na fila"}
+            return {"state": job["state"], "progress": 1.0 if job["state"] == "done" else 0.0, "message": ""}
+
+    def cancel(self, key):
+        """Cancela um job na fila ou em execução."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job["state"] not in ("queued", "running"):
+                return
+            if job["process"] is not None:
+                job["process"].terminate()
+                job["process"].wait()
+                job["process"] = None
+            if key in self._pending:
+                self._pending.remove(key)
+            job["state"] = "cancelled"
+            self._schedule()
+
+    def result(self, key):
+        """Resultado de um job concluído (dicionário de arrays)."""
+        output, _ = self._paths(key)
+        with np.load(output) as data:
+            return {k: data[k] for k in data.files}
+
+    def shutdown(self):
+        """Cancela tudo o que estiver na fila ou rodando."""
+        for key in list(self._jobs):
+            self.cancel(key)
+
+
+if __name__ == "__main__":
+    # Processo de um job: kind, matriz, parâmetros (JSON), saída e arquivo de progresso
+    kind, matrix_path, params, output_path, progress_path = sys.argv[1:6]
+    _run_job(kind, matrix_path, json.loads(params), output_path, progress_path)
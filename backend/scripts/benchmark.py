@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+
+import metrics
+from metrics import track
+from synthetic_data import generate_dataset
+
+# Diretório dos resultados (um JSON por execução, para comparar entre versões)
+BENCHMARK_DIR = "/app/data/benchmarks"
+
+# Diretório de trabalho (arquivos sintéticos, Parquet e caches gerados pelo benchmark)
+BENCHMARK_WORK_DIR = "/app/data/benchmark_work"
+
+# Tamanho padrão do benchmark
+BENCHMARK_CONFIG = {
+    "n_files": 2,
+    "n_events": 100_000,
+    "physlite_events": 100_000,
+    "embedding_events": 20_000,
+    "clustering_events": 50_000,
+    "n_replicates": 2000,
+    "callback_calls": 50,
+    "seed": 42,
+}
+
+# Variação relativa do tempo a partir da qual a comparação aponta regressão
+REGRESSION_TOLERANCE = 0.10
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_startup(ctx):
+    """Tempo de import dos módulos num interpretador novo (por módulo em extra)."""
+    from hep.startup import STARTUP_MODULES, import_times
+
+    tempos = import_times(STARTUP_MODULES, repeat=3)
+    ctx["extra"]["startup"] = {f"import_{m}_s": s for m, s in tempos.items()}
+    return len(STARTUP_MODULES)
+
+
+def bench_conversion(ctx):
+    """ROOT → Parquet: leitura com uproot, achatamento, gravação e sketches de quantis."""
+    import uproot
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from analysis_pipeline import HION_BRANCHES, flatten_events
+    from quantile_sketch import build_column_sketches, save_sketches, sketch_path_for
+
+    parquet_dir = os.path.join(ctx["work_dir"], "parquet")
+    os.makedirs(parquet_dir, exist_ok=True)
+    ctx["parquet_files"], total = [], 0
+
+    for path in ctx["hion_files"]:
+        with uproot.open(path) as file:
+            events = file["CollectionTree"].arrays(HION_BRANCHES, library="ak")
+        data = flatten_events(events)
+
+        output = os.path.join(parquet_dir, os.path.basename(path).replace(".root.1", ".parquet"))
+        pq.write_table(pa.Table.from_pandas(data), output)
+        save_sketches(build_column_sketches(data), sketch_path_for(output))
+
+        ctx["parquet_files"].append(output)
+        total += len(data)
+    return total
+
+
+def bench_flatten(ctx):
+    """Só o achatamento (média por evento dos ramos jagged), com os dados já em memória."""
+    import uproot
+    from analysis_pipeline import HION_BRANCHES, flatten_events
+
+    with uproot.open(ctx["hion_files"][0]) as file:
+        events = file["CollectionTree"].arrays(HION_BRANCHES, library="ak")
+
+    inicio = time.perf_counter()
+    ctx["data"] = flatten_events(events)
+    ctx["extra"]["flatten"] = {"flatten_only_s": round(time.perf_counter() - inicio, 6)}
+    return len(ctx["data"])
+
+
+def bench_truth_selection(ctx):
+    """Seleção vetorizada de eventos SUSY nos ramos de truth (PHYSLITE)."""
+    from truth_selector import select_truth_events
+
+    selecionados = select_truth_events(ctx["physlite_files"])
+    ctx["extra"]["truth_selection"] = {"selected": len(selecionados)}
+    return ctx["config"]["physlite_events"] * len(ctx["physlite_files"])
+
+
+def _feature_matrix(ctx, n, name):
+    from feature_matrix import FEATURE_COLUMNS, build_feature_matrix
+
+    data = ctx["data"]
+    data = data.assign(pT_medio=data["MuonsAuxDyn.pt"], energia_total=data["CaloSumsAuxDyn.et"])
+    amostra = data.sample(min(n, len(data)), random_state=ctx["config"]["seed"])
+    path = os.path.join(ctx["work_dir"], f"features_{name}.npy")
+    build_feature_matrix(amostra, FEATURE_COLUMNS, path)
+    return path, amostra
+
+
+def bench_embedding(ctx):
+    """UMAP 3D sobre a matriz de features padronizada."""
+    from embeddings import run_embedding
+
+    path, amostra = _feature_matrix(ctx, ctx["config"]["embedding_events"], "embedding")
+    _, ctx["embedding"] = run_embedding("umap", path)
+    return len(amostra)
+
+
+def bench_clustering(ctx):
+    """Grafo kNN (NN-descent) + HDBSCAN sobre o grafo esparso."""
+    from hdbscan import HDBSCAN
+    from knn_graph import build_knn_graph, connect_knn_components, knn_sparse_graph
+
+    path, amostra = _feature_matrix(ctx, ctx["config"]["clustering_events"], "clustering")
+    features = np.array(np.load(path, mmap_mode="r"))
+    indices, distances = build_knn_graph(features, n_neighbors=15, cache_dir=os.path.join(ctx["work_dir"], "knn"))
+    grafo = connect_knn_components(knn_sparse_graph(indices, distances), features)
+    labels = HDBSCAN(min_cluster_size=10, metric="precomputed").fit_predict(grafo)
+    ctx["extra"]["clustering"] = {"n_clusters": int(labels.max() + 1)}
+    return len(amostra)
+
+
+def bench_statistics(ctx):
+    """Bootstrap e teste de permutação (KS) contra a simulação do Modelo Padrão."""
+    from resampling import bootstrap, permutation_test
+
+    config = ctx["config"]
+    pt = ctx["data"]["MuonsAuxDyn.pt"].to_numpy()
+    sim = np.random.default_rng(config["seed"]).normal(pt.mean(), pt.std(), size=len(pt))
+    bootstrap(pt, sim, statistic="ks", n_replicates=config["n_replicates"], seed=config["seed"])
+    resultado = permutation_test(pt, sim, statistic="ks", n_replicates=config["n_replicates"], seed=config["seed"])
+    ctx["extra"]["statistics"] = {"ks": resultado["statistic"], "pvalue": resultado["pvalue"]}
+    return 2 * config["n_replicates"] * len(pt)
+
+
+def bench_histograms(ctx):
+    """Preenchimento dos histogramas (com centralidade) a partir dos Parquet convertidos."""
+    from histograms import fill_parquet_file
+
+    for path in ctx["parquet_files"]:
+        fill_parquet_file(path)
+    return ctx["config"]["n_events"] * len(ctx["parquet_files"])
+
+
+def bench_dashboard_callback(ctx):
+    """Latência do callback update_figure do dashboard (percentis em extra)."""
+    import pandas as pd
+
+    processed_dir = os.path.join(ctx["work_dir"], "processed")
+    os.makedirs(processed_dir, exist_ok=True)
+    embedding = ctx["embedding"]
+    pd.DataFrame({"U1": embedding[:, 0], "U2": embedding[:, 1], "U3": embedding[:, 2],
+                  "cluster": np.arange(len(embedding)) % 10}).to_parquet(
+        os.path.join(processed_dir, "synthetic.parquet"), index=False)
+
+    # O dashboard carrega os dados ao ser importado
+    os.environ["HEP_PROCESSED_PARQUET_DIR"] = processed_dir
+    import visualize_data
+
+    eventos = np.linspace(0, len(visualize_data.df) - 1, ctx["config"]["callback_calls"]).astype(int)
+    latencias = []
+    for evento in eventos:
+        inicio = time.perf_counter()
+        visualize_data.update_figure(int(evento), None, None, None)
+        latencias.append(time.perf_counter() - inicio)
+
+    latencias = np.array(latencias)
+    ctx["extra"]["dashboard_callback"] = {
+        "p50_s": round(float(np.percentile(latencias, 50)), 6),
+        "p95_s": round(float(np.percentile(latencias, 95)), 6),
+        "max_s": round(float(latencias.max()), 6),
+    }
+    return int(sum(e + 1 for e in eventos))
+
+
+# Ordem importa: alguns casos usam o que os anteriores deixaram em ctx
+BENCHMARKS = {
+    "startup": bench_startup,
+    "conversion": bench_conversion,
+    "flatten": bench_flatten,
+    "truth_selection": bench_truth_selection,
+    "embedding": bench_embedding,
+    "clustering": bench_clustering,
+    "statistics": bench_statistics,
+    "histograms": bench_histograms,
+    "dashboard_callback": bench_dashboard_callback,
+}
+
+
+def run_benchmarks(config=None, work_dir=BENCHMARK_WORK_DIR, output_dir=BENCHMARK_DIR, cases=None):
+    """
+    Gera (ou reaproveita) o dataset sintético e mede cada caso do benchmark.
+
+    :param config: Sobrescreve valores de BENCHMARK_CONFIG.
+    :param work_dir: Diretório de trabalho.
+    :param output_dir: Diretório onde o resultado é salvo.
+    :param cases: Subconjunto de BENCHMARKS a executar (padrão: todos).
+    :return: Dicionário com o ambiente, a configuração e o resultado de cada caso.
+    """
+    config = {**BENCHMARK_CONFIG, **(config or {})}
+    cases = list(cases or BENCHMARKS)
+    metrics.METRICS_DIR = os.path.join(work_dir, "metrics")
+
+    synthetic_dir = os.path.join(work_dir, f"synthetic_{config['n_events']}_{config['seed']}")
+    ctx = {
+        "config": config, "work_dir": work_dir, "extra": {},
+        "hion_files": generate_dataset(synthetic_dir, n_files=config["n_files"], n_events=config["n_events"],
+                                       kind="hion14", seed=config["seed"]),
+        "physlite_files": generate_dataset(synthetic_dir, n_files=1, n_events=config["physlite_events"],
+                                           kind="physlite", seed=config["seed"]),
+    }
+
+    resultados = {}
+    for nome in cases:
+        print(f"⏱️ Benchmark: {nome}...")
+        try:
+            with track(f"benchmark_{nome}") as m:
+                m.add_rows(BENCHMARKS[nome](ctx))
+        except Exception as e:
+            print(f"❌ Benchmark {nome} falhou: {e}")
+            resultados[nome] = {"error": str(e)}
+            continue
+
+        resultados[nome] = {
+            "wall_s": round(m.wall, 6), "cpu_s": round(m.cpu, 6), "peak_rss_bytes": m.peak_rss,
+            "rows": m.rows, "rows_per_s": round(m.rows / m.wall, 3) if m.wall > 0 else None,
+            **ctx["extra"].get(nome, {}),
+        }
+        print(f"✅ {nome}: {m.wall:.3f}s, {resultados[nome]['rows_per_s']} linhas/s")
+
+    resultado = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": resultados,
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(resultado, f, indent=4)
+    print(f"💾 Resultado salvo: {path}")
+    return resultado
+
+
+def load_results(output_dir=BENCHMARK_DIR):
+    """Resultados salvos, do mais antigo para o mais recente."""
+    if not os.path.isdir(output_dir):
+        return []
+    resultados = []
+    for nome in sorted(os.listdir(output_dir)):
+        if nome.startswith("benchmark_") and nome.endswith(".json"):
+            with open(os.path.join(output_dir, nome)) as f:
+                resultados.append(json.load(f))
+    return resultados
+
+
+def compare_results(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compara o tempo de cada caso com uma execução anterior.
+
+    :param current: Resultado atual (saída de run_benchmarks).
+    :param baseline: Resultado de referência.
+    :param tolerance: Variação relativa tolerada antes de apontar regressão.
+    :return: Dicionário {caso: razão atual/referência}.
+    """
+    if current["config"] != baseline["config"]:
+        print("⚠️ Configurações diferentes entre as execuções; a comparação é só indicativa.")
+
+    razoes = {}
+    for nome, atual in current["results"].items():
+        anterior = baseline["results"].get(nome, {})
+        if "wall_s" not in atual or not anterior.get("wall_s"):
+            continue
+        razao = atual["wall_s"] / anterior["wall_s"]
+        razoes[nome] = razao
+        marca = "🔴" if razao > 1 + tolerance else "🟢" if razao < 1 - tolerance else "⚪"
+        print(f"{marca} {nome}: {anterior['wall_s']:.3f}s → {atual['wall_s']:.3f}s ({razao:.2f}x)")
+    return razoes
+
+
+if __name__ == "__main__":
+    anteriores = load_results()
+    atual = run_benchmarks()
+    if anteriores:
+        print(f"\n📊 Comparação com {anteriores[-1]['created']} ({anteriores[-1]['git_commit']}):")
+        compare_results(atual, anteriores[-1])
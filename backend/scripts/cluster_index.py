@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class ClusterIndex:
+    """
+    Índice dos eventos por cluster para filtros do dashboard sem varrer o DataFrame.
+
+    As linhas são ordenadas uma única vez por (cluster, event_id): cada
+    cluster vira uma faixa contígua e, dentro dela, o corte da linha do
+    tempo (event_id <= t) é um prefixo achado por busca binária. Uma seleção
+    de k clusters custa O(k log n) mais o tamanho do resultado, e a memória
+    é O(n), qualquer que seja o número de clusters (bitmaps por cluster
+    custariam n/8 bytes cada um). Sem filtro de cluster, uma segunda cópia
+    na ordem de event_id atende o corte da linha do tempo com uma fatia.
+    """
+
+    def __init__(self, df, columns=("U1", "U2", "U3", "cluster"), cluster_col="cluster", order_col="event_id"):
+        clusters = df[cluster_col].to_numpy()
+        ordem_eventos = df[order_col].to_numpy(dtype=np.int64)
+        ordem = np.lexsort((ordem_eventos, clusters))
+
+        self.clusters, inicios = np.unique(clusters[ordem], return_index=True)
+        self.starts = inicios.astype(np.int64)
+        self.ends = np.append(self.starts[1:], len(ordem)).astype(np.int64)
+
+        # Chave única (posição do cluster, event_id), crescente na ordem do índice
+        self.max_event = int(ordem_eventos.max()) + 1 if len(ordem_eventos) else 1
+        posicao = np.repeat(np.arange(len(self.clusters), dtype=np.int64), self.ends - self.starts)
+        self.keys = posicao * self.max_event + ordem_eventos[ordem]
+
+        # Colunas já reordenadas: uma seleção vira fatias contíguas, sem indexar o DataFrame
+        self.columns = {col: df[col].to_numpy()[ordem] for col in columns}
+
+        # Cópia na ordem da linha do tempo: sem filtro de cluster, o corte é um prefixo (sem cópia)
+        por_evento = np.argsort(ordem_eventos, kind="stable")
+        self.event_ids = ordem_eventos[por_evento]
+        self.columns_by_event = {col: df[col].to_numpy()[por_evento] for col in columns}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def positions(self, clusters=None, max_event=None):
+        """
+        Posições (na ordem do índice) dos eventos dos clusters pedidos com event_id <= max_event.
+
+        :param clusters: Clusters selecionados (None ou vazio = todos).
+        :param max_event: Corte da linha do tempo (None = sem corte).
+        :return: Array de posições.
+        """
+        if clusters is None or len(clusters) == 0:
+            selecionados = np.arange(len(self.clusters))
+        else:
+            selecionados = np.searchsorted(self.clusters, clusters)
+            validos = selecionados < len(self.clusters)
+            selecionados = selecionados[validos]
+            selecionados = selecionados[self.clusters[selecionados] == np.asarray(clusters)[validos]]
+
+        inicios = self.starts[selecionados]
+        if max_event is None:
+            fins = self.ends[selecionados]
+        else:
+            corte = min(int(max_event), self.max_event - 1)
+            fins = np.searchsorted(self.keys, selecionados * self.max_event + corte, side="right")
+
+        # Concatena as faixas [inicio, fim) sem loop em Python
+        tamanhos = np.maximum(fins - inicios, 0)
+        deslocamento = np.repeat(inicios - np.concatenate([[0], np.cumsum(tamanhos)[:-1]]), tamanhos)
+        return np.arange(int(tamanhos.sum()), dtype=np.int64) + deslocamento
+
+    def select(self, clusters=None, max_event=None):
+        """
+        Colunas dos eventos selecionados.
+
+        :param clusters: Clusters selecionados (None ou vazio = todos).
+        :param max_event: Corte da linha do tempo.
+        :return: Dicionário {coluna: array}.
+        """
+        if clusters is None or len(clusters) == 0:
+            fim = len(self.event_ids) if max_event is None else np.searchsorted(self.event_ids, max_event, side="right")
+            return {col: valores[:fim] for col, valores in self.columns_by_event.items()}
+
+        posicoes = self.positions(clusters, max_event)
+        return {col: valores[posicoes] for col, valores in self.columns.items()}
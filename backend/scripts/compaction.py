@@ -0,0 +1,312 @@
+import os
+import re
+import json
+import time
+import numpy as np
+
+# Diretórios compactados (um por saída do pipeline)
+COMPACTED_PARQUET_DIR = "/app/data/parquet_compacted"
+COMPACTED_PROCESSED_DIR = "/app/data/processed_compacted"
+
+# Tamanho alvo de cada arquivo compactado e linhas por row group
+COMPACT_TARGET_BYTES = 256 * 1024 ** 2
+ROW_GROUP_ROWS = 1_000_000
+
+# Arquivos mantidos pelo job na raiz do dataset compactado
+METADATA_FILE = "_metadata"
+COMMON_METADATA_FILE = "_common_metadata"
+MANIFEST_FILE = "_compaction.json"
+
+# Nomes ATLAS: DAOD_HION14.41888680._000002.pool.root.1 → dataset=DAOD_HION14, run=41888680
+PARTITION_PATTERN = re.compile(r"^(?P<dataset>[^.]+)\.(?P<run>\d+)\.")
+
+
+def partition_values(filename):
+    """
+    Chaves de partição (dataset, run) extraídas do nome do arquivo.
+
+    :param filename: Nome do arquivo (ROOT ou Parquet).
+    :return: Dicionário {"dataset": ..., "run": ...}; "unknown" quando o nome não segue o padrão ATLAS.
+    """
+    match = PARTITION_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return {"dataset": "unknown", "run": "unknown"}
+    return match.groupdict()
+
+
+def plan_compaction(files, target_bytes=COMPACT_TARGET_BYTES, partition=True):
+    """
+    Agrupa arquivos pequenos em lotes de até target_bytes, sem misturar partições.
+
+    :param files: Arquivos Parquet de entrada.
+    :param target_bytes: Tamanho alvo (em disco) de cada arquivo compactado.
+    :param partition: Agrupa por dataset/run (hive) ou num único diretório.
+    :return: Lista de (subdiretório da partição, [arquivos]).
+    """
+    por_particao = {}
+    for path in sorted(files):
+        chaves = partition_values(path) if partition else {}
+        subdir = os.path.join(*[f"{k}={v}" for k, v in chaves.items()]) if chaves else ""
+        por_particao.setdefault(subdir, []).append(path)
+
+    grupos = []
+    for subdir, arquivos in por_particao.items():
+        atual, tamanho = [], 0
+        for path in arquivos:
+            bytes_arquivo = os.path.getsize(path)
+            if atual and tamanho + bytes_arquivo > target_bytes:
+                grupos.append((subdir, atual))
+                atual, tamanho = [], 0
+            atual.append(path)
+            tamanho += bytes_arquivo
+        if atual:
+            grupos.append((subdir, atual))
+    return grupos
+
+
+def _conform(tabela, schema):
+    """Tabela no esquema dado: colunas ausentes entram como nulas, as demais na ordem e nos tipos do esquema."""
+    import pyarrow as pa
+
+    for campo in schema:
+        if campo.name not in tabela.column_names:
+            tabela = tabela.append_column(campo, pa.nulls(len(tabela), type=campo.type))
+    return tabela.select(schema.names).cast(schema)
+
+
+def compact_group(files, output_path, row_group_rows=ROW_GROUP_ROWS):
+    """
+    Reescreve vários Parquet num só, lote a lote, com row groups grandes.
+
+    Cada linha ganha source_file e source_row, para que referências aos
+    arquivos originais (índice ANN, ranking de anomalias) continuem válidas.
+
+    :param files: Arquivos de entrada (colunas ausentes em algum deles ficam nulas nas suas linhas).
+    :param output_path: Arquivo de saída.
+    :param row_group_rows: Linhas por row group.
+    :return: Número de linhas gravadas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+    schema = schema.remove_metadata().append(pa.field("source_file", pa.dictionary(pa.int32(), pa.string()))) \
+        .append(pa.field("source_row", pa.int64()))
+
+    total = 0
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with pq.ParquetWriter(output_path + ".tmp", schema, compression="zstd") as writer:
+        for path in files:
+            nome, inicio = os.path.basename(path), 0
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=row_group_rows):
+                tabela = pa.Table.from_batches([batch])
+                n = len(tabela)
+                tabela = tabela.append_column("source_file", pa.DictionaryArray.from_arrays(
+                    pa.array(np.zeros(n, dtype=np.int32)), pa.array([nome])))
+                tabela = tabela.append_column("source_row", pa.array(np.arange(inicio, inicio + n, dtype=np.int64)))
+                writer.write_table(_conform(tabela, schema), row_group_size=row_group_rows)
+                inicio += n
+            total += inicio
+    os.replace(output_path + ".tmp", output_path)
+    return total
+
+
+def dataset_files(root):
+    """Arquivos de dados do dataset compactado (ignora _metadata, manifestos e diretórios ocultos)."""
+    arquivos = []
+    for diretorio, subdirs, nomes in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if not d.startswith(("_", ".")))
+        arquivos += [os.path.join(diretorio, n) for n in sorted(nomes) if n.endswith(".parquet")]
+    return arquivos
+
+
+def conform_file(path, schema, row_group_rows=ROW_GROUP_ROWS):
+    """
+    Regrava um arquivo compactado no esquema dado (colunas novas nulas, tipos promovidos).
+
+    :param path: Arquivo compactado.
+    :param schema: Esquema unificado do dataset.
+    :param row_group_rows: Linhas por row group.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(path + ".tmp", schema, compression="zstd") as writer:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=row_group_rows):
+            writer.write_table(_conform(pa.Table.from_batches([batch]), schema), row_group_size=row_group_rows)
+    os.replace(path + ".tmp", path)
+
+
+def write_metadata_file(root):
+    """
+    Regrava _metadata (rodapés de todos os arquivos, com caminhos relativos) e _common_metadata.
+
+    Só os rodapés são lidos; o arquivo resultante permite abrir e planejar
+    consultas sobre o dataset inteiro com uma única leitura. O _metadata
+    exige o mesmo esquema em todos os arquivos: se um lote novo trouxe
+    colunas ou tipos diferentes, os arquivos fora do esquema unificado são
+    regravados nele antes.
+
+    :param root: Raiz do dataset compactado.
+    :return: Caminho do _metadata, ou None se o dataset está vazio.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arquivos = dataset_files(root)
+    if not arquivos:
+        return None
+
+    esquemas = {path: pq.read_schema(path).remove_metadata() for path in arquivos}
+    schema = pa.unify_schemas(list(esquemas.values()), promote_options="permissive")
+    for path, esquema in esquemas.items():
+        if not esquema.equals(schema):
+            print(f"⚠️ {path} fora do esquema unificado; regravando...")
+            conform_file(path, schema)
+
+    rodapes = []
+    for path in arquivos:
+        md = pq.read_metadata(path)
+        md.set_file_path(os.path.relpath(path, root).replace(os.sep, "/"))
+        rodapes.append(md)
+
+    path = os.path.join(root, METADATA_FILE)
+    pq.write_metadata(schema, path + ".tmp", metadata_collector=rodapes)
+    os.replace(path + ".tmp", path)
+    pq.write_metadata(schema, os.path.join(root, COMMON_METADATA_FILE))
+    return path
+
+
+def source_fingerprints(directory):
+    """{nome: [bytes, mtime_ns]} dos Parquet de origem (um reprocessamento com o mesmo nome muda a entrada)."""
+    if not os.path.isdir(directory):
+        return {}
+    impressoes = {}
+    for nome in sorted(os.listdir(directory)):
+        if nome.endswith(".parquet"):
+            stat = os.stat(os.path.join(directory, nome))
+            impressoes[nome] = [stat.st_size, stat.st_mtime_ns]
+    return impressoes
+
+
+def compacted_sources(manifest):
+    """{nome de origem: impressão registrada} de todos os arquivos compactados (None em manifestos antigos)."""
+    return {nome: impressao for origens in manifest.values()
+            for nome, impressao in (origens.items() if isinstance(origens, dict) else ((o, None) for o in origens))}
+
+
+def load_manifest(root):
+    """Manifesto {arquivo compactado: {arquivo de origem: [bytes, mtime_ns]}} do job."""
+    path = os.path.join(root, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(root, manifest):
+    with open(os.path.join(root, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def compact_dataset(input_dir, output_dir, target_bytes=COMPACT_TARGET_BYTES, partition=True,
+                    row_group_rows=ROW_GROUP_ROWS):
+    """
+    Compacta os Parquet de input_dir em output_dir e atualiza o _metadata.
+
+    Arquivos já compactados (registrados no manifesto com o mesmo tamanho e
+    data de modificação) são pulados; os novos viram novos arquivos, sem
+    reescrever os existentes. Um arquivo compactado cuja origem mudou (ex.:
+    reprocessada com o mesmo nome) ou sumiu é apagado, e as origens que
+    restam dele são compactadas de novo.
+
+    :param input_dir: Diretório com um Parquet por arquivo ROOT.
+    :param output_dir: Raiz do dataset compactado.
+    :param target_bytes: Tamanho alvo de cada arquivo.
+    :param partition: Particiona em dataset=<...>/run=<...> (hive).
+    :param row_group_rows: Linhas por row group.
+    :return: Lista de arquivos compactados gravados nesta execução.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    atuais = source_fingerprints(input_dir)
+
+    for parte, origens in list(manifest.items()):
+        desatualizadas = [nome for nome, impressao in compacted_sources({parte: origens}).items()
+                          if atuais.get(nome) != impressao]
+        if desatualizadas:
+            print(f"⚠️ {parte}: origem alterada ou removida ({', '.join(desatualizadas)}); recompactando...")
+            try:
+                os.remove(os.path.join(output_dir, parte))
+            except FileNotFoundError:
+                pass
+            del manifest[parte]
+            save_manifest(output_dir, manifest)
+
+    ja_compactados = compacted_sources(manifest)
+    pendentes = [os.path.join(input_dir, f) for f in atuais if f not in ja_compactados]
+    if not pendentes:
+        print(f"✅ Nada novo para compactar em {input_dir}.")
+        write_metadata_file(output_dir)
+        return []
+
+    gravados = []
+    prefixo = time.strftime("%Y%m%d%H%M%S")
+    for i, (subdir, arquivos) in enumerate(plan_compaction(pendentes, target_bytes, partition)):
+        output = os.path.join(output_dir, subdir, f"part-{prefixo}-{i:05d}.parquet")
+        linhas = compact_group(arquivos, output, row_group_rows)
+        manifest[os.path.relpath(output, output_dir)] = {os.path.basename(f): atuais[os.path.basename(f)]
+                                                         for f in arquivos}
+        save_manifest(output_dir, manifest)
+        gravados.append(output)
+        print(f"✅ {len(arquivos)} arquivos → {output} ({linhas} linhas)")
+
+    write_metadata_file(output_dir)
+    print(f"✅ _metadata atualizado: {len(dataset_files(output_dir))} arquivos em {output_dir}")
+    return gravados
+
+
+def dataset_source(directory):
+    """
+    Caminho para dd.read_parquet: o diretório, se houver _metadata (uma leitura só), ou o glob dos arquivos.
+
+    :param directory: Diretório do dataset (compactado ou não).
+    :return: Caminho ou padrão glob.
+    """
+    if os.path.exists(os.path.join(directory, METADATA_FILE)):
+        return directory
+    return os.path.join(directory, "*.parquet")
+
+
+def current_dataset_dir(directory, compacted_dir):
+    """
+    Diretório a ler: o compactado, se tiver _metadata e estiver em dia com os Parquet de directory, senão o original.
+
+    Em dia quer dizer os mesmos arquivos de origem, com o mesmo tamanho e a
+    mesma data de modificação registrados no manifesto.
+
+    :param directory: Diretório com um Parquet por arquivo ROOT.
+    :param compacted_dir: Raiz do dataset compactado a partir de directory.
+    :return: Um dos dois diretórios.
+    """
+    if not os.path.exists(os.path.join(compacted_dir, METADATA_FILE)):
+        return directory
+    em_dia = compacted_sources(load_manifest(compacted_dir)) == source_fingerprints(directory)
+    return compacted_dir if em_dia else directory
+
+
+def open_dataset(root):
+    """
+    Abre o dataset compactado com pyarrow a partir do _metadata, sem listar nem abrir os arquivos.
+
+    :param root: Raiz do dataset compactado.
+    :return: pyarrow.dataset.Dataset com as colunas de partição (dataset, run).
+    """
+    import pyarrow.dataset as ds
+
+    return ds.parquet_dataset(os.path.join(root, METADATA_FILE), partitioning="hive")
+
+
+if __name__ == "__main__":
+    compact_dataset("/app/data/parquet", COMPACTED_PARQUET_DIR)
+    compact_dataset("/app/data/processed_parquet_parts", COMPACTED_PROCESSED_DIR)
@@ -5,7 +5,12 @@ import pyarrow.parquet as pq
 import pyarrow as pa
 import pandas as pd
 import json
-import numpy as np
+from functools import partial
+from quantile_sketch import build_column_sketches, save_sketches, sketch_parquet_file, sketch_path_for
+from metrics import instrumented, current_stage
+from memory_governor import MemoryGovernor, WORKER_BASE_BYTES
+from analysis_pipeline import HION_BRANCHES, flatten_events
+from raw_cache import RawCache
 
 INPUT_DIR = "/app/data/cern_raw"
 OUTPUT_DIR = "/app/data/parquet"
@@ -49,62 +54,115 @@ def save_checkpoint(checkpoint):
 
 
 checkpoint = load_checkpoint()
-
-def convert_file(input_root):
+governor = MemoryGovernor()
+raw_cache = RawCache(INPUT_DIR, checkpoint_file=CHECKPOINT_FILE)
+
+@instrumented("convert_file", file_arg=0)
+def convert_file(input_root, governor=governor):
+    """
+    Converte um arquivo ROOT em Parquet, lendo em blocos dimensionados pelo orçamento de memória.
+
+    :param input_root: Caminho do arquivo ROOT.
+    :param governor: MemoryGovernor (dentro de um worker, a fatia do orçamento daquele worker).
+    :return: Caminho do Parquet gravado, ou None se o arquivo foi pulado ou falhou.
+    """
     filename = os.path.basename(input_root)
     output_parquet = os.path.join(OUTPUT_DIR, filename.replace(".root.1", ".parquet"))
 
     if output_parquet in checkpoint:
+        # Arquivos convertidos antes dos sketches ganham o sidecar a partir do próprio Parquet
+        if os.path.exists(output_parquet) and not os.path.exists(sketch_path_for(output_parquet)):
+            print(f"🔹 Gerando sketches de quantis para {output_parquet}...")
+            sketch_parquet_file(output_parquet)
         print(f"✅ {output_parquet} já processado. Pulando...")
-        return
+        return None
 
     print(f"📂 Processando: {input_root}")
+    writer = None
     try:
         with uproot.open(input_root) as file: # Abre o arquivo ROOT usando um contexto (with)
             tree = file["CollectionTree"]
 
-            branches = [
-                "MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi", "MuonsAuxDyn.charge",
-                "MuonSpectrometerTrackParticlesAuxDyn.qOverP",
-                "CaloSumsAuxDyn.et", "EventInfoAuxDyn.CentralityMin", "EventInfoAuxDyn.CentralityMax",
-                "InDetTrackParticlesAuxDyn.qOverP",
-                "PrimaryVerticesAuxDyn.x", "PrimaryVerticesAuxDyn.y", "PrimaryVerticesAuxDyn.z"
-            ]
-            valid_branches = [b for b in branches if b in tree.keys()]
+            valid_branches = [b for b in HION_BRANCHES if b in tree.keys()]
             if not valid_branches:
                 print(f"⚠️ Nenhum ramo válido encontrado no arquivo {input_root}. Pulando...")
-                return
+                return None
 
             print(f"🔹 Usando os ramos disponíveis: {valid_branches}")
+            print(f"🔹 Blocos de {governor.chunk_entries(tree, valid_branches)} eventos ({governor})")
+
+            # Todos os eventos, um bloco por vez: o Parquet e os sketches são acumulados bloco a bloco
+            sketches = {}
+            total = 0
+            for chunk in governor.iterate(tree, valid_branches, library="ak"):
+                data = flatten_events(chunk, verbose=False)
+                table = pa.Table.from_pandas(data, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_parquet + ".tmp", table.schema)
+                writer.write_table(table)
+
+                # Sketches de quantis por coluna para testes KS/AD no dataset inteiro
+                for col, sketch in build_column_sketches(data).items():
+                    sketches[col] = sketches[col].merge(sketch) if col in sketches else sketch
+                total += len(data)
+
+        if writer is None:
+            print(f"⚠️ Nenhum evento em {input_root}. Pulando...")
+            return None
+        writer.close()
+        writer = None
+        os.replace(output_parquet + ".tmp", output_parquet)
+        save_sketches(sketches, sketch_path_for(output_parquet))
+
+        print(f"✅ Total de eventos processados: {total}")
+        current_stage().add_rows(total)
+        print(f"✅ Convertido com sucesso: {output_parquet}")
+        return output_parquet
 
-            data = tree.arrays(valid_branches, library="pd") # Remove entry_stop para processar todos os eventos.
-
-            def tratar_lista(x):
-                if isinstance(x, (list, np.ndarray)):
-                    return np.mean(x) if len(x) > 0 else np.nan
-                return x
-
-            for col in data.columns:
-                data[col] = data[col].apply(tratar_lista)
-
-            data.fillna(0, inplace=True)
-
-            print(f"✅ Total de eventos processados: {len(data)}")
+    except Exception as e:
+        print(f"Erro ao processar arquivo {input_root}: {e}") # Imprime o erro específico
+        return None
 
-            table = pa.Table.from_pandas(data)
-            pq.write_table(table, output_parquet)
+    finally:
+        if writer is not None:
+            writer.close()
+        # Só sobra .tmp se a conversão falhou no meio: não deixa o Parquet parcial no disco
+        if os.path.exists(output_parquet + ".tmp"):
+            os.remove(output_parquet + ".tmp")
 
-            checkpoint[output_parquet] = True
-            save_checkpoint(checkpoint)
-            print(f"✅ Convertido com sucesso: {output_parquet}")
 
-    except Exception as e:
-        print(f"Erro ao processar arquivo {input_root}: {e}") # Imprime o erro específico
+def mark_converted(input_root, output_parquet):
+    """Registra no checkpoint um arquivo convertido (chamado no processo principal)."""
+    if output_parquet is not None:
+        checkpoint[output_parquet] = True
+        save_checkpoint(checkpoint)
+        # O arquivo bruto convertido passa a poder ser despejado se o diretório estiver acima da cota
+        raw_cache.touch(os.path.basename(input_root))
+        raw_cache.evict()
 
 
 # Agora percorre os arquivos e converte
+arquivos = []
 for filename in os.listdir(INPUT_DIR):
     if filename.endswith(".root.1"):
         file_path = os.path.join(INPUT_DIR, filename)
         if os.path.isfile(file_path) and is_valid_root_file(file_path):
-            convert_file(file_path) # Passa o caminho completo do arquivo
\ No newline at end of file
+            arquivos.append(file_path)
+
+pendentes = []
+for file_path in arquivos:
+    output_parquet = os.path.join(OUTPUT_DIR, os.path.basename(file_path).replace(".root.1", ".parquet"))
+    if output_parquet in checkpoint:
+        convert_file(file_path)
+    else:
+        pendentes.append(file_path)
+
+# Número de conversões simultâneas escolhido pelo orçamento de memória; cada worker lê com a sua fatia
+n_workers = governor.streaming_workers(len(pendentes))
+print(f"🔹 Convertendo {len(pendentes)} arquivos com {n_workers} worker(s).")
+if n_workers <= 1:
+    for file_path in pendentes:
+        mark_converted(file_path, convert_file(file_path))
+else:
+    governor.map(partial(convert_file, governor=governor.share(n_workers)), pendentes,
+                 bytes_per_task=2 * WORKER_BASE_BYTES, max_workers=n_workers, on_result=mark_converted)
@@ -0,0 +1,200 @@
+import numpy as np
+
+# Extensão da grade além dos dados, em larguras de banda (mesmo padrão do seaborn)
+DEFAULT_CUT = 3.0
+
+# Meia-largura do kernel gaussiano discretizado, em larguras de banda
+KERNEL_TRUNCATE = 4.0
+
+
+def scott_bandwidth(x, weights=None, dims=1):
+    """
+    Largura de banda pela regra de Scott (padrão do seaborn e do scipy).
+
+    :param x: Amostra de uma dimensão.
+    :param weights: Pesos opcionais.
+    :param dims: Número de dimensões da estimativa.
+    :return: Largura de banda (desvio padrão do kernel).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if weights is None:
+        n_eff, std = len(x), x.std(ddof=1) if len(x) > 1 else 0.0
+    else:
+        w = np.asarray(weights, dtype=np.float64)
+        n_eff = w.sum() ** 2 / (w ** 2).sum()
+        media = np.average(x, weights=w)
+        std = np.sqrt(np.average((x - media) ** 2, weights=w))
+    std = std if std > 0 else 1.0
+    return std * n_eff ** (-1.0 / (dims + 4))
+
+
+def linear_binning(samples, grids, weights=None):
+    """
+    Distribui cada evento entre os pontos vizinhos da grade (binning linear).
+
+    :param samples: Lista com um array por dimensão.
+    :param grids: Lista com a grade (igualmente espaçada) de cada dimensão.
+    :param weights: Pesos opcionais.
+    :return: Array com a massa acumulada em cada ponto da grade.
+    """
+    shape = tuple(len(g) for g in grids)
+    n = len(samples[0])
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    base, frac = [], []
+    dentro = np.ones(n, dtype=bool)
+    for x, g in zip(samples, grids):
+        pos = (np.asarray(x, dtype=np.float64) - g[0]) / (g[1] - g[0])
+        # O último ponto da grade entra na última célula (fração 1)
+        i = np.minimum(np.floor(pos), len(g) - 2).astype(np.int64)
+        dentro &= (pos >= 0) & (pos <= len(g) - 1)
+        base.append(i)
+        frac.append(pos - i)
+
+    base = [b[dentro] for b in base]
+    frac = [f[dentro] for f in frac]
+    w = w[dentro]
+
+    contagens = np.zeros(int(np.prod(shape)), dtype=np.float64)
+    # Cada evento contribui para os 2^d cantos da célula que o contém
+    for canto in range(2 ** len(grids)):
+        idx, peso = [], w.copy()
+        for d in range(len(grids)):
+            bit = (canto >> d) & 1
+            idx.append(base[d] + bit)
+            peso *= frac[d] if bit else 1.0 - frac[d]
+        contagens += np.bincount(np.ravel_multi_index(idx, shape), weights=peso, minlength=contagens.size)
+
+    return contagens.reshape(shape)
+
+
+def _gaussian_kernel(bw, dx, size):
+    meia = int(min(np.ceil(KERNEL_TRUNCATE * bw / dx), size - 1))
+    offsets = np.arange(-meia, meia + 1) * dx
+    return np.exp(-0.5 * (offsets / bw) ** 2)
+
+
+def _grid(x, bw, size, cut, clip):
+    x = np.asarray(x, dtype=np.float64)
+    lo, hi = x.min() - cut * bw, x.max() + cut * bw
+    if clip is not None:
+        lo, hi = max(lo, clip[0]), min(hi, clip[1])
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, size)
+
+
+def kde_1d(x, weights=None, grid_size=512, bw=None, bw_adjust=1.0, cut=DEFAULT_CUT, clip=None):
+    """
+    Densidade por kernel gaussiano via binning linear + convolução FFT.
+
+    O custo depende do tamanho da grade, não do número de eventos.
+
+    :param x: Amostra.
+    :param weights: Pesos opcionais.
+    :param grid_size: Número de pontos da grade.
+    :param bw: Largura de banda (padrão: regra de Scott).
+    :param bw_adjust: Fator multiplicativo da largura de banda.
+    :param cut: Extensão da grade além dos dados (em larguras de banda).
+    :param clip: Tupla (min, max) opcional para limitar a grade.
+    :return: Tupla (grade, densidade).
+    """
+    from scipy.signal import fftconvolve
+
+    x = np.asarray(x, dtype=np.float64)
+    finitos = np.isfinite(x)
+    x = x[finitos]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[finitos]
+    bw = (bw or scott_bandwidth(x, weights)) * bw_adjust
+    grade = _grid(x, bw, grid_size, cut, clip)
+    dx = grade[1] - grade[0]
+
+    massa = linear_binning([x], [grade], weights)
+    densidade = fftconvolve(massa, _gaussian_kernel(bw, dx, grid_size), mode="same")
+    densidade = np.maximum(densidade, 0.0)
+
+    total = densidade.sum() * dx
+    return grade, densidade / total if total > 0 else densidade
+
+
+def kde_2d(x, y, weights=None, grid_size=(128, 128), bw=None, bw_adjust=1.0, cut=DEFAULT_CUT):
+    """
+    Densidade 2D por kernel gaussiano (produto de kernels) via convolução FFT.
+
+    :param x: Amostra do eixo x.
+    :param y: Amostra do eixo y.
+    :param weights: Pesos opcionais.
+    :param grid_size: Tupla (nx, ny) com o tamanho da grade.
+    :param bw: Tupla (bw_x, bw_y) (padrão: regra de Scott em cada eixo).
+    :param bw_adjust: Fator multiplicativo das larguras de banda.
+    :param cut: Extensão da grade além dos dados (em larguras de banda).
+    :return: Tupla (grade_x, grade_y, densidade) com densidade no formato (ny, nx).
+    """
+    from scipy.signal import fftconvolve
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finitos = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finitos], y[finitos]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[finitos]
+
+    bw_x, bw_y = bw or (scott_bandwidth(x, weights, dims=2), scott_bandwidth(y, weights, dims=2))
+    bw_x, bw_y = bw_x * bw_adjust, bw_y * bw_adjust
+    gx = _grid(x, bw_x, grid_size[0], cut, None)
+    gy = _grid(y, bw_y, grid_size[1], cut, None)
+    dx, dy = gx[1] - gx[0], gy[1] - gy[0]
+
+    massa = linear_binning([y, x], [gy, gx], weights)
+    kernel = np.outer(_gaussian_kernel(bw_y, dy, grid_size[1]), _gaussian_kernel(bw_x, dx, grid_size[0]))
+    densidade = np.maximum(fftconvolve(massa, kernel, mode="same"), 0.0)
+
+    total = densidade.sum() * dx * dy
+    return gx, gy, densidade / total if total > 0 else densidade
+
+
+def plot_kde_1d(x, ax=None, fill=False, label=None, color=None, **kwargs):
+    """
+    Desenha a densidade 1D no matplotlib (substituto do sns.kdeplot).
+
+    :param x: Amostra.
+    :param ax: Eixo do matplotlib (padrão: eixo atual).
+    :param fill: Preenche a área sob a curva.
+    :param label: Rótulo da legenda.
+    :param color: Cor da curva.
+    :param kwargs: Repassados para kde_1d.
+    :return: O eixo usado.
+    """
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.gca()
+    grade, densidade = kde_1d(x, **kwargs)
+    linha, = ax.plot(grade, densidade, label=label, color=color)
+    if fill:
+        ax.fill_between(grade, densidade, alpha=0.25, color=linha.get_color())
+    return ax
+
+
+def density_contour_figure(x, y, title=None, labels=None, color_continuous_scale="viridis", **kwargs):
+    """
+    Figura Plotly de contornos de densidade (substituto do px.density_contour).
+
+    Só a grade (não os eventos) é enviada ao navegador.
+
+    :param x: Amostra do eixo x.
+    :param y: Amostra do eixo y.
+    :param title: Título da figura.
+    :param labels: Tupla (rótulo_x, rótulo_y).
+    :param color_continuous_scale: Escala de cores.
+    :param kwargs: Repassados para kde_2d.
+    :return: plotly.graph_objects.Figure.
+    """
+    import plotly.graph_objects as go
+
+    gx, gy, densidade = kde_2d(x, y, **kwargs)
+    fig = go.Figure(go.Contour(x=gx, y=gy, z=densidade, colorscale=color_continuous_scale,
+                               contours=dict(coloring="lines"), colorbar=dict(title="Densidade")))
+    labels = labels or (None, None)
+    fig.update_layout(title=title, xaxis_title=labels[0], yaxis_title=labels[1])
+    return fig
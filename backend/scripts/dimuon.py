@@ -0,0 +1,271 @@
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Diretório das saídas (um Parquet de pares e um de eventos por arquivo ROOT)
+DIMUON_DIR = "/app/data/dimuons"
+
+# Ramos dos múons (pt em MeV, como no xAOD)
+MUON_BRANCHES = ["MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi", "MuonsAuxDyn.charge"]
+
+# Massas em MeV
+MUON_MASS = 105.6583755
+Z_MASS = 91187.6
+
+# Critérios para escolher o melhor par do evento
+BEST_PAIR_CRITERIA = ("z_mass", "max_pt")
+
+
+def pair_indices(counts):
+    """
+    Todos os pares (i, j), i < j, de cada evento, por aritmética de offsets.
+
+    Um evento com n múons tem n(n-1)/2 pares; o k-ésimo par do evento é
+    decodificado da numeração triangular, sem loop em Python.
+
+    :param counts: Número de múons por evento (n_eventos,).
+    :return: Tupla (evento, i, j) com índices no conteúdo achatado (i e j já somados ao offset do evento).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    n_pares = counts * (counts - 1) // 2
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    evento = np.repeat(np.arange(len(counts)), n_pares)
+    inicio_pares = np.concatenate([[0], np.cumsum(n_pares)[:-1]])
+    k = np.arange(int(n_pares.sum())) - inicio_pares[evento]
+    n = counts[evento]
+
+    # Linha i do triângulo: maior i com T(i) = i(2n - i - 1)/2 <= k
+    def T(linha):
+        return linha * (2 * n - linha - 1) // 2
+
+    b = 2 * n - 1
+    i = np.floor((b - np.sqrt(np.maximum(b * b - 8 * k, 0))) / 2).astype(np.int64)
+    # Corrige arredondamentos do sqrt nas bordas
+    i -= T(i) > k
+    i += T(i + 1) <= k
+    j = k - T(i) + i + 1
+
+    base = offsets[evento]
+    return evento, base + i, base + j
+
+
+def four_momenta(pt, eta, phi, mass=MUON_MASS):
+    """Quadrimomentos (E, px, py, pz) a partir de pt, eta e phi."""
+    pt, eta, phi = (np.asarray(a, dtype=np.float64) for a in (pt, eta, phi))
+    px, py, pz = pt * np.cos(phi), pt * np.sin(phi), pt * np.sinh(eta)
+    energia = np.sqrt(px ** 2 + py ** 2 + pz ** 2 + mass ** 2)
+    return energia, px, py, pz
+
+
+def dimuon_pairs(pt, eta, phi, charge, counts, opposite_sign=True):
+    """
+    Pares de múons com massa invariante, pT e rapidez do par.
+
+    :param pt: Conteúdo achatado do pT dos múons (MeV).
+    :param eta: Conteúdo achatado de eta.
+    :param phi: Conteúdo achatado de phi.
+    :param charge: Conteúdo achatado da carga.
+    :param counts: Múons por evento.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :return: DataFrame com event, mu1, mu2 (índices dentro do evento), mass, pt, rapidity, energy e charge.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    evento, i, j = pair_indices(counts)
+    charge = np.asarray(charge)
+
+    if opposite_sign:
+        opostos = charge[i] * charge[j] < 0
+        evento, i, j = evento[opostos], i[opostos], j[opostos]
+
+    e, px, py, pz = four_momenta(pt, eta, phi)
+    E = e[i] + e[j]
+    Px, Py, Pz = px[i] + px[j], py[i] + py[j], pz[i] + pz[j]
+
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "event": evento,
+            "mu1": i - offsets[evento],
+            "mu2": j - offsets[evento],
+            "mass": np.sqrt(np.maximum(E ** 2 - Px ** 2 - Py ** 2 - Pz ** 2, 0.0)),
+            "pt": np.hypot(Px, Py),
+            "rapidity": 0.5 * np.log((E + Pz) / (E - Pz)),
+            "energy": E,
+            "charge": charge[i] + charge[j],
+        })
+
+
+def best_pairs(pairs, n_events, criterion="z_mass"):
+    """
+    Melhor par de cada evento.
+
+    :param pairs: Saída de dimuon_pairs (pares agrupados por evento, em ordem crescente).
+    :param n_events: Número de eventos do bloco.
+    :param criterion: "z_mass" (massa mais próxima do Z) ou "max_pt" (maior pT do par).
+    :return: DataFrame com uma linha por evento (NaN onde não há par) e a coluna n_pairs.
+    """
+    if criterion not in BEST_PAIR_CRITERIA:
+        raise ValueError(f"🚨 Critério desconhecido: {criterion}. Use um de {BEST_PAIR_CRITERIA}.")
+
+    chave = np.abs(pairs["mass"].to_numpy() - Z_MASS) if criterion == "z_mass" else -pairs["pt"].to_numpy()
+    evento = pairs["event"].to_numpy()
+    n_pairs = np.bincount(evento, minlength=n_events)
+
+    # Os pares vêm agrupados por evento (ordem de dimuon_pairs): mínimo por segmento, sem ordenar
+    com_par = np.flatnonzero(n_pairs)
+    melhores = pd.DataFrame(np.nan, index=np.arange(n_events), columns=["mu1", "mu2", "mass", "pt", "rapidity", "energy"])
+    if len(com_par):
+        inicios = np.concatenate([[0], np.cumsum(n_pairs[com_par])[:-1]])
+        minimos = np.minimum.reduceat(chave, inicios)
+        candidatos = np.flatnonzero(chave == np.repeat(minimos, n_pairs[com_par]))
+        escolhidos = candidatos[np.unique(evento[candidatos], return_index=True)[1]]
+        for col in melhores.columns:
+            valores = np.full(n_events, np.nan)
+            valores[evento[escolhidos]] = pairs[col].to_numpy()[escolhidos]
+            melhores[col] = valores
+    melhores["n_pairs"] = n_pairs
+    return melhores
+
+
+def chunk_dimuons(chunk, opposite_sign=True, criterion="z_mass"):
+    """
+    Pares e melhor par por evento de um bloco lido com uproot (library="ak").
+
+    :param chunk: Bloco com os ramos de MUON_BRANCHES.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :param criterion: Critério do melhor par.
+    :return: Tupla (pares, eventos) de DataFrames; event é o índice dentro do bloco.
+    """
+    import awkward as ak
+
+    counts = ak.to_numpy(ak.num(chunk[MUON_BRANCHES[0]]))
+    pt, eta, phi, charge = (ak.to_numpy(ak.flatten(chunk[b], axis=None)) for b in MUON_BRANCHES)
+    pares = dimuon_pairs(pt, eta, phi, charge, counts, opposite_sign)
+    return pares, best_pairs(pares, len(counts), criterion)
+
+
+def iterate_dimuons(path, opposite_sign=True, criterion="z_mass", governor=None, tree_name="CollectionTree"):
+    """
+    Percorre um arquivo ROOT em blocos e devolve pares e melhores pares de cada bloco.
+
+    Os blocos são dimensionados pelo MemoryGovernor.
+
+    :param path: Arquivo ROOT.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :param criterion: Critério do melhor par.
+    :param tree_name: Nome da árvore.
+    :param governor: MemoryGovernor (padrão: orçamento padrão).
+    :return: Gerador de (pares, eventos) com a coluna entry (número da entrada no arquivo).
+    """
+    import uproot
+    from memory_governor import MemoryGovernor
+
+    governor = governor or MemoryGovernor()
+    inicio = 0
+    with uproot.open(path) as file:
+        tree = file[tree_name]
+        for chunk in governor.iterate(tree, MUON_BRANCHES, library="ak"):
+            pares, eventos = chunk_dimuons(chunk, opposite_sign, criterion)
+            pares.insert(0, "entry", pares.pop("event").to_numpy() + inicio)
+            eventos.insert(0, "entry", np.arange(len(eventos)) + inicio)
+            inicio += len(chunk)
+            yield pares, eventos
+
+
+def event_dimuons(path, entries=None, opposite_sign=True, criterion="z_mass"):
+    """
+    Melhor par de cada evento do arquivo (ou só das entradas pedidas), lido em blocos.
+
+    :param path: Arquivo ROOT.
+    :param entries: Entradas de interesse (ex.: eventos selecionados); None = todas.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :param criterion: Critério do melhor par.
+    :return: DataFrame com entry e o melhor par (só eventos que têm ao menos um par).
+    """
+    entries = None if entries is None else np.unique(np.asarray(entries, dtype=np.int64))
+    partes = []
+    for _, eventos in iterate_dimuons(path, opposite_sign, criterion):
+        eventos = eventos[eventos["n_pairs"] > 0]
+        if entries is not None:
+            eventos = eventos[np.isin(eventos["entry"].to_numpy(), entries)]
+        partes.append(eventos)
+    if not partes:
+        return pd.DataFrame(columns=["entry", "mu1", "mu2", "mass", "pt", "rapidity", "energy", "n_pairs"])
+    return pd.concat(partes, ignore_index=True)
+
+
+def dimuon_file(path, output_dir=DIMUON_DIR, opposite_sign=True, criterion="z_mass", governor=None):
+    """
+    Grava os pares e os melhores pares de um arquivo ROOT em Parquet, bloco a bloco.
+
+    :param path: Arquivo ROOT.
+    :param output_dir: Diretório de saída.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :param criterion: Critério do melhor par.
+    :param governor: MemoryGovernor que dimensiona os blocos.
+    :return: Dicionário com arquivo, número de eventos e de pares e os dois Parquet gravados.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, os.path.basename(path).replace(".root.1", ""))
+    saidas = {"pairs_output": base + ".pairs.parquet", "events_output": base + ".events.parquet"}
+    writers = {}
+    n_eventos, n_pares = 0, 0
+
+    try:
+        for pares, eventos in iterate_dimuons(path, opposite_sign, criterion, governor):
+            for nome, df in (("pairs_output", pares), ("events_output", eventos)):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if nome not in writers:
+                    writers[nome] = pq.ParquetWriter(saidas[nome] + ".tmp", table.schema)
+                writers[nome].write_table(table)
+            n_eventos += len(eventos)
+            n_pares += len(pares)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for nome in writers:
+        os.replace(saidas[nome] + ".tmp", saidas[nome])
+    print(f"✅ Dimúons de {os.path.basename(path)}: {n_pares} pares em {n_eventos} eventos.")
+    return {"file": path, "events": n_eventos, "pairs": n_pares, **saidas}
+
+
+def dimuon_files(files, output_dir=DIMUON_DIR, opposite_sign=True, criterion="z_mass", n_jobs=None, cache=None):
+    """
+    dimuon_file em paralelo, um arquivo por processo.
+
+    :param files: Arquivos ROOT (ou URLs, com cache).
+    :param output_dir: Diretório de saída.
+    :param opposite_sign: Mantém só pares de cargas opostas.
+    :param criterion: Critério do melhor par.
+    :param n_jobs: Número de processos (padrão: um por arquivo, limitado pelos núcleos).
+    :param cache: RawCache opcional: arquivos despejados voltam a ser baixados e os próximos já baixam.
+    :return: Lista com o resumo de cada arquivo.
+    """
+    from memory_governor import MemoryGovernor
+
+    n_jobs = max(1, n_jobs or min(len(files), os.cpu_count() or 1))
+    # Cada processo lê com a sua fatia do orçamento de memória
+    governor = MemoryGovernor().share(n_jobs)
+    tarefa = partial(dimuon_file, output_dir=output_dir, opposite_sign=opposite_sign, criterion=criterion,
+                     governor=governor)
+    if cache is not None:
+        return cache.map(tarefa, files, max_workers=n_jobs)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(tarefa, files))
+
+
+if __name__ == "__main__":
+    from raw_cache import RawCache
+    from download import urls, download_file
+
+    # Fila completa de arquivos: os despejados do cache bruto são baixados de novo
+    cache = RawCache(download=download_file)
+    dimuon_files(urls, cache=cache)
+    cache.close()
@@ -27,12 +27,18 @@ urls = [
 ]
 
 def download_file(url):
+    """
+    Baixa um arquivo com xrdcp para INPUT_DIR (via diretório temporário).
+
+    :param url: URL XRootD do arquivo.
+    :return: Caminho local, ou None se o download falhou.
+    """
     filename = url.split("/")[-1]
     final_filepath = os.path.join(INPUT_DIR, filename)
 
     if os.path.exists(final_filepath):
         print(f"Pulando arquivo: {final_filepath} (já existe)")
-        return
+        return final_filepath
 
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -45,14 +51,25 @@ def download_file(url):
 
             shutil.move(temp_filepath, final_filepath)
             print(f"✅ Arquivo movido para o destino final: {final_filepath}")
+            return final_filepath
 
     except subprocess.CalledProcessError as e:
         print(f"❌ Erro ao baixar: {url}: {e}")
     except Exception as e:
         print(f"❌ Erro geral ao processar {url}: {e}")
 
-# Executa os downloads sequencialmente
-for url in urls:
-    download_file(url)
+if __name__ == "__main__":
+    from raw_cache import RawCache
+
+    # Downloads sequenciais respeitando a cota do diretório bruto: arquivos já convertidos são
+    # despejados para abrir espaço; com a cota cheia de não convertidos, espera a conversão
+    cache = RawCache(INPUT_DIR, download=download_file, checkpoint_file=CHECKPOINT_FILE)
+    for url in urls:
+        if cache.is_converted(url):
+            print(f"Pulando arquivo: {url.split('/')[-1]} (já convertido)")
+            continue
+        cache.wait_for_space(cache.expected_size())
+        cache.ensure(url)
+    cache.close()
 
-print("🎉 Todos os downloads foram concluídos!")
\ No newline at end of file
+    print("🎉 Todos os downloads foram concluídos!")
\ No newline at end of file
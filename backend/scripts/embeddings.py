@@ -0,0 +1,122 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from feature_matrix import load_feature_matrix
+from knn_graph import build_knn_graph, knn_sparse_graph, umap_precomputed_knn
+
+# Parâmetros padrão de cada projeção (os mesmos usados no main.py)
+EMBEDDING_PARAMS = {
+    "tsne": {"n_components": 3, "perplexity": 40, "random_state": 42},
+    "umap": {"n_neighbors": 20, "min_dist": 0.05, "n_components": 3, "random_state": 42},
+    "isomap": {"n_components": 3, "n_neighbors": 10},
+}
+
+
+def required_neighbors(methods, params=None):
+    """
+    Calcula o k mínimo do grafo kNN compartilhado que atende a todos os métodos.
+
+    :param methods: Métodos que vão usar o grafo.
+    :param params: Dicionário {method: parâmetros} (padrão: EMBEDDING_PARAMS).
+    :return: Número de vizinhos (incluindo o próprio evento).
+    """
+    params = params or EMBEDDING_PARAMS
+    k = 2
+    for method in methods:
+        p = params[method]
+        if method == "tsne":
+            # Mesma regra do scikit-learn: 3 * perplexidade + 1 vizinhos, mais o próprio evento
+            k = max(k, int(3.0 * p.get("perplexity", 30.0) + 1) + 1)
+        elif method == "umap":
+            k = max(k, p.get("n_neighbors", 15))
+        elif method == "isomap":
+            k = max(k, p.get("n_neighbors", 5) + 1)
+    return k
+
+
+def run_embedding(method, matrix_path, params=None, knn_neighbors=None, knn_cache_dir=None):
+    """
+    Executa uma projeção sobre a matriz de features compartilhada em disco.
+
+    Os imports pesados ficam dentro da função para que cada worker carregue
+    apenas a biblioteca do método que vai executar. Se knn_neighbors for
+    informado, o grafo kNN compartilhado (cache em disco) substitui a busca de
+    vizinhos interna de cada método.
+
+    :param method: "tsne", "umap" ou "isomap".
+    :param matrix_path: Caminho do .npy gerado por build_feature_matrix.
+    :param params: Parâmetros do método (padrão: EMBEDDING_PARAMS[method]).
+    :param knn_neighbors: k do grafo kNN compartilhado (None = sem grafo).
+    :param knn_cache_dir: Diretório do cache do grafo kNN.
+    :return: Tupla (method, resultado float32 com shape (n_eventos, n_components)).
+    """
+    params = dict(params if params is not None else EMBEDDING_PARAMS[method])
+    X = load_feature_matrix(matrix_path)
+
+    graph = None
+    if knn_neighbors is not None:
+        graph = build_knn_graph(X, knn_neighbors, cache_dir=knn_cache_dir)
+
+    if method == "tsne":
+        from sklearn.manifold import TSNE
+        if graph is not None:
+            params.update(metric="precomputed", init="random")
+            X = knn_sparse_graph(*graph)
+        model = TSNE(**params)
+    elif method == "umap":
+        import umap
+        if graph is not None:
+            params["precomputed_knn"] = umap_precomputed_knn(*graph, params.get("n_neighbors", 15))
+        model = umap.UMAP(**params)
+    elif method == "isomap":
+        from sklearn.manifold import Isomap
+        if graph is not None:
+            params["metric"] = "precomputed"
+            X = knn_sparse_graph(*graph, n_neighbors=params.get("n_neighbors", 5) + 1)
+        model = Isomap(**params)
+    else:
+        raise ValueError(f"🚨 Método de projeção desconhecido: {method}")
+
+    return method, np.asarray(model.fit_transform(X), dtype=np.float32)
+
+
+def _build_shared_graph(matrix_path, knn_neighbors, knn_cache_dir):
+    build_knn_graph(load_feature_matrix(matrix_path), knn_neighbors, cache_dir=knn_cache_dir)
+
+
+def run_embeddings_parallel(matrix_path, methods=("tsne", "umap", "isomap"), max_workers=None,
+                            knn_cache_dir=None):
+    """
+    Executa várias projeções em paralelo, uma por processo.
+
+    Todos os workers abrem a mesma matriz via memmap, então o tempo total fica
+    próximo ao do método mais lento em vez da soma de todos. Com knn_cache_dir,
+    o grafo kNN é construído uma única vez aqui e reaproveitado pelos workers.
+
+    :param matrix_path: Caminho do .npy gerado por build_feature_matrix.
+    :param methods: Métodos a executar.
+    :param max_workers: Número de processos (padrão: um por método).
+    :param knn_cache_dir: Diretório do cache do grafo kNN (None = sem grafo compartilhado).
+    :return: Dicionário {method: resultado}.
+    """
+    max_workers = max_workers or min(len(methods), os.cpu_count() or 1)
+    resultados = {}
+
+    knn_neighbors = required_neighbors(methods) if knn_cache_dir is not None else None
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        if knn_neighbors is not None:
+            # Construído dentro do pool: as threads do Numba não podem existir no processo pai antes do fork
+            executor.submit(_build_shared_graph, matrix_path, knn_neighbors, knn_cache_dir).result()
+
+        futures = [
+            executor.submit(run_embedding, method, matrix_path, None, knn_neighbors, knn_cache_dir)
+            for method in methods
+        ]
+        for future in futures:
+            method, result = future.result()
+            resultados[method] = result
+            print(f"✅ Projeção {method} concluída.")
+
+    return resultados
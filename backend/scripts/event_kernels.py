@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+# Tipo padrão das colunas de saída
+DEFAULT_OUTPUT_DTYPE = np.float64
+
+
+def jagged_buffers(array):
+    """
+    Offsets e conteúdo de um array jagged de um nível (ou valores de um array plano).
+
+    :param array: awkward Array (var * número) ou array NumPy plano.
+    :return: Tupla (offsets, conteúdo) para jagged; (None, valores) para plano.
+    """
+    import awkward as ak
+
+    if isinstance(array, np.ndarray) or array.ndim == 1:
+        return None, np.ascontiguousarray(ak.to_numpy(array) if not isinstance(array, np.ndarray) else array)
+    counts = ak.to_numpy(ak.num(array, axis=1)).astype(np.int64)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, np.ascontiguousarray(ak.to_numpy(ak.flatten(array, axis=None)))
+
+
+def _driver_source(kinds, n_outputs):
+    # Gera o laço paralelo para a combinação de argumentos (jagged/plano) e número de saídas
+    parametros, argumentos = [], []
+    for i, kind in enumerate(kinds):
+        if kind == "jagged":
+            parametros += [f"off{i}", f"c{i}"]
+            argumentos.append(f"c{i}[off{i}[e]:off{i}[e + 1]]")
+        else:
+            parametros.append(f"v{i}")
+            argumentos.append(f"v{i}[e]")
+    saidas = [f"out{j}" for j in range(n_outputs)]
+
+    linhas = [f"def _driver(n, {', '.join(parametros + saidas)}):",
+              "    for e in prange(n):",
+              f"        r = user({', '.join(argumentos)})"]
+    if n_outputs == 1:
+        linhas.append("        out0[e] = r")
+    else:
+        linhas += [f"        out{j}[e] = r[{j}]" for j in range(n_outputs)]
+    return "\n".join(linhas)
+
+
+class EventKernel:
+    """
+    Função do usuário aplicada evento a evento, compilada com Numba e executada em paralelo.
+
+    A função recebe, para cada evento, uma fatia do conteúdo de cada
+    argumento jagged (ex.: os pT dos múons daquele evento) ou o valor do
+    evento para argumentos planos, e devolve um escalar ou uma tupla com
+    um escalar por saída. O laço sobre eventos é gerado e compilado com
+    prange, direto sobre os buffers de offsets e conteúdo do bloco.
+
+    Exemplo:
+
+        @event_kernel(outputs=("pt_lider", "n_centrais"))
+        def lider(pt, eta):
+            n = 0
+            for x in eta:
+                n += abs(x) < 2.5
+            return (pt.max() if len(pt) else np.nan), n
+
+        colunas = lider(chunk["MuonsAuxDyn.pt"], chunk["MuonsAuxDyn.eta"])
+    """
+
+    def __init__(self, func, outputs=("value",), dtypes=None, parallel=True):
+        self.func = func
+        self.outputs = tuple(outputs)
+        dtypes = dtypes if dtypes is not None else DEFAULT_OUTPUT_DTYPE
+        if not isinstance(dtypes, (list, tuple)):
+            dtypes = [dtypes] * len(self.outputs)
+        self.dtypes = [np.dtype(d) for d in dtypes]
+        self.parallel = parallel
+        self._user = None
+        self._drivers = {}
+
+    def __repr__(self):
+        return f"EventKernel({getattr(self.func, '__name__', self.func)}, outputs={self.outputs})"
+
+    def _driver(self, kinds):
+        # Compilação preguiçosa: o Numba só é carregado na primeira chamada (importante antes de fork)
+        import numba
+
+        if self._user is None:
+            self._user = self.func if hasattr(self.func, "py_func") else numba.njit(self.func)
+        if kinds not in self._drivers:
+            namespace = {"user": self._user, "prange": numba.prange, "np": np}
+            exec(_driver_source(kinds, len(self.outputs)), namespace)
+            self._drivers[kinds] = numba.njit(parallel=self.parallel)(namespace["_driver"])
+        return self._drivers[kinds]
+
+    def __call__(self, *arrays):
+        """
+        Executa o kernel sobre um bloco.
+
+        :param arrays: Um array por argumento da função (awkward jagged, awkward plano ou NumPy),
+            todos com o mesmo número de eventos.
+        :return: Dicionário {saída: array NumPy com um valor por evento}.
+        """
+        buffers, kinds = [], []
+        n_eventos = None
+        for array in arrays:
+            offsets, conteudo = jagged_buffers(array)
+            n = len(conteudo) if offsets is None else len(offsets) - 1
+            if n_eventos is not None and n != n_eventos:
+                raise ValueError(f"🚨 Argumentos com números de eventos diferentes: {n_eventos} e {n}.")
+            n_eventos = n
+            if offsets is None:
+                buffers.append(conteudo)
+                kinds.append("flat")
+            else:
+                buffers += [offsets, conteudo]
+                kinds.append("jagged")
+
+        n_eventos = n_eventos or 0
+        saidas = [np.empty(n_eventos, dtype=d) for d in self.dtypes]
+        if n_eventos:
+            self._driver(tuple(kinds))(n_eventos, *buffers, *saidas)
+        return dict(zip(self.outputs, saidas))
+
+    def run_chunk(self, chunk, branches):
+        """
+        Executa o kernel sobre ramos de um bloco lido com uproot (library="ak").
+
+        :param chunk: Bloco de eventos.
+        :param branches: Ramos passados à função, na ordem dos argumentos.
+        :return: DataFrame com uma coluna por saída.
+        """
+        return pd.DataFrame(self(*[chunk[b] for b in branches]))
+
+    def iterate_file(self, path, branches, governor=None, tree_name="CollectionTree"):
+        """
+        Executa o kernel sobre um arquivo ROOT (local ou remoto) em blocos dimensionados pelo MemoryGovernor.
+
+        :param path: Arquivo ROOT ou URL.
+        :param branches: Ramos passados à função, na ordem dos argumentos.
+        :param governor: MemoryGovernor (padrão: orçamento padrão).
+        :param tree_name: Nome da árvore.
+        :return: Gerador de DataFrames com a coluna entry e as saídas.
+        """
+        from memory_governor import MemoryGovernor
+        from remote_source import open_root
+
+        governor = governor or MemoryGovernor()
+        inicio = 0
+        with open_root(path) as file:
+            tree = file[tree_name]
+            for chunk in governor.iterate(tree, branches, library="ak"):
+                resultado = self.run_chunk(chunk, branches)
+                resultado.insert(0, "entry", np.arange(inicio, inicio + len(resultado)))
+                inicio += len(resultado)
+                yield resultado
+
+    def run_file(self, path, branches, governor=None, tree_name="CollectionTree"):
+        """iterate_file concatenado num único DataFrame."""
+        partes = list(self.iterate_file(path, branches, governor, tree_name))
+        if not partes:
+            return pd.DataFrame(columns=["entry", *self.outputs])
+        return pd.concat(partes, ignore_index=True)
+
+
+def event_kernel(func=None, *, outputs=("value",), dtypes=None, parallel=True):
+    """
+    Decorador que transforma uma função por evento em EventKernel.
+
+    :param func: Função por evento (usada como @event_kernel ou @event_kernel(...)).
+    :param outputs: Nomes das saídas (um por elemento da tupla devolvida).
+    :param dtypes: Tipo de cada saída (ou um só para todas).
+    :param parallel: Executa os eventos em paralelo (prange).
+    :return: EventKernel.
+    """
+    if func is None:
+        return lambda f: EventKernel(f, outputs=outputs, dtypes=dtypes, parallel=parallel)
+    return EventKernel(func, outputs=outputs, dtypes=dtypes, parallel=parallel)
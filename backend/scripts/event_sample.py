@@ -0,0 +1,369 @@
+import os
+import glob
+import json
+import zlib
+import numpy as np
+import pandas as pd
+from compaction import METADATA_FILE, dataset_files
+from quantile_sketch import KLLSketch
+
+# Amostras salvas junto dos dados processados (subdiretório ignorado pelo glob *.parquet e pelo _metadata)
+SAMPLE_SUBDIR = "_sample"
+SAMPLE_FILE = "events_sample.parquet"
+SIDECAR_SUFFIX = ".sample.parquet"
+
+# Eventos mantidos por estrato e eventos mais anômalos sempre incluídos
+SAMPLE_PER_STRATUM = 2000
+SAMPLE_TAIL = 1000
+
+# Colunas guardadas na amostra usada pelo dashboard (as ausentes nos dados são ignoradas)
+SAMPLE_COLUMNS = ["U1", "U2", "U3", "cluster", "anomaly_score", "MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"]
+
+SAMPLE_STRATA = ("cluster",)
+SAMPLE_SCORE_COLUMN = "anomaly_score"
+SAMPLE_BATCH_ROWS = 200_000
+
+# Chave do estado do amostrador nos metadados do Parquet
+SAMPLE_METADATA_KEY = b"event_sample"
+
+# Identificação de cada evento no dataset (mantida pela compactação)
+EVENT_KEY = ["source_file", "source_row"]
+
+
+def quantile_edges(source, n_bins=10):
+    """
+    Bordas de n_bins faixas de mesma população (ex.: decis do anomaly_score), para estratificar.
+
+    :param source: Valores ou KLLSketch da coluna.
+    :param n_bins: Número de faixas.
+    :return: Bordas internas (n_bins - 1 no máximo, sem repetições).
+    """
+    q = np.linspace(0.0, 1.0, n_bins + 1)[1:-1]
+    if isinstance(source, KLLSketch):
+        return np.unique(source.quantile(q))
+    return np.unique(np.nanquantile(np.asarray(source, dtype=np.float64), q))
+
+
+class StratifiedSampler:
+    """
+    Amostra estratificada em uma passada, mesclável entre arquivos, com a cauda de anomalias garantida.
+
+    Cada evento recebe uma chave aleatória uniforme e cada estrato (cluster,
+    faixa de centralidade, decil de anomalia...) guarda os per_stratum
+    eventos de menor chave: é uma amostra uniforme sem reposição do estrato,
+    e mesclar dois amostradores de arquivos disjuntos (união e corte pelas
+    menores chaves) dá o mesmo resultado que uma passada única. Os n_tail
+    eventos de maior score entram sempre.
+
+    Em to_frame(), os eventos da cauda têm peso 1 e os demais, peso
+    (eventos do estrato fora da cauda) / (amostrados do estrato fora da
+    cauda), então somas ponderadas estimam totais do dataset inteiro.
+
+    Linhas sem valor numa coluna de estrato ou na origem (ex.: o
+    preenchimento das conexões fractais nos Parquet processados) não são
+    eventos: ficam fora das contagens, do reservatório e da cauda.
+    """
+
+    def __init__(self, per_stratum=SAMPLE_PER_STRATUM, n_tail=SAMPLE_TAIL, strata=SAMPLE_STRATA, bins=None,
+                 score_column=SAMPLE_SCORE_COLUMN, columns=None, seed=42):
+        """
+        :param per_stratum: Eventos mantidos por estrato.
+        :param n_tail: Eventos de maior score sempre mantidos (0 desativa).
+        :param strata: Colunas que definem o estrato (combinadas).
+        :param bins: {coluna: bordas} para estratificar colunas contínuas por faixa.
+        :param score_column: Coluna da cauda (ignorada se ausente nos dados).
+        :param columns: Colunas guardadas (padrão: todas as lidas).
+        :param seed: Semente das chaves aleatórias.
+        """
+        self.per_stratum = int(per_stratum)
+        self.n_tail = int(n_tail)
+        self.strata = [strata] if isinstance(strata, str) else list(strata)
+        self.bins = {col: np.asarray(edges, dtype=np.float64) for col, edges in (bins or {}).items()}
+        self.score_column = score_column
+        self.columns = list(columns) if columns is not None else None
+        self.seed = seed
+        self.counts = {}
+        self.reservoir = None
+        self.tail = None
+        self._rngs = {}
+
+    def __repr__(self):
+        return (f"StratifiedSampler({self.n_seen} eventos vistos, {len(self.counts)} estratos, "
+                f"{len(self)} amostrados)")
+
+    def __len__(self):
+        return 0 if self.reservoir is None else len(self.reservoir) + len(self._tail_only())
+
+    @property
+    def n_seen(self):
+        return int(sum(self.counts.values()))
+
+    def params(self):
+        """Parâmetros que precisam coincidir para mesclar dois amostradores."""
+        return {"per_stratum": self.per_stratum, "n_tail": self.n_tail, "strata": self.strata,
+                "bins": {col: edges.tolist() for col, edges in self.bins.items()},
+                "score_column": self.score_column}
+
+    def stratum_labels(self, df):
+        """
+        Rótulo do estrato de cada evento (ex.: "cluster=3|centralidade=2").
+
+        Valores inteiros guardados como float (coluna com nulos) viram "3", não
+        "3.0", para o mesmo estrato ter o mesmo rótulo em todos os arquivos.
+
+        :param df: Lote de eventos, sem nulos nas colunas de estrato (ver update).
+        :return: Series de strings.
+        """
+        rotulos = None
+        for col in self.strata:
+            if col not in df.columns:
+                raise ValueError(f"🚨 Coluna de estrato ausente: {col}")
+            valores = df[col]
+            if valores.isna().any():
+                raise ValueError(f"🚨 Coluna de estrato {col} com valores ausentes.")
+            if col in self.bins:
+                valores = pd.Series(np.digitize(valores.to_numpy(dtype=np.float64), self.bins[col]), index=df.index)
+            elif pd.api.types.is_float_dtype(valores) and (valores % 1 == 0).all():
+                valores = valores.astype(np.int64)
+            parte = col + "=" + valores.astype(str)
+            rotulos = parte if rotulos is None else rotulos + "|" + parte
+        return rotulos
+
+    def _trim(self, df):
+        # Menores chaves de cada estrato
+        return df.sort_values("_key", kind="stable").groupby("_stratum", sort=False).head(self.per_stratum)
+
+    def _trim_tail(self, df):
+        return df.nlargest(self.n_tail, self.score_column) if len(df) > self.n_tail else df
+
+    def update(self, df, source_file=None, first_row=0):
+        """
+        Adiciona um lote de eventos.
+
+        :param df: Lote (DataFrame).
+        :param source_file: Arquivo de origem (usado se o lote não tiver source_file/source_row).
+        :param first_row: Linha do primeiro evento do lote no arquivo.
+        """
+        n = len(df)
+        if not n:
+            return
+        for col in self.strata:
+            if col not in df.columns:
+                raise ValueError(f"🚨 Coluna de estrato ausente: {col}")
+        colunas = [c for c in (self.columns or df.columns) if c in df.columns]
+        lote = df[list(dict.fromkeys(colunas + [c for c in EVENT_KEY if c in df.columns]))].copy()
+        if "source_file" not in lote.columns:
+            lote["source_file"] = source_file
+            lote["source_row"] = np.arange(first_row, first_row + n, dtype=np.int64)
+
+        # Uma sequência de chaves por arquivo: a amostra não depende da ordem dos arquivos nem do tamanho dos lotes
+        # (as chaves são sorteadas para todas as linhas, antes de descartar as que não são eventos)
+        if source_file not in self._rngs:
+            self._rngs[source_file] = np.random.default_rng([self.seed, zlib.crc32(str(source_file).encode())])
+        lote["_key"] = self._rngs[source_file].random(n)
+
+        # Linhas sem estrato ou sem origem não são eventos; descartadas aqui, o resultado não depende
+        # de como cada versão do pandas converte nulos em texto
+        eventos = df[self.strata].notna().all(axis=1).to_numpy() & lote[EVENT_KEY].notna().all(axis=1).to_numpy()
+        if not eventos.all():
+            lote, df = lote[eventos].copy(), df[eventos]
+            if not len(lote):
+                return
+        lote["_stratum"] = self.stratum_labels(df).to_numpy()
+
+        for estrato, quantidade in lote["_stratum"].value_counts().items():
+            self.counts[estrato] = self.counts.get(estrato, 0) + int(quantidade)
+
+        partes = [self._trim(lote)] if self.reservoir is None else [self.reservoir, self._trim(lote)]
+        self.reservoir = self._trim(pd.concat(partes, ignore_index=True))
+
+        if self.n_tail and self.score_column in lote.columns:
+            partes = [self._trim_tail(lote)] if self.tail is None else [self.tail, self._trim_tail(lote)]
+            self.tail = self._trim_tail(pd.concat(partes, ignore_index=True))
+
+    def merge(self, other):
+        """
+        Mescla outro amostrador (de eventos disjuntos) neste (in-place).
+
+        :param other: StratifiedSampler com os mesmos parâmetros.
+        :return: O próprio amostrador.
+        """
+        if other.params() != self.params():
+            raise ValueError(f"🚨 Amostradores incompatíveis: {self.params()} != {other.params()}")
+        for estrato, quantidade in other.counts.items():
+            self.counts[estrato] = self.counts.get(estrato, 0) + quantidade
+        if other.reservoir is not None:
+            partes = [p for p in (self.reservoir, other.reservoir) if p is not None]
+            self.reservoir = self._trim(pd.concat(partes, ignore_index=True))
+        if other.tail is not None:
+            partes = [p for p in (self.tail, other.tail) if p is not None]
+            self.tail = self._trim_tail(pd.concat(partes, ignore_index=True))
+        return self
+
+    def _tail_only(self):
+        # Eventos da cauda que não estão no reservatório
+        if self.tail is None or not len(self.tail):
+            return self.tail.iloc[:0] if self.tail is not None else pd.DataFrame()
+        no_reservatorio = pd.MultiIndex.from_frame(self.reservoir[EVENT_KEY])
+        return self.tail[~pd.MultiIndex.from_frame(self.tail[EVENT_KEY]).isin(no_reservatorio)]
+
+    def to_frame(self):
+        """
+        Amostra final: um evento por linha, com sample_weight, sample_stratum, in_reservoir e in_tail.
+
+        :return: DataFrame ordenado por (source_file, source_row).
+        """
+        if self.reservoir is None:
+            return pd.DataFrame()
+
+        reservatorio = self.reservoir.assign(in_reservoir=True, in_tail=False)
+        cauda = self.tail if self.tail is not None else reservatorio.iloc[:0]
+        if len(cauda):
+            reservatorio["in_tail"] = pd.MultiIndex.from_frame(reservatorio[EVENT_KEY]).isin(
+                pd.MultiIndex.from_frame(cauda[EVENT_KEY]))
+        so_cauda = self._tail_only().assign(in_reservoir=False, in_tail=True) if len(cauda) else cauda.iloc[:0]
+
+        # Peso do estrato: eventos fora da cauda / amostrados fora da cauda
+        vistos = pd.Series(self.counts, dtype=np.float64)
+        na_cauda = cauda["_stratum"].value_counts().reindex(vistos.index, fill_value=0)
+        amostrados = reservatorio.loc[~reservatorio["in_tail"], "_stratum"].value_counts() \
+            .reindex(vistos.index, fill_value=0)
+        pesos = (vistos - na_cauda) / amostrados.where(amostrados > 0)
+
+        amostra = pd.concat([reservatorio, so_cauda], ignore_index=True)
+        amostra["sample_weight"] = np.where(amostra["in_tail"], 1.0,
+                                            amostra["_stratum"].map(pesos).to_numpy(dtype=np.float64))
+        amostra = amostra.rename(columns={"_stratum": "sample_stratum", "_key": "sample_key"})
+        return amostra.sort_values(EVENT_KEY, kind="stable", ignore_index=True)
+
+    def save(self, path):
+        """Grava a amostra (com pesos) e o estado necessário para mesclá-la depois."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tabela = pa.Table.from_pandas(self.to_frame(), preserve_index=False)
+        estado = {**self.params(), "columns": self.columns, "seed": self.seed, "counts": self.counts}
+        tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}),
+                                                 SAMPLE_METADATA_KEY: json.dumps(estado).encode()})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pq.write_table(tabela, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Reabre uma amostra gravada por save() (pode ser mesclada com outras)."""
+        import pyarrow.parquet as pq
+
+        tabela = pq.read_table(path)
+        estado = json.loads(tabela.schema.metadata[SAMPLE_METADATA_KEY])
+        sampler = cls(per_stratum=estado["per_stratum"], n_tail=estado["n_tail"], strata=estado["strata"],
+                      bins=estado["bins"], score_column=estado["score_column"], columns=estado["columns"],
+                      seed=estado["seed"])
+        sampler.counts = {k: int(v) for k, v in estado["counts"].items()}
+
+        df = tabela.to_pandas().rename(columns={"sample_stratum": "_stratum", "sample_key": "_key"})
+        internas = ["in_reservoir", "in_tail", "sample_weight"]
+        sampler.reservoir = df[df["in_reservoir"]].drop(columns=internas).reset_index(drop=True)
+        if estado["n_tail"] and estado["score_column"] in df.columns:
+            sampler.tail = df[df["in_tail"]].drop(columns=internas).reset_index(drop=True)
+        return sampler
+
+
+def data_files(directory):
+    """Arquivos de dados do diretório processado (compactado, com _metadata, ou um Parquet por arquivo)."""
+    if os.path.exists(os.path.join(directory, METADATA_FILE)):
+        return dataset_files(directory)
+    return sorted(glob.glob(os.path.join(directory, "*.parquet")))
+
+
+def sidecar_path(directory, path):
+    """Amostra de um único arquivo de dados, em <directory>/_sample/."""
+    nome = os.path.relpath(path, directory).replace(os.sep, "__")
+    return os.path.join(directory, SAMPLE_SUBDIR, nome[:-len(".parquet")] + SIDECAR_SUFFIX)
+
+
+def sample_file(path, columns=None, batch_rows=SAMPLE_BATCH_ROWS, **options):
+    """
+    Amostra um arquivo Parquet em uma passada, lote a lote.
+
+    :param path: Arquivo Parquet processado.
+    :param columns: Colunas guardadas na amostra (padrão: todas).
+    :param batch_rows: Linhas por lote lido.
+    :param options: Parâmetros do StratifiedSampler.
+    :return: StratifiedSampler.
+    """
+    import pyarrow.parquet as pq
+    from histograms import CENTRALITY_COLUMN, add_centrality
+
+    arquivo = pq.ParquetFile(path)
+    disponiveis = arquivo.schema_arrow.names
+    sampler = StratifiedSampler(columns=columns, **options)
+
+    necessarias = set(columns or disponiveis) | set(sampler.strata) | {sampler.score_column} | set(EVENT_KEY)
+    if CENTRALITY_COLUMN in sampler.strata:
+        necessarias |= {"EventInfoAuxDyn.CentralityMin", "EventInfoAuxDyn.CentralityMax"}
+    leitura = [c for c in disponiveis if c in necessarias]
+
+    nome, inicio = os.path.basename(path), 0
+    for batch in arquivo.iter_batches(batch_size=batch_rows, columns=leitura):
+        lote = batch.to_pandas()
+        if CENTRALITY_COLUMN in sampler.strata:
+            add_centrality(lote)
+        sampler.update(lote, source_file=nome, first_row=inicio)
+        inicio += len(lote)
+    return sampler
+
+
+def _sidecar_valid(path, data_path, sampler_params, columns):
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(data_path):
+        return None
+    sampler = StratifiedSampler.load(path)
+    if sampler.params() != sampler_params or (columns is not None and sampler.columns != list(columns)):
+        return None
+    return sampler
+
+
+def build_dataset_sample(directory, columns=None, **options):
+    """
+    Amostra do dataset inteiro: uma amostra por arquivo (reaproveitada se o arquivo não mudou), mescladas.
+
+    :param directory: Diretório dos dados processados.
+    :param columns: Colunas guardadas (padrão: todas).
+    :param options: Parâmetros do StratifiedSampler.
+    :return: StratifiedSampler mesclado (também gravado em <directory>/_sample/events_sample.parquet).
+    """
+    parametros = StratifiedSampler(**options).params()
+    total = StratifiedSampler(columns=columns, **options)
+    for path in data_files(directory):
+        sidecar = sidecar_path(directory, path)
+        sampler = _sidecar_valid(sidecar, path, parametros, columns)
+        if sampler is None:
+            sampler = sample_file(path, columns=columns, **options)
+            sampler.save(sidecar)
+        total.merge(sampler)
+
+    total.save(os.path.join(directory, SAMPLE_SUBDIR, SAMPLE_FILE))
+    print(f"✅ Amostra estratificada: {len(total)} de {total.n_seen} eventos ({len(total.counts)} estratos)")
+    return total
+
+
+def load_dataset_sample(directory, columns=None, rebuild=False, **options):
+    """
+    Amostra salva do dataset, refeita se algum arquivo de dados for mais novo ou os parâmetros mudaram.
+
+    :param directory: Diretório dos dados processados.
+    :param columns: Colunas guardadas (padrão: todas).
+    :param rebuild: Força a reconstrução.
+    :param options: Parâmetros do StratifiedSampler.
+    :return: StratifiedSampler.
+    """
+    path = os.path.join(directory, SAMPLE_SUBDIR, SAMPLE_FILE)
+    arquivos = data_files(directory)
+    if not rebuild and os.path.exists(path) and arquivos and \
+            os.path.getmtime(path) >= max(os.path.getmtime(f) for f in arquivos):
+        sampler = StratifiedSampler.load(path)
+        if sampler.params() == StratifiedSampler(**options).params() and \
+                (columns is None or sampler.columns == list(columns)):
+            return sampler
+    return build_dataset_sample(directory, columns=columns, **options)
@@ -0,0 +1,54 @@
+import os
+import json
+import numpy as np
+
+# Colunas usadas pelas projeções não lineares (t-SNE, UMAP, Isomap)
+FEATURE_COLUMNS = ["pT_medio", "energia_total", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"]
+
+
+def build_feature_matrix(df, columns, output_path):
+    """
+    Padroniza as colunas uma única vez e grava a matriz em disco (float32, contígua).
+
+    A matriz é salva em formato .npy para poder ser reaberta via memmap por
+    vários processos sem copiar os dados. A média e o desvio padrão usados ficam
+    num arquivo .json ao lado.
+
+    :param df: DataFrame com os eventos.
+    :param columns: Lista de colunas que formam a matriz de features.
+    :param output_path: Caminho do arquivo .npy de saída.
+    :return: Matriz memmap (somente leitura) com shape (n_eventos, n_colunas).
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    n_rows, n_cols = len(df), len(columns)
+    matrix = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=(n_rows, n_cols))
+
+    media = np.zeros(n_cols, dtype=np.float64)
+    desvio = np.ones(n_cols, dtype=np.float64)
+
+    # Coluna a coluna para não materializar uma cópia float64 do DataFrame inteiro
+    for j, col in enumerate(columns):
+        valores = df[col].to_numpy(dtype=np.float64)
+        media[j] = valores.mean()
+        std = valores.std()
+        desvio[j] = std if std > 0 else 1.0
+        matrix[:, j] = (valores - media[j]) / desvio[j]
+
+    matrix.flush()
+    del matrix
+
+    with open(output_path + ".json", "w") as f:
+        json.dump({"columns": list(columns), "mean": media.tolist(), "std": desvio.tolist(), "rows": n_rows}, f, indent=4)
+
+    return load_feature_matrix(output_path)
+
+
+def load_feature_matrix(path):
+    """
+    Abre a matriz de features salva em disco sem carregá-la na RAM.
+
+    :param path: Caminho do arquivo .npy.
+    :return: Matriz memmap somente leitura.
+    """
+    return np.load(path, mmap_mode="r")
@@ -0,0 +1,159 @@
+import os
+import hashlib
+import itertools
+import numpy as np
+import pandas as pd
+from knn_graph import KNN_CACHE_DIR, build_knn_graph, connect_knn_components, knn_cache_key, knn_sparse_graph
+
+# Árvores de ligação simples (uma por matriz, grafo kNN e min_samples) salvas entre execuções
+HDBSCAN_TREE_DIR = "/app/data/hdbscan_trees"
+
+# Vizinhos mínimos do grafo kNN usado pela varredura
+SWEEP_N_NEIGHBORS = 15
+
+# min_samples usado quando a varredura não especifica (o HDBSCAN do pipeline usa min_samples = min_cluster_size = 10)
+SWEEP_MIN_SAMPLES = 10
+
+
+class HDBSCANSweep:
+    """
+    Varredura de parâmetros do HDBSCAN reaproveitando a árvore de ligação simples.
+
+    A parte cara do HDBSCAN (distâncias de alcançabilidade mútua e árvore
+    geradora mínima) depende só da matriz, do grafo kNN e de min_samples.
+    A árvore resultante é calculada uma vez por min_samples e salva em
+    disco. min_cluster_size, cluster_selection_epsilon e o método de
+    seleção só afetam a condensação da árvore e a escolha dos clusters,
+    que custam uma fração de um ajuste completo.
+    """
+
+    def __init__(self, X, n_neighbors=SWEEP_N_NEIGHBORS, metric="euclidean",
+                 knn_cache_dir=KNN_CACHE_DIR, tree_dir=HDBSCAN_TREE_DIR):
+        self.X = X
+        self.n_neighbors = min(int(n_neighbors), len(X))
+        self.metric = metric
+        self.knn_cache_dir = knn_cache_dir
+        self.tree_dir = tree_dir
+        self._graph = None
+        self._trees = {}
+        self._key = knn_cache_key(X, metric, self.n_neighbors)
+
+    def __repr__(self):
+        return f"HDBSCANSweep({len(self.X)} eventos, k={self.n_neighbors}, árvores={sorted(self._trees)})"
+
+    def graph(self):
+        """Grafo kNN esparso e conexo (carregado do cache de knn_graph quando existe)."""
+        if self._graph is None:
+            indices, distances = build_knn_graph(self.X, n_neighbors=self.n_neighbors, metric=self.metric,
+                                                 cache_dir=self.knn_cache_dir)
+            self._graph = connect_knn_components(knn_sparse_graph(indices, distances), self.X)
+        return self._graph
+
+    def tree(self, min_samples=SWEEP_MIN_SAMPLES):
+        """
+        Árvore de ligação simples para um min_samples (memória → disco → cálculo).
+
+        :param min_samples: Vizinhos usados na distância de núcleo.
+        :return: Array (n_eventos - 1, 4) no formato do hdbscan (esquerda, direita, distância, tamanho).
+        """
+        min_samples = int(min_samples)
+        if min_samples >= self.n_neighbors:
+            raise ValueError(f"🚨 min_samples={min_samples} exige um grafo kNN com mais de {min_samples} vizinhos "
+                             f"(atual: {self.n_neighbors}).")
+        if min_samples in self._trees:
+            return self._trees[min_samples]
+
+        os.makedirs(self.tree_dir, exist_ok=True)
+        chave = hashlib.sha256(f"{self._key}|{min_samples}".encode()).hexdigest()
+        path = os.path.join(self.tree_dir, f"{chave}.npy")
+        if os.path.exists(path):
+            print(f"✅ Árvore HDBSCAN carregada do cache (min_samples={min_samples}): {path}")
+            arvore = np.load(path)
+        else:
+            from hdbscan import HDBSCAN
+
+            print(f"⚠️ Construindo árvore HDBSCAN (min_samples={min_samples})...")
+            # min_cluster_size não afeta a árvore de ligação simples; o menor valor deixa a condensação barata
+            clusterer = HDBSCAN(min_cluster_size=2, min_samples=min_samples, metric="precomputed").fit(self.graph())
+            arvore = np.asarray(clusterer._single_linkage_tree, dtype=np.float64)
+            np.save(path + ".tmp.npy", arvore)
+            os.replace(path + ".tmp.npy", path)
+            print(f"✅ Árvore HDBSCAN salva: {path}")
+
+        self._trees[min_samples] = arvore
+        return arvore
+
+    def cluster(self, min_cluster_size, min_samples=None, cluster_selection_epsilon=0.0,
+                cluster_selection_method="eom", allow_single_cluster=False):
+        """
+        Clusterização plana a partir da árvore salva (equivale a HDBSCAN(...).fit_predict no mesmo grafo).
+
+        :param min_cluster_size: Tamanho mínimo de cluster.
+        :param min_samples: Vizinhos da distância de núcleo (padrão: min_cluster_size, como no HDBSCAN).
+        :param cluster_selection_epsilon: Distância abaixo da qual clusters não são divididos.
+        :param cluster_selection_method: "eom" ou "leaf".
+        :param allow_single_cluster: Permite um único cluster.
+        :return: Tupla (rótulos, probabilidades, estabilidades por cluster).
+        """
+        from hdbscan._hdbscan_tree import compute_stability, condense_tree, get_clusters
+
+        min_samples = min_cluster_size if min_samples is None else min_samples
+        condensada = condense_tree(self.tree(min_samples), int(min_cluster_size))
+        estabilidade = compute_stability(condensada)
+        return get_clusters(condensada, estabilidade, cluster_selection_method, allow_single_cluster,
+                            False, float(cluster_selection_epsilon))
+
+    def sweep(self, min_cluster_sizes, min_samples=(SWEEP_MIN_SAMPLES,), epsilons=(0.0,),
+              cluster_selection_method="eom", keep_labels=False):
+        """
+        Avalia todas as combinações de parâmetros; cada min_samples distinto custa uma árvore.
+
+        :param min_cluster_sizes: Valores de min_cluster_size.
+        :param min_samples: Valores de min_samples.
+        :param epsilons: Valores de cluster_selection_epsilon.
+        :param cluster_selection_method: "eom" ou "leaf".
+        :param keep_labels: Inclui os rótulos de cada combinação (coluna labels).
+        :return: DataFrame com uma linha por combinação: n_clusters, noise_fraction,
+            stability_total, stability_mean (e labels).
+        """
+        linhas = []
+        for ms, mcs, eps in itertools.product(min_samples, min_cluster_sizes, epsilons):
+            labels, _, estabilidades = self.cluster(mcs, ms, eps, cluster_selection_method)
+            linha = {
+                "min_cluster_size": int(mcs),
+                "min_samples": int(ms),
+                "cluster_selection_epsilon": float(eps),
+                "n_clusters": int(labels.max() + 1) if len(labels) else 0,
+                "noise_fraction": float(np.mean(labels < 0)) if len(labels) else 0.0,
+                "stability_total": float(np.sum(estabilidades)),
+                "stability_mean": float(np.mean(estabilidades)) if len(estabilidades) else 0.0,
+            }
+            if keep_labels:
+                linha["labels"] = labels
+            linhas.append(linha)
+        return pd.DataFrame(linhas)
+
+
+def sweep_hdbscan(X, min_cluster_sizes, min_samples=(SWEEP_MIN_SAMPLES,), epsilons=(0.0,), **options):
+    """
+    Atalho: monta o grafo com vizinhos suficientes para o maior min_samples e varre os parâmetros.
+
+    :param X: Matriz de features.
+    :param min_cluster_sizes: Valores de min_cluster_size.
+    :param min_samples: Valores de min_samples.
+    :param epsilons: Valores de cluster_selection_epsilon.
+    :param options: Repassadas a HDBSCANSweep.sweep.
+    :return: DataFrame de HDBSCANSweep.sweep.
+    """
+    n_neighbors = max(SWEEP_N_NEIGHBORS, max(min_samples) + 1)
+    return HDBSCANSweep(X, n_neighbors=n_neighbors).sweep(min_cluster_sizes, min_samples, epsilons, **options)
+
+
+if __name__ == "__main__":
+    import sys
+    from feature_matrix import load_feature_matrix
+
+    # Uso: python hdbscan_sweep.py <matriz.npy>
+    X = np.array(load_feature_matrix(sys.argv[1]))
+    resultado = sweep_hdbscan(X, min_cluster_sizes=range(5, 105, 5), min_samples=(5, 10))
+    print(resultado.to_string(index=False))
@@ -0,0 +1,85 @@
+"""
+Pacote de análise: acesso preguiçoso aos módulos de backend/scripts.
+
+Importar hep não carrega nada pesado. Os nomes abaixo (e os próprios
+módulos, como hep.knn_graph) só são importados no primeiro acesso, então
+um processo que usa apenas o MemoryGovernor não paga o import do UMAP,
+do scikit-learn ou do Plotly.
+
+    import hep
+    governor = hep.MemoryGovernor()
+    indices, distances = hep.knn_graph.build_knn_graph(X, 15)
+
+A linha de comando única é python -m hep <comando> (ver hep.cli).
+"""
+import os
+import sys
+import importlib
+
+# Diretório dos módulos (os scripts importam uns aos outros pelo nome simples)
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# Cache em disco das funções compiladas pelo Numba (cache=True), persistente entre processos e reinícios
+NUMBA_CACHE_ENV = "NUMBA_CACHE_DIR"
+DEFAULT_NUMBA_CACHE_DIR = "/app/numba_cache"
+
+# Precisa ser definido antes de o Numba ser importado; só se o diretório puder ser criado
+if NUMBA_CACHE_ENV not in os.environ:
+    try:
+        os.makedirs(DEFAULT_NUMBA_CACHE_DIR, exist_ok=True)
+        os.environ[NUMBA_CACHE_ENV] = DEFAULT_NUMBA_CACHE_DIR
+    except OSError:
+        pass
+
+# Nome público → (módulo, atributo)
+_EXPORTS = {
+    "MemoryGovernor": ("memory_governor", "MemoryGovernor"),
+    "parse_size": ("memory_governor", "parse_size"),
+    "track": ("metrics", "track"),
+    "instrumented": ("metrics", "instrumented"),
+    "Pipeline": ("pipeline", "Pipeline"),
+    "build_analysis_pipeline": ("analysis_pipeline", "build_analysis_pipeline"),
+    "build_feature_matrix": ("feature_matrix", "build_feature_matrix"),
+    "load_feature_matrix": ("feature_matrix", "load_feature_matrix"),
+    "build_knn_graph": ("knn_graph", "build_knn_graph"),
+    "run_embedding": ("embeddings", "run_embedding"),
+    "HDBSCANSweep": ("hdbscan_sweep", "HDBSCANSweep"),
+    "sweep_hdbscan": ("hdbscan_sweep", "sweep_hdbscan"),
+    "EventKernel": ("event_kernels", "EventKernel"),
+    "event_kernel": ("event_kernels", "event_kernel"),
+    "SimilarityIndex": ("similarity_index", "SimilarityIndex"),
+    "ClusterIndex": ("cluster_index", "ClusterIndex"),
+    "JobQueue": ("background_jobs", "JobQueue"),
+    "RawCache": ("raw_cache", "RawCache"),
+    "open_root": ("remote_source", "open_root"),
+    "compact_dataset": ("compaction", "compact_dataset"),
+    "open_dataset": ("compaction", "open_dataset"),
+    "generate_dataset": ("synthetic_data", "generate_dataset"),
+    "StratifiedSampler": ("event_sample", "StratifiedSampler"),
+    "load_dataset_sample": ("event_sample", "load_dataset_sample"),
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def _script_modules():
+    return sorted(f[:-3] for f in os.listdir(SCRIPTS_DIR) if f.endswith(".py"))
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module, attribute = _EXPORTS[name]
+        value = getattr(importlib.import_module(module), attribute)
+    elif name in _script_modules():
+        value = importlib.import_module(name)
+    else:
+        raise AttributeError(f"module 'hep' has no attribute {name!r}")
+    # Próximos acessos não passam mais por aqui
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_script_modules()))
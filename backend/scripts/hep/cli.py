@@ -0,0 +1,58 @@
+import sys
+import argparse
+import runpy
+from hep.startup import STARTUP_MODULES
+
+# Comando → (módulo executado como script, descrição)
+SCRIPT_COMMANDS = {
+    "download": ("download", "Baixa os arquivos ROOT brutos respeitando a cota do cache"),
+    "convert": ("converting_parquet", "Converte os arquivos ROOT em Parquet"),
+    "process": ("processed_parquet", "UMAP, HDBSCAN, anomalias e índices ANN sobre os Parquet"),
+    "compact": ("compaction", "Compacta os Parquet e atualiza o _metadata"),
+    "pca": ("pca_reduction", "PCA incremental sobre os Parquet convertidos e projeção de cada arquivo"),
+    "dashboard": ("visualize_data", "Dashboard Dash na porta 8050"),
+    "sweep": ("hdbscan_sweep", "Varredura de parâmetros do HDBSCAN sobre uma matriz .npy"),
+    "benchmark": ("benchmark", "Benchmark com dados sintéticos e comparação com a execução anterior"),
+}
+
+
+def run_script(module, args=()):
+    """
+    Executa um módulo de backend/scripts como se fosse chamado por python <módulo>.py.
+
+    O módulo só é importado aqui, então cada comando carrega apenas as
+    próprias dependências.
+
+    :param module: Nome do módulo.
+    :param args: Argumentos repassados em sys.argv.
+    """
+    sys.argv = [f"{module}.py", *args]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m hep", description="Pipeline de análise de dados do CERN.")
+    comandos = parser.add_subparsers(dest="command", required=True)
+
+    for nome, (_, ajuda) in SCRIPT_COMMANDS.items():
+        comando = comandos.add_parser(nome, help=ajuda, description=ajuda)
+        comando.add_argument("args", nargs=argparse.REMAINDER, help="Argumentos repassados ao script")
+
+    warmup = comandos.add_parser("warmup", help="Aquece o cache em disco do Numba (NUMBA_CACHE_DIR)")
+    warmup.add_argument("--events", type=int, default=500, help="Eventos sintéticos usados no aquecimento")
+
+    tempos = comandos.add_parser("import-times", help="Tempo de import de cada módulo num interpretador novo")
+    tempos.add_argument("modules", nargs="*", default=list(STARTUP_MODULES))
+    tempos.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args(argv)
+
+    if args.command in SCRIPT_COMMANDS:
+        run_script(SCRIPT_COMMANDS[args.command][0], args.args)
+    elif args.command == "warmup":
+        from hep.startup import warm_numba_cache
+        warm_numba_cache(n_events=args.events)
+    elif args.command == "import-times":
+        from hep.startup import import_times
+        for module, segundos in import_times(args.modules, repeat=args.repeat).items():
+            print(f"⏱️ {module}: {'falhou' if segundos is None else f'{segundos:.3f}s'}")
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import subprocess
+from hep import SCRIPTS_DIR, NUMBA_CACHE_ENV
+
+# Módulos medidos pelo benchmark de inicialização (nenhum deles carrega dados ao ser importado)
+STARTUP_MODULES = ("hep", "memory_governor", "metrics", "analysis_pipeline", "processed_parquet",
+                   "embeddings", "umap")
+
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def import_times(modules=STARTUP_MODULES, repeat=1):
+    """
+    Tempo de import de cada módulo num interpretador novo (o que um worker ou um contêiner reiniciado paga).
+
+    :param modules: Módulos a medir.
+    :param repeat: Medições por módulo (guarda a menor).
+    :return: Dicionário {módulo: segundos}, None se o import falhou.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [SCRIPTS_DIR, os.environ.get("PYTHONPATH")]))}
+    tempos = {}
+    for module in modules:
+        medidas = []
+        for _ in range(repeat):
+            processo = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET.format(module=module)],
+                                      capture_output=True, text=True, env=env)
+            if processo.returncode != 0:
+                medidas = []
+                break
+            medidas.append(float(processo.stdout.strip().splitlines()[-1]))
+        tempos[module] = round(min(medidas), 6) if medidas else None
+    return tempos
+
+
+def warm_numba_cache(n_events=500, seed=42):
+    """
+    Compila, com dados mínimos, as funções do Numba que aceitam cache em disco (pynndescent, UMAP).
+
+    Feito uma vez (ex.: na construção da imagem), os processos seguintes
+    carregam essas funções do NUMBA_CACHE_DIR em vez de recompilá-las.
+    Funções compiladas no import sem cache=True (ex.: pynndescent.distances)
+    continuam sendo compiladas em cada processo; para elas, o ganho vem de
+    não importar o UMAP onde ele não é usado.
+
+    :param n_events: Eventos sintéticos usados no aquecimento.
+    :param seed: Semente dos dados sintéticos.
+    :return: Segundos gastos.
+    """
+    import numpy as np
+
+    cache_dir = os.environ.get(NUMBA_CACHE_ENV)
+    if not cache_dir:
+        print("⚠️ NUMBA_CACHE_DIR indisponível; o aquecimento só vale para este processo.")
+
+    inicio = time.perf_counter()
+    import umap
+    from pynndescent import NNDescent
+
+    X = np.random.default_rng(seed).normal(size=(n_events, 3)).astype(np.float32)
+    NNDescent(X, n_neighbors=15, random_state=seed, low_memory=True).prepare()
+    umap.UMAP(n_neighbors=15, n_components=3, random_state=seed, n_epochs=20).fit_transform(X)
+    segundos = time.perf_counter() - inicio
+
+    if cache_dir:
+        arquivos = sum(len(nomes) for _, _, nomes in os.walk(cache_dir))
+        print(f"✅ Cache do Numba aquecido em {segundos:.1f}s: {arquivos} arquivos em {cache_dir}")
+    return segundos
@@ -0,0 +1,281 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Diretório dos histogramas acumulados (um arquivo por Parquet + o histograma mesclado)
+HISTOGRAM_DIR = "/app/data/histograms"
+
+# Classes de centralidade (%) calculadas a partir de EventInfoAuxDyn.CentralityMin/Max
+CENTRALITY_EDGES = np.array([0.0, 10.0, 20.0, 40.0, 60.0, 80.0, 100.0])
+CENTRALITY_COLUMN = "centralidade"
+
+# Histogramas padrão do dataset: nome -> eixos (coluna, bordas) e coluna de peso opcional
+DEFAULT_SPECS = {
+    "muon_pt": {"axes": [("MuonsAuxDyn.pt", np.linspace(0, 100000, 101)), (CENTRALITY_COLUMN, CENTRALITY_EDGES)]},
+    "muon_eta": {"axes": [("MuonsAuxDyn.eta", np.linspace(-3, 3, 61)), (CENTRALITY_COLUMN, CENTRALITY_EDGES)]},
+    "muon_phi": {"axes": [("MuonsAuxDyn.phi", np.linspace(-np.pi, np.pi, 65)), (CENTRALITY_COLUMN, CENTRALITY_EDGES)]},
+    "calo_et": {"axes": [("CaloSumsAuxDyn.et", np.linspace(0, 5e6, 101)), (CENTRALITY_COLUMN, CENTRALITY_EDGES)]},
+}
+
+
+class Histogram:
+    """
+    Histograma de bins fixos em N dimensões, acumulável e mesclável.
+
+    Guarda a soma dos pesos, a soma dos pesos ao quadrado (para erros) e o
+    número de entradas por bin, de modo que histogramas de arquivos
+    diferentes podem ser somados (e fatiados) sem reler os eventos.
+    """
+
+    def __init__(self, axes):
+        """
+        :param axes: Lista de tuplas (nome, bordas) — uma por dimensão.
+        """
+        self.names = [name for name, _ in axes]
+        self.edges = [np.asarray(edges, dtype=np.float64) for _, edges in axes]
+        shape = tuple(len(e) - 1 for e in self.edges)
+        self.counts = np.zeros(shape, dtype=np.float64)
+        self.sumw2 = np.zeros(shape, dtype=np.float64)
+        self.bin_entries = np.zeros(shape, dtype=np.int64)
+        self.entries = 0
+
+    def fill(self, *values, weight=None):
+        """
+        Preenche o histograma com um lote de eventos (valores fora do intervalo são descartados).
+
+        :param values: Um array por dimensão, na ordem dos eixos.
+        :param weight: Array de pesos opcional.
+        """
+        values = [np.asarray(v, dtype=np.float64) for v in values]
+        dentro = np.ones(len(values[0]), dtype=bool)
+        indices = []
+
+        for v, edges in zip(values, self.edges):
+            idx = np.searchsorted(edges, v, side="right") - 1
+            # O limite superior do último bin é inclusivo, como no np.histogram
+            idx[v == edges[-1]] = len(edges) - 2
+            dentro &= (idx >= 0) & (idx < len(edges) - 1) & np.isfinite(v)
+            indices.append(idx)
+
+        flat = np.ravel_multi_index([idx[dentro] for idx in indices], self.counts.shape)
+        w = None if weight is None else np.asarray(weight, dtype=np.float64)[dentro]
+        tamanho = self.counts.size
+
+        entradas = np.bincount(flat, minlength=tamanho).reshape(self.counts.shape)
+        self.counts += entradas if w is None else np.bincount(flat, weights=w, minlength=tamanho).reshape(self.counts.shape)
+        self.sumw2 += entradas if w is None else np.bincount(flat, weights=w ** 2, minlength=tamanho).reshape(self.counts.shape)
+        self.bin_entries += entradas
+        self.entries += int(dentro.sum())
+
+    def merge(self, other):
+        """Soma outro histograma com os mesmos eixos (in-place)."""
+        if self.names != other.names or any(not np.array_equal(a, b) for a, b in zip(self.edges, other.edges)):
+            raise ValueError("🚨 Histogramas com eixos diferentes não podem ser mesclados.")
+        self.counts += other.counts
+        self.sumw2 += other.sumw2
+        self.bin_entries += other.bin_entries
+        self.entries += other.entries
+        return self
+
+    def project(self, name):
+        """
+        Projeção 1D sobre um eixo (soma das demais dimensões).
+
+        :param name: Nome do eixo.
+        :return: Tupla (contagens, bordas).
+        """
+        axis = self.names.index(name)
+        outros = tuple(i for i in range(self.counts.ndim) if i != axis)
+        return self.counts.sum(axis=outros), self.edges[axis]
+
+    def slice(self, name, bin_index):
+        """
+        Fatia do histograma num bin de outro eixo (ex.: uma classe de centralidade).
+
+        :param name: Nome do eixo a fixar.
+        :param bin_index: Índice do bin.
+        :return: Histogram com uma dimensão a menos.
+        """
+        axis = self.names.index(name)
+        eixos = [(n, e) for i, (n, e) in enumerate(zip(self.names, self.edges)) if i != axis]
+        fatia = Histogram(eixos)
+        fatia.counts = np.take(self.counts, bin_index, axis=axis).copy()
+        fatia.sumw2 = np.take(self.sumw2, bin_index, axis=axis).copy()
+        # Entradas (não soma dos pesos), também para preenchimentos com peso
+        fatia.bin_entries = np.take(self.bin_entries, bin_index, axis=axis).copy()
+        fatia.entries = int(fatia.bin_entries.sum())
+        return fatia
+
+    def save(self, path):
+        arrays = {f"edges_{i}": e for i, e in enumerate(self.edges)}
+        np.savez(path, counts=self.counts, sumw2=self.sumw2, bin_entries=self.bin_entries, entries=self.entries,
+                 names=json.dumps(self.names), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        names = json.loads(str(data["names"]))
+        hist = cls([(n, data[f"edges_{i}"]) for i, n in enumerate(names)])
+        hist.counts = data["counts"]
+        hist.sumw2 = data["sumw2"]
+        hist.bin_entries = data["bin_entries"]
+        hist.entries = int(data["entries"])
+        return hist
+
+
+def add_centrality(df):
+    """
+    Adiciona a coluna de centralidade (%) média entre CentralityMin e CentralityMax.
+
+    :param df: DataFrame com os ramos de EventInfoAuxDyn.
+    :return: O próprio DataFrame.
+    """
+    if {"EventInfoAuxDyn.CentralityMin", "EventInfoAuxDyn.CentralityMax"}.issubset(df.columns):
+        df[CENTRALITY_COLUMN] = (df["EventInfoAuxDyn.CentralityMin"] + df["EventInfoAuxDyn.CentralityMax"]) / 2.0
+    return df
+
+
+def _spec_columns(specs):
+    colunas = set()
+    for spec in specs.values():
+        colunas.update(name for name, _ in spec["axes"])
+        if spec.get("weight"):
+            colunas.add(spec["weight"])
+    if CENTRALITY_COLUMN in colunas:
+        colunas.discard(CENTRALITY_COLUMN)
+        colunas.update(["EventInfoAuxDyn.CentralityMin", "EventInfoAuxDyn.CentralityMax"])
+    return sorted(colunas)
+
+
+def fill_parquet_file(parquet_path, specs=None):
+    """
+    Preenche os histogramas de um único arquivo Parquet (lendo só as colunas necessárias).
+
+    :param parquet_path: Caminho do arquivo Parquet.
+    :param specs: Especificação dos histogramas (padrão: DEFAULT_SPECS).
+    :return: Dicionário {nome: Histogram}.
+    """
+    import pyarrow.parquet as pq
+
+    specs = specs or DEFAULT_SPECS
+    disponiveis = set(pq.read_schema(parquet_path).names)
+    df = pq.read_table(parquet_path, columns=[c for c in _spec_columns(specs) if c in disponiveis]).to_pandas()
+    add_centrality(df)
+
+    hists = {}
+    for name, spec in specs.items():
+        hist = Histogram(spec["axes"])
+        if all(col in df.columns for col in hist.names):
+            peso = df[spec["weight"]].to_numpy() if spec.get("weight") else None
+            hist.fill(*[df[col].to_numpy() for col in hist.names], weight=peso)
+        hists[name] = hist
+    return hists
+
+
+def _fill_and_save(parquet_path, specs, output_path):
+    hists = fill_parquet_file(parquet_path, specs)
+    os.makedirs(output_path, exist_ok=True)
+    for name, hist in hists.items():
+        hist.save(os.path.join(output_path, f"{name}.npz"))
+    return parquet_path
+
+
+def specs_hash(specs):
+    """
+    Hash das especificações (eixos, bordas e pesos): acumuladores de specs diferentes nunca se misturam.
+
+    :param specs: Especificação dos histogramas.
+    :return: Hash hexadecimal curto.
+    """
+    normalizado = {name: {"axes": [[col, np.asarray(edges, dtype=np.float64).tolist()] for col, edges in spec["axes"]],
+                          "weight": spec.get("weight")}
+                   for name, spec in sorted(specs.items())}
+    return hashlib.sha256(json.dumps(normalizado, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _file_hist_dir(parquet_path, histogram_dir, specs):
+    return os.path.join(histogram_dir, "files", specs_hash(specs), os.path.basename(parquet_path))
+
+
+def _is_up_to_date(parquet_path, file_dir, specs):
+    arquivos = [os.path.join(file_dir, f"{name}.npz") for name in specs]
+    return all(os.path.exists(a) and os.path.getmtime(a) >= os.path.getmtime(parquet_path) for a in arquivos)
+
+
+def fill_dataset(parquet_files, specs=None, histogram_dir=HISTOGRAM_DIR, n_jobs=None):
+    """
+    Preenche os histogramas de vários arquivos em paralelo e mescla o resultado.
+
+    Cada arquivo tem seus histogramas salvos separadamente (num diretório por
+    hash das specs); arquivos que não mudaram desde o último preenchimento
+    com as mesmas specs não são relidos.
+
+    :param parquet_files: Lista de arquivos Parquet.
+    :param specs: Especificação dos histogramas (padrão: DEFAULT_SPECS).
+    :param histogram_dir: Diretório de saída.
+    :param n_jobs: Número de processos (padrão: todos os núcleos).
+    :return: Dicionário {nome: Histogram} mesclado de todos os arquivos.
+    """
+    specs = specs or DEFAULT_SPECS
+    pendentes = [f for f in parquet_files if not _is_up_to_date(f, _file_hist_dir(f, histogram_dir, specs), specs)]
+    print(f"🔹 Histogramas: {len(parquet_files) - len(pendentes)} arquivos em cache, {len(pendentes)} a preencher.")
+
+    if pendentes:
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count() or 1) as executor:
+            futures = [executor.submit(_fill_and_save, f, specs, _file_hist_dir(f, histogram_dir, specs)) for f in pendentes]
+            for future in futures:
+                print(f"✅ Histogramas preenchidos: {os.path.basename(future.result())}")
+
+    merged = {}
+    for f in parquet_files:
+        file_dir = _file_hist_dir(f, histogram_dir, specs)
+        for name in specs:
+            hist = Histogram.load(os.path.join(file_dir, f"{name}.npz"))
+            merged[name] = merged[name].merge(hist) if name in merged else hist
+
+    for name, hist in merged.items():
+        hist.save(os.path.join(histogram_dir, f"{name}.npz"))
+
+    return merged
+
+
+def plot_histogram(counts, edges, ax=None, density=False, **kwargs):
+    """
+    Desenha um histograma 1D já acumulado.
+
+    :param counts: Contagens por bin.
+    :param edges: Bordas dos bins.
+    :param ax: Eixo do matplotlib (padrão: eixo atual).
+    :param density: Normaliza a área para 1.
+    :return: O eixo usado.
+    """
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.gca()
+    if density and counts.sum() > 0:
+        counts = counts / (counts.sum() * np.diff(edges))
+    ax.stairs(counts, edges, **kwargs)
+    return ax
+
+
+if __name__ == "__main__":
+    import glob
+    import matplotlib.pyplot as plt
+
+    parquet_dir = "/app/data/parquet"
+    hists = fill_dataset(sorted(glob.glob(os.path.join(parquet_dir, "*.parquet"))))
+
+    if "muon_pt" in hists:
+        hist = hists["muon_pt"]
+        plt.figure(figsize=(8, 5))
+        for i in range(len(CENTRALITY_EDGES) - 1):
+            fatia = hist.slice(CENTRALITY_COLUMN, i)
+            plot_histogram(fatia.counts, fatia.edges[0], density=True,
+                           label=f"Centralidade {CENTRALITY_EDGES[i]:.0f}-{CENTRALITY_EDGES[i + 1]:.0f}%")
+        plt.xlabel("Momentum Transverso pT (MeV)")
+        plt.ylabel("Densidade")
+        plt.title("Distribuição de pT dos Múons por Centralidade")
+        plt.legend()
+        plt.show()
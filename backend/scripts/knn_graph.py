@@ -0,0 +1,127 @@
+import os
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Diretório onde os grafos kNN ficam salvos entre execuções
+KNN_CACHE_DIR = "/app/data/knn_cache"
+
+
+def knn_cache_key(X, metric, n_neighbors):
+    """
+    Gera a chave do cache a partir do conteúdo da matriz, da métrica e de k.
+
+    :param X: Matriz de features.
+    :param metric: Métrica de distância.
+    :param n_neighbors: Número de vizinhos do grafo.
+    :return: Hash hexadecimal (sha256).
+    """
+    X = np.ascontiguousarray(X)
+    h = hashlib.sha256()
+    h.update(f"{X.shape}|{X.dtype}|{metric}|{n_neighbors}".encode())
+    h.update(memoryview(X).cast("B"))
+    return h.hexdigest()
+
+
+def build_knn_graph(X, n_neighbors, metric="euclidean", cache_dir=KNN_CACHE_DIR, random_state=42):
+    """
+    Constrói (ou carrega do cache) o grafo kNN aproximado via NN-descent.
+
+    Cada linha inclui o próprio evento na primeira coluna (distância 0), no mesmo
+    formato usado internamente pelo UMAP.
+
+    :param X: Matriz de features (n_eventos, n_features).
+    :param n_neighbors: Número de vizinhos por evento (incluindo o próprio).
+    :param metric: Métrica de distância.
+    :param cache_dir: Diretório do cache em disco.
+    :param random_state: Semente do NN-descent.
+    :return: Tupla (indices int64, distancias float32), ambos (n_eventos, n_neighbors).
+    """
+    n_neighbors = min(n_neighbors, len(X))
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = os.path.join(cache_dir, f"{knn_cache_key(X, metric, n_neighbors)}.npz")
+
+    if os.path.exists(cache_file):
+        print(f"✅ Grafo kNN carregado do cache: {cache_file}")
+        cached = np.load(cache_file)
+        return cached["indices"], cached["distances"]
+
+    from pynndescent import NNDescent
+
+    print(f"⚠️ Construindo grafo kNN (k={n_neighbors}, métrica={metric})...")
+    # O NN-descent (Numba) não aceita arrays somente leitura, como o memmap da matriz de features
+    if not X.flags.writeable:
+        X = np.array(X)
+    index = NNDescent(X, n_neighbors=n_neighbors, metric=metric, random_state=random_state, low_memory=True)
+    indices, distances = index.neighbor_graph
+    indices = indices.astype(np.int64)
+    distances = distances.astype(np.float32)
+
+    # Escrita atômica para não deixar cache corrompido se o processo morrer no meio
+    tmp_file = cache_file + ".tmp.npz"
+    np.savez(tmp_file, indices=indices, distances=distances)
+    os.replace(tmp_file, cache_file)
+    print(f"✅ Grafo kNN salvo: {cache_file}")
+
+    return indices, distances
+
+
+def knn_sparse_graph(indices, distances, n_neighbors=None):
+    """
+    Converte o grafo kNN em matriz esparsa de distâncias (formato "precomputed").
+
+    Serve para Isomap, t-SNE e HDBSCAN com metric="precomputed". Para o
+    scikit-learn, cada linha precisa de n_neighbors + 1 entradas (o próprio
+    evento é descartado na consulta).
+
+    :param indices: Índices dos vizinhos (n_eventos, k).
+    :param distances: Distâncias dos vizinhos (n_eventos, k).
+    :param n_neighbors: Quantas colunas do grafo usar (padrão: todas).
+    :return: csr_matrix (n_eventos, n_eventos).
+    """
+    k = indices.shape[1] if n_neighbors is None else min(n_neighbors, indices.shape[1])
+    n = indices.shape[0]
+    indptr = np.arange(0, n * k + 1, k)
+    return csr_matrix((distances[:, :k].ravel(), indices[:, :k].ravel(), indptr), shape=(n, n))
+
+
+def connect_knn_components(graph, X):
+    """
+    Liga as componentes desconexas de um grafo kNN esparso.
+
+    O HDBSCAN com metric="precomputed" exige um grafo conexo. Cada componente
+    é ligada à seguinte por uma aresta com a distância euclidiana real entre
+    seus eventos representativos.
+
+    :param graph: csr_matrix gerada por knn_sparse_graph.
+    :param X: Matriz de features usada para construir o grafo.
+    :return: csr_matrix conexa.
+    """
+    n_components, labels = connected_components(graph, directed=False)
+    if n_components == 1:
+        return graph
+
+    print(f"⚠️ Grafo kNN com {n_components} componentes desconexas. Conectando...")
+    _, representantes = np.unique(labels, return_index=True)
+    origem, destino = representantes[:-1], representantes[1:]
+    pesos = np.linalg.norm(np.asarray(X[origem], dtype=np.float64) - np.asarray(X[destino], dtype=np.float64), axis=1)
+    # Distância zero seria tratada como ausência de aresta na matriz esparsa
+    pesos = np.maximum(pesos, np.finfo(np.float32).tiny)
+
+    graph = graph.tolil()
+    graph[origem, destino] = pesos
+    graph[destino, origem] = pesos
+    return graph.tocsr()
+
+
+def umap_precomputed_knn(indices, distances, n_neighbors):
+    """
+    Monta o argumento precomputed_knn do UMAP a partir do grafo compartilhado.
+
+    :param indices: Índices dos vizinhos (n_eventos, k).
+    :param distances: Distâncias dos vizinhos (n_eventos, k).
+    :param n_neighbors: n_neighbors do UMAP (deve ser <= k).
+    :return: Tupla (indices, distancias, None).
+    """
+    return np.ascontiguousarray(indices[:, :n_neighbors]), np.ascontiguousarray(distances[:, :n_neighbors]), None
@@ -0,0 +1,262 @@
+import os
+import gc
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Orçamento de RAM (ex.: "8 GB"); sem a variável, usa uma fração da memória disponível
+MEMORY_BUDGET_ENV = "HEP_MEMORY_BUDGET"
+AVAILABLE_FRACTION = 0.6
+
+# Quantas vezes o tamanho descomprimido os dados ocupam depois de lidos e transformados
+# (awkward → pandas, cópias intermediárias do achatamento, buffers de escrita)
+DEFAULT_OVERHEAD = 4.0
+
+# Frações do orçamento: alvo dos blocos e limite a partir do qual o governor segura novas leituras
+TARGET_FRACTION = 0.7
+HIGH_WATERMARK = 0.9
+
+# Memória de base de um worker (interpretador, uproot, numpy, pandas) antes de ler qualquer dado
+WORKER_BASE_BYTES = 512 * 1024 ** 2
+
+# Limites dos blocos lidos
+MIN_CHUNK_ENTRIES = 1_000
+MAX_CHUNK_ENTRIES = 5_000_000
+
+_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(value):
+    """
+    Converte "8 GB", "512MB" ou um número de bytes em bytes.
+
+    :param value: Texto ou número.
+    :return: Inteiro em bytes.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B?)\s*", str(value).upper())
+    if not match:
+        raise ValueError(f"🚨 Tamanho de memória inválido: {value}")
+    return int(float(match.group(1)) * _UNITS[match.group(2) or "B"])
+
+
+def _cgroup_limit():
+    # Limite do container (cgroup v2 e v1); None se não houver
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                valor = f.read().strip()
+        except OSError:
+            continue
+        if valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor)
+    return None
+
+
+def default_budget():
+    """Orçamento padrão: HEP_MEMORY_BUDGET ou AVAILABLE_FRACTION da memória disponível (respeitando o cgroup)."""
+    import psutil
+
+    if os.environ.get(MEMORY_BUDGET_ENV):
+        return parse_size(os.environ[MEMORY_BUDGET_ENV])
+
+    disponivel = psutil.virtual_memory().available
+    limite = _cgroup_limit()
+    if limite is not None:
+        disponivel = min(disponivel, max(limite - process_tree_rss(), 0))
+    return int(disponivel * AVAILABLE_FRACTION)
+
+
+def process_tree_rss():
+    """RSS do processo atual somado ao dos processos filhos (workers dos pools)."""
+    import psutil
+
+    processo = psutil.Process()
+    total = processo.memory_info().rss
+    for filho in processo.children(recursive=True):
+        try:
+            total += filho.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def estimate_bytes_per_entry(tree, branches):
+    """
+    Bytes descomprimidos por entrada dos ramos, a partir dos metadados do arquivo ROOT.
+
+    Nenhum basket é lido: o uproot soma os tamanhos registrados no cabeçalho de cada ramo.
+
+    :param tree: Árvore aberta com uproot.
+    :param branches: Ramos que serão lidos.
+    :return: Média de bytes por entrada (float).
+    """
+    if tree.num_entries == 0:
+        return 0.0
+    total = 0
+    for nome in branches:
+        ramo = tree[nome]
+        try:
+            total += ramo.uncompressed_bytes
+        except (AttributeError, ValueError):
+            # Sem metadado confiável: assume 8 bytes por entrada
+            total += 8 * tree.num_entries
+    return total / tree.num_entries
+
+
+class MemoryGovernor:
+    """
+    Escolhe tamanhos de bloco e número de workers a partir de um orçamento de RAM.
+
+    O custo por entrada vem dos metadados dos ramos (bytes descomprimidos)
+    multiplicado por um fator de expansão. Enquanto o RSS do processo e dos
+    filhos passar de HIGH_WATERMARK do orçamento, novas leituras e tarefas
+    esperam (backpressure).
+    """
+
+    def __init__(self, budget=None, overhead=DEFAULT_OVERHEAD, target_fraction=TARGET_FRACTION,
+                 high_watermark=HIGH_WATERMARK, max_workers=None):
+        self.budget = parse_size(budget) if budget is not None else default_budget()
+        self.overhead = overhead
+        self.target_fraction = target_fraction
+        self.high_watermark = high_watermark
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def __repr__(self):
+        return f"MemoryGovernor(budget={self.budget / 1024 ** 3:.2f} GB, overhead={self.overhead})"
+
+    def bytes_per_entry(self, tree, branches):
+        """Custo estimado em memória de cada entrada lida (já com o fator de expansão)."""
+        return max(estimate_bytes_per_entry(tree, branches), 1.0) * self.overhead
+
+    def chunk_entries(self, tree, branches, n_workers=1):
+        """
+        Entradas por bloco para que n_workers blocos simultâneos caibam no orçamento.
+
+        :param tree: Árvore aberta com uproot.
+        :param branches: Ramos lidos.
+        :param n_workers: Blocos processados ao mesmo tempo.
+        :return: Número de entradas por bloco.
+        """
+        n_workers = max(n_workers, 1)
+        livre = max(self.budget * self.target_fraction - n_workers * WORKER_BASE_BYTES, 0) / n_workers
+        entradas = int(livre / self.bytes_per_entry(tree, branches))
+        return int(min(max(entradas, MIN_CHUNK_ENTRIES), MAX_CHUNK_ENTRIES, max(tree.num_entries, 1)))
+
+    def entry_stop(self, tree, branches):
+        """
+        Quantas entradas podem ser carregadas de uma vez (substitui os entry_stop fixos).
+
+        :param tree: Árvore aberta com uproot.
+        :param branches: Ramos lidos.
+        :return: Número de entradas (no máximo o total da árvore).
+        """
+        entradas = int(self.budget * self.target_fraction / self.bytes_per_entry(tree, branches))
+        return min(max(entradas, MIN_CHUNK_ENTRIES), tree.num_entries)
+
+    def workers_for(self, bytes_per_task, max_workers=None):
+        """
+        Número de processos que cabem no orçamento, dado o pico de memória de cada tarefa.
+
+        :param bytes_per_task: Pico estimado de uma tarefa.
+        :param max_workers: Limite superior (padrão: número de núcleos).
+        :return: Entre 1 e max_workers.
+        """
+        max_workers = max_workers or self.max_workers
+        cabem = int(self.budget * self.target_fraction // max(bytes_per_task, 1))
+        return max(1, min(cabem, max_workers))
+
+    def streaming_workers(self, n_tasks, max_workers=None):
+        """
+        Número de workers para tarefas que leem em blocos (ex.: um arquivo por worker).
+
+        Cada worker precisa da memória de base mais, no mínimo, outro tanto para os blocos.
+
+        :param n_tasks: Número de tarefas.
+        :param max_workers: Limite superior.
+        :return: Número de workers.
+        """
+        return self.workers_for(2 * WORKER_BASE_BYTES, min(max_workers or self.max_workers, max(n_tasks, 1)))
+
+    def share(self, n_workers):
+        """Governor com a fatia do orçamento de cada um de n_workers processos (usado dentro dos workers)."""
+        return MemoryGovernor(budget=max(self.budget // max(n_workers, 1), WORKER_BASE_BYTES), overhead=self.overhead,
+                              target_fraction=self.target_fraction, high_watermark=self.high_watermark, max_workers=1)
+
+    def over_budget(self):
+        """True se o RSS (processo + filhos) passou do limite de backpressure."""
+        return process_tree_rss() > self.budget * self.high_watermark
+
+    def wait_for_memory(self, poll=0.5, timeout=None):
+        """
+        Bloqueia enquanto o RSS estiver acima do limite (backpressure).
+
+        :param poll: Intervalo entre verificações (s).
+        :param timeout: Tempo máximo de espera (s); None espera indefinidamente.
+        :return: True se a memória voltou ao limite, False se o tempo acabou.
+        """
+        inicio = time.monotonic()
+        avisado = False
+        while self.over_budget():
+            gc.collect()
+            if not self.over_budget():
+                break
+            if not avisado:
+                print(f"⏳ RSS acima de {self.high_watermark:.0%} do orçamento; aguardando memória...")
+                avisado = True
+            if timeout is not None and time.monotonic() - inicio > timeout:
+                return False
+            time.sleep(poll)
+        return True
+
+    def iterate(self, tree, branches, n_workers=1, **kwargs):
+        """
+        tree.iterate com blocos dimensionados pelo orçamento e backpressure entre blocos.
+
+        :param tree: Árvore aberta com uproot.
+        :param branches: Ramos lidos.
+        :param n_workers: Blocos processados ao mesmo tempo.
+        :param kwargs: Repassados para tree.iterate (ex.: library).
+        """
+        step = self.chunk_entries(tree, branches, n_workers)
+        for chunk in tree.iterate(branches, step_size=step, **kwargs):
+            yield chunk
+            self.wait_for_memory()
+
+    def map(self, func, items, bytes_per_task, max_workers=None, on_result=None):
+        """
+        Executa func sobre items em processos, limitando workers e tarefas em voo pelo orçamento.
+
+        Uma nova tarefa só é enviada quando o RSS está abaixo do limite.
+        Resultados saem na ordem dos items.
+
+        :param func: Função (picklável) de um argumento.
+        :param items: Itens a processar.
+        :param bytes_per_task: Pico estimado de memória de cada tarefa.
+        :param max_workers: Limite superior de processos.
+        :param on_result: Chamada como on_result(item, resultado) assim que cada tarefa termina (ex.: checkpoint).
+        :return: Lista de resultados.
+        """
+        items = list(items)
+        n_workers = self.workers_for(bytes_per_task, min(max_workers or self.max_workers, max(len(items), 1)))
+        resultados = [None] * len(items)
+
+        def concluir(futuros):
+            for futuro in futuros:
+                i = em_voo.pop(futuro)
+                resultados[i] = futuro.result()
+                if on_result is not None:
+                    on_result(items[i], resultados[i])
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            em_voo = {}
+            for i, item in enumerate(items):
+                while len(em_voo) >= n_workers or (em_voo and self.over_budget()):
+                    prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                    concluir(prontos)
+                em_voo[executor.submit(func, item)] = i
+            while em_voo:
+                prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                concluir(prontos)
+        return resultados
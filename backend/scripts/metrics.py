@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import resource
+import functools
+import threading
+import multiprocessing
+from collections import Counter
+from contextlib import contextmanager
+
+# Diretório das métricas (JSON lines, arquivo Prometheus e perfis)
+METRICS_DIR = os.environ.get("HEP_METRICS_DIR", "/app/logs/metrics")
+METRICS_FILE = "metrics.jsonl"
+
+# Perfilador por amostragem: desligado por padrão (HEP_PROFILE=1 liga)
+PROFILE_ENABLED = os.environ.get("HEP_PROFILE", "0") == "1"
+PROFILE_INTERVAL = float(os.environ.get("HEP_PROFILE_INTERVAL", "0.005"))
+
+# Acumulado por estágio neste processo (base do arquivo Prometheus)
+_registry = {}
+# Estágios em andamento em todas as threads (o VmHWM é do processo inteiro)
+_active = []
+# Pilha de estágios de cada thread (aninhamento)
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _read_proc(path, keys):
+    valores = {}
+    try:
+        with open(path) as f:
+            for linha in f:
+                nome, _, resto = linha.partition(":")
+                if nome in keys:
+                    valores[nome] = int(resto.split()[0])
+    except OSError:
+        pass
+    return valores
+
+
+def _rss_peak():
+    """Pico de RSS em bytes (VmHWM no Linux, senão ru_maxrss)."""
+    status = _read_proc("/proc/self/status", ("VmHWM",))
+    if "VmHWM" in status:
+        return status["VmHWM"] * 1024
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def _reset_rss_peak():
+    # No Linux, "5" em clear_refs zera o VmHWM; assim o pico fica restrito ao estágio
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _bytes_read():
+    return _read_proc("/proc/self/io", ("rchar",)).get("rchar", 0)
+
+
+class StageMetrics:
+    """
+    Métricas de uma execução de estágio.
+
+    Linhas processadas e bytes lidos podem ser informados pelo próprio
+    estágio (add_rows / add_bytes); sem add_bytes, vale o total lido pelo
+    processo durante o estágio (/proc/self/io).
+    """
+
+    def __init__(self, stage, file=None, **labels):
+        self.stage = stage
+        self.file = file
+        self.labels = labels
+        self.rows = 0
+        self.bytes = None
+        self.peak_rss = 0
+        self.wall = None
+        self.cpu = None
+        # True se outro estágio rodou em paralelo: o pico é o do processo, não só deste estágio
+        self.shared_rss = False
+
+    def add_rows(self, n):
+        self.rows += int(n)
+
+    def add_bytes(self, n):
+        self.bytes = (self.bytes or 0) + int(n)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_stage():
+    """StageMetrics do estágio em andamento nesta thread (ou None), para estágios instrumentados por decorator."""
+    pilha = _stack()
+    return pilha[-1] if pilha else None
+
+
+class SamplingProfiler:
+    """
+    Perfilador por amostragem de baixo custo.
+
+    Uma thread lê periodicamente a pilha da thread observada e conta as
+    pilhas no formato "folded" (uma linha por pilha), aceito pelo
+    flamegraph.pl e pelo speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if pilha:
+                self.samples[";".join(reversed(pilha))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def write(self, path):
+        """Grava as pilhas no formato folded."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for pilha, n in self.samples.most_common():
+                f.write(f"{pilha} {n}\n")
+        return path
+
+
+def _emit(registro, metrics_dir):
+    os.makedirs(metrics_dir, exist_ok=True)
+    linha = json.dumps(registro, default=str) + "\n"
+    # Uma única escrita com O_APPEND: linhas de processos diferentes não se misturam
+    fd = os.open(os.path.join(metrics_dir, METRICS_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, linha.encode())
+    finally:
+        os.close(fd)
+
+    with _lock:
+        agregado = _registry.setdefault(registro["stage"], {
+            "runs": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+            "rows": 0, "bytes_read": 0, "peak_rss_bytes": 0, "last_wall_seconds": 0.0,
+        })
+        agregado["runs"] += 1
+        agregado["errors"] += registro["status"] != "ok"
+        agregado["wall_seconds"] += registro["wall_s"]
+        agregado["cpu_seconds"] += registro["cpu_s"]
+        agregado["rows"] += registro["rows"]
+        agregado["bytes_read"] += registro["bytes_read"]
+        agregado["peak_rss_bytes"] = max(agregado["peak_rss_bytes"], registro["peak_rss_bytes"])
+        agregado["last_wall_seconds"] = registro["wall_s"]
+
+    # Processos filhos de um pool ganham arquivo próprio para não sobrescrever o do processo principal
+    nome = job_name() if multiprocessing.parent_process() is None else f"{job_name()}.{os.getpid()}"
+    write_prometheus(os.path.join(metrics_dir, f"{nome}.prom"))
+
+
+def job_name():
+    """Nome do job nas métricas (nome do script em execução)."""
+    return os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+
+def write_prometheus(path):
+    """
+    Grava o acumulado por estágio no formato texto do Prometheus.
+
+    A escrita é atômica (arquivo temporário + rename), como espera o
+    textfile collector do node_exporter.
+
+    :param path: Arquivo .prom de saída.
+    :return: O caminho gravado.
+    """
+    metricas = [
+        ("runs", "hep_stage_runs_total", "counter", "Execuções do estágio."),
+        ("errors", "hep_stage_errors_total", "counter", "Execuções do estágio que terminaram em erro."),
+        ("wall_seconds", "hep_stage_wall_seconds_total", "counter", "Tempo de relógio acumulado."),
+        ("cpu_seconds", "hep_stage_cpu_seconds_total", "counter", "Tempo de CPU acumulado."),
+        ("rows", "hep_stage_rows_total", "counter", "Linhas (eventos) processadas."),
+        ("bytes_read", "hep_stage_bytes_read_total", "counter", "Bytes lidos."),
+        ("peak_rss_bytes", "hep_stage_peak_rss_bytes", "gauge", "Maior pico de RSS observado no estágio."),
+        ("last_wall_seconds", "hep_stage_last_wall_seconds", "gauge", "Tempo de relógio da última execução."),
+    ]
+    job = job_name()
+    with _lock:
+        linhas = []
+        for chave, nome, tipo, ajuda in metricas:
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for stage, agregado in sorted(_registry.items()):
+                linhas.append(f'{nome}{{job="{job}",stage="{stage}"}} {agregado[chave]}')
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        f.write("\n".join(linhas) + "\n")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+@contextmanager
+def track(stage, file=None, profile=None, metrics_dir=None, **labels):
+    """
+    Mede um estágio: tempo de relógio, tempo de CPU, pico de RSS, bytes lidos e linhas.
+
+    Ao sair, grava uma linha JSON em METRICS_FILE e atualiza o arquivo
+    Prometheus do processo. Estágios podem ser aninhados (o pico de RSS do
+    estágio externo inclui o dos internos). Pode ser usado em várias threads;
+    como o pico de RSS é do processo, ele só é zerado quando nenhuma outra
+    thread tem estágio ativo, e estágios concorrentes saem marcados com
+    peak_rss_shared.
+
+    :param stage: Nome do estágio.
+    :param file: Arquivo processado (opcional).
+    :param profile: Liga o perfilador por amostragem (padrão: HEP_PROFILE).
+    :param metrics_dir: Diretório das métricas (padrão: METRICS_DIR).
+    :param labels: Rótulos extras gravados na linha JSON.
+    :return: StageMetrics (para add_rows / add_bytes).
+    """
+    metrics_dir = metrics_dir or METRICS_DIR
+    metrics = StageMetrics(stage, file, **labels)
+    profile = PROFILE_ENABLED if profile is None else profile
+    profiler = SamplingProfiler().start() if profile else None
+
+    pilha = _stack()
+    with _lock:
+        if len(_active) == len(pilha):
+            # Só estágios desta thread em andamento: guarda o pico deles antes de zerar
+            if pilha:
+                pilha[-1].peak_rss = max(pilha[-1].peak_rss, _rss_peak())
+            _reset_rss_peak()
+        else:
+            metrics.shared_rss = True
+            for outro in _active:
+                outro.shared_rss = True
+        _active.append(metrics)
+    pilha.append(metrics)
+
+    status = "ok"
+    lidos_inicio = _bytes_read()
+    cpu_inicio, wall_inicio = time.process_time(), time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_inicio
+        cpu = time.process_time() - cpu_inicio
+        metrics.wall, metrics.cpu = wall, cpu
+        pilha.pop()
+        with _lock:
+            _active.remove(metrics)
+            metrics.peak_rss = max(metrics.peak_rss, _rss_peak())
+        if pilha:
+            pilha[-1].peak_rss = max(pilha[-1].peak_rss, metrics.peak_rss)
+            pilha[-1].shared_rss |= metrics.shared_rss
+
+        registro = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "job": job_name(), "pid": os.getpid(),
+            "stage": stage, "file": file, "status": status,
+            "wall_s": round(wall, 6), "cpu_s": round(cpu, 6), "peak_rss_bytes": metrics.peak_rss,
+            "peak_rss_shared": metrics.shared_rss,
+            "bytes_read": metrics.bytes if metrics.bytes is not None else _bytes_read() - lidos_inicio,
+            "rows": metrics.rows, "rows_per_s": round(metrics.rows / wall, 3) if wall > 0 else None,
+            **labels,
+        }
+
+        if profiler is not None:
+            profiler.stop()
+            nome = f"{stage}.{os.getpid()}.{int(time.time())}.folded"
+            registro["profile"] = profiler.write(os.path.join(metrics_dir, "profiles", nome))
+
+        try:
+            _emit(registro, metrics_dir)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar as métricas de {stage}: {e}")
+
+
+def instrumented(stage=None, file_arg=None):
+    """
+    Versão decorator de track().
+
+    :param stage: Nome do estágio (padrão: nome da função).
+    :param file_arg: Nome (ou posição) do argumento que identifica o arquivo processado.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if isinstance(file_arg, int):
+                arquivo = args[file_arg] if len(args) > file_arg else None
+            else:
+                arquivo = kwargs.get(file_arg) if file_arg else None
+            with track(stage or func.__name__, file=arquivo):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,232 @@
+import os
+from functools import partial
+import numpy as np
+
+# Diretório do modelo e das projeções (um .npy float32 por arquivo Parquet)
+PCA_DIR = "/app/data/pca"
+PCA_MODEL_FILE = "pca_model.npz"
+
+# Componentes mantidos e linhas por lote lido dos Parquet
+PCA_N_COMPONENTS = 8
+PCA_BATCH_ROWS = 200_000
+
+
+def numeric_columns(files):
+    """Colunas numéricas presentes em todos os arquivos (lidas só do esquema)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    comuns = None
+    for path in files:
+        schema = pq.read_schema(path)
+        nomes = [c.name for c in schema if pa.types.is_integer(c.type) or pa.types.is_floating(c.type)]
+        comuns = nomes if comuns is None else [c for c in comuns if c in nomes]
+    return comuns or []
+
+
+def iter_batches(files, columns, batch_rows=PCA_BATCH_ROWS, min_rows=1):
+    """
+    Lotes float64 (n_linhas, n_colunas) de todos os arquivos, lidos em streaming.
+
+    Lotes menores que min_rows (fim de um arquivo) são juntados ao seguinte,
+    já que o IncrementalPCA exige ao menos n_components linhas por lote. O
+    último lote fica retido até o fim: se sobrar um resto menor que min_rows,
+    ele é juntado a esse lote (ou descartado, se o total inteiro for menor).
+
+    :param files: Arquivos Parquet.
+    :param columns: Colunas lidas.
+    :param batch_rows: Linhas por lote.
+    :param min_rows: Tamanho mínimo de cada lote entregue.
+    :return: Gerador de arrays.
+    """
+    import pyarrow.parquet as pq
+
+    pendente, anterior = [], None
+    for path in files:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+            X = np.column_stack([batch.column(c).to_numpy(zero_copy_only=False) for c in columns]).astype(np.float64)
+            pendente.append(np.nan_to_num(X))
+            if sum(len(p) for p in pendente) >= min_rows:
+                if anterior is not None:
+                    yield anterior
+                anterior = np.concatenate(pendente)
+                pendente = []
+    if pendente and anterior is not None:
+        anterior = np.concatenate([anterior, *pendente])
+    elif pendente and sum(len(p) for p in pendente) >= min_rows:
+        anterior = np.concatenate(pendente)
+    if anterior is not None:
+        yield anterior
+
+
+def fit_incremental_pca(files, columns=None, n_components=PCA_N_COMPONENTS, batch_rows=PCA_BATCH_ROWS,
+                        output_dir=PCA_DIR):
+    """
+    Ajusta padronização e PCA fora da memória, em duas passadas por lotes sobre todos os arquivos.
+
+    A primeira passada acumula média e desvio (StandardScaler.partial_fit);
+    a segunda ajusta o IncrementalPCA nos lotes padronizados. Só um lote
+    fica em memória de cada vez.
+
+    :param files: Arquivos Parquet (ex.: /app/data/parquet).
+    :param columns: Features usadas (padrão: todas as colunas numéricas comuns).
+    :param n_components: Número de componentes.
+    :param batch_rows: Linhas por lote.
+    :param output_dir: Diretório onde o modelo é salvo.
+    :return: Caminho do modelo salvo (.npz).
+    """
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import IncrementalPCA
+
+    columns = list(columns or numeric_columns(files))
+    n_components = min(n_components, len(columns))
+    batch_rows = max(batch_rows, n_components)
+
+    print(f"⚠️ PCA incremental: {len(columns)} colunas → {n_components} componentes, {len(files)} arquivos...")
+    scaler = StandardScaler()
+    for X in iter_batches(files, columns, batch_rows):
+        scaler.partial_fit(X)
+    escala = np.where(scaler.scale_ > 0, scaler.scale_, 1.0)
+
+    pca = IncrementalPCA(n_components=n_components)
+    for X in iter_batches(files, columns, batch_rows, min_rows=n_components):
+        pca.partial_fit((X - scaler.mean_) / escala)
+    if not hasattr(pca, "components_"):
+        raise ValueError(f"🚨 Menos de {n_components} eventos nos arquivos: não há como ajustar o PCA.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, PCA_MODEL_FILE)
+    np.savez(path, columns=np.array(columns), scaler_mean=scaler.mean_, scaler_scale=escala,
+             mean=pca.mean_, components=pca.components_, explained_variance=pca.explained_variance_,
+             explained_variance_ratio=pca.explained_variance_ratio_, n_samples=pca.n_samples_seen_)
+    print(f"✅ PCA salvo: {path} (variância explicada: {pca.explained_variance_ratio_.sum():.1%})")
+    return path
+
+
+def load_pca_model(path=os.path.join(PCA_DIR, PCA_MODEL_FILE)):
+    """Modelo salvo por fit_incremental_pca, como dicionário de arrays."""
+    with np.load(path) as data:
+        model = {k: data[k] for k in data.files}
+    model["columns"] = model["columns"].tolist()
+    return model
+
+
+def project(model, X):
+    """
+    Projeta um lote de features (nas colunas do modelo, sem padronizar) no espaço PCA.
+
+    :param model: Saída de load_pca_model.
+    :param X: Array (n_linhas, n_colunas).
+    :return: Array float32 (n_linhas, n_componentes).
+    """
+    padronizado = (np.asarray(X, dtype=np.float64) - model["scaler_mean"]) / model["scaler_scale"]
+    return ((padronizado - model["mean"]) @ model["components"].T).astype(np.float32)
+
+
+def projection_path(path, output_dir=PCA_DIR):
+    """Projeção PCA (.pca.npy) de um arquivo Parquet; vale também para o processado de mesmo nome."""
+    return os.path.join(output_dir, os.path.basename(path).replace(".parquet", ".pca.npy"))
+
+
+def load_projection(path, output_dir=PCA_DIR, model_path=None):
+    """
+    Projeção PCA de um arquivo (memmap), gerada na hora se o modelo existir e a projeção ainda não.
+
+    :param path: Arquivo Parquet (convertido ou processado: as linhas dos eventos são as mesmas).
+    :param output_dir: Diretório das projeções.
+    :param model_path: Modelo salvo por fit_incremental_pca (padrão: o de output_dir).
+    :return: Array float32 (n_eventos, n_componentes) somente leitura.
+    """
+    output = projection_path(path, output_dir)
+    if not os.path.exists(output):
+        model_path = model_path or os.path.join(output_dir, PCA_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"🚨 Sem modelo PCA em {model_path}: rode python -m hep pca antes.")
+        project_file(path, model_path, output_dir)
+    return np.load(output, mmap_mode="r")
+
+
+def project_file(path, model_path=os.path.join(PCA_DIR, PCA_MODEL_FILE), output_dir=PCA_DIR,
+                 batch_rows=PCA_BATCH_ROWS):
+    """
+    Projeta um arquivo Parquet inteiro, lote a lote, num .npy float32 (abrível via memmap).
+
+    :param path: Arquivo Parquet.
+    :param model_path: Modelo salvo por fit_incremental_pca.
+    :param output_dir: Diretório de saída.
+    :param batch_rows: Linhas por lote.
+    :return: Caminho do .npy gravado.
+    """
+    import pyarrow.parquet as pq
+
+    model = load_pca_model(model_path)
+    n_linhas = pq.ParquetFile(path).metadata.num_rows
+    output = projection_path(path, output_dir)
+
+    matriz = np.lib.format.open_memmap(output + ".tmp", mode="w+", dtype=np.float32,
+                                       shape=(n_linhas, len(model["components"])))
+    inicio = 0
+    for X in iter_batches([path], model["columns"], batch_rows):
+        matriz[inicio:inicio + len(X)] = project(model, X)
+        inicio += len(X)
+    matriz.flush()
+    del matriz
+    os.replace(output + ".tmp", output)
+    print(f"✅ Projeção PCA: {output}")
+    return output
+
+
+def project_files(files, model_path=os.path.join(PCA_DIR, PCA_MODEL_FILE), output_dir=PCA_DIR,
+                  batch_rows=PCA_BATCH_ROWS, max_workers=None):
+    """
+    project_file em paralelo, um arquivo por processo, com workers limitados pelo orçamento de memória.
+
+    :param files: Arquivos Parquet.
+    :param model_path: Modelo salvo por fit_incremental_pca.
+    :param output_dir: Diretório de saída.
+    :param batch_rows: Linhas por lote.
+    :param max_workers: Limite de processos.
+    :return: Caminhos dos .npy, na ordem de files.
+    """
+    from memory_governor import MemoryGovernor, WORKER_BASE_BYTES
+
+    os.makedirs(output_dir, exist_ok=True)
+    n_colunas = len(load_pca_model(model_path)["columns"])
+    # Pico de uma tarefa: lote float64, cópia padronizada e a fatia projetada, além da base do worker
+    bytes_por_tarefa = WORKER_BASE_BYTES + 3 * batch_rows * n_colunas * 8
+    return MemoryGovernor().map(partial(project_file, model_path=model_path, output_dir=output_dir,
+                                        batch_rows=batch_rows),
+                                files, bytes_por_tarefa, max_workers=max_workers)
+
+
+def stack_projections(paths, output_path):
+    """
+    Junta as projeções de vários arquivos numa única matriz .npy float32, sem carregá-las inteiras.
+
+    O resultado serve direto de entrada para embeddings.run_embedding,
+    knn_graph.build_knn_graph e similares, que leem a matriz via memmap.
+
+    :param paths: .npy gerados por project_file.
+    :param output_path: Caminho da matriz de saída.
+    :return: Matriz memmap somente leitura.
+    """
+    partes = [np.load(p, mmap_mode="r") for p in paths]
+    total = sum(len(p) for p in partes)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    matriz = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=(total, partes[0].shape[1]))
+    inicio = 0
+    for parte in partes:
+        matriz[inicio:inicio + len(parte)] = parte
+        inicio += len(parte)
+    matriz.flush()
+    del matriz
+    return np.load(output_path, mmap_mode="r")
+
+
+if __name__ == "__main__":
+    input_dir = "/app/data/parquet"
+    arquivos = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".parquet"))
+    modelo = fit_incremental_pca(arquivos)
+    projecoes = project_files(arquivos, modelo)
+    stack_projections(projecoes, os.path.join(PCA_DIR, "pca_all.npy"))
@@ -0,0 +1,202 @@
+import os
+import ast
+import json
+import pickle
+import hashlib
+import inspect
+import textwrap
+
+# Diretório padrão dos resultados intermediários em cache
+PIPELINE_CACHE_DIR = "cache/pipeline"
+
+# Módulos deste diretório entram no hash de código dos estágios que dependem deles
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_fingerprint(path):
+    """
+    Identificação barata do conteúdo de um arquivo de entrada (tamanho + data de modificação).
+
+    :param path: Caminho do arquivo ou URL remota (tamanho + ETag, sem baixar).
+    :return: String usada como parâmetro do estágio que lê o arquivo.
+    """
+    from remote_source import is_remote, remote_fingerprint
+
+    if is_remote(path):
+        return remote_fingerprint(path)
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _local_module(nome):
+    caminho = os.path.join(SCRIPTS_DIR, nome.split(".")[0] + ".py")
+    return caminho if os.path.exists(caminho) else None
+
+
+def _imported_modules(arvore):
+    nomes = set()
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.ImportFrom) and no.module and not no.level:
+            nomes.add(no.module)
+        elif isinstance(no, ast.Import):
+            nomes.update(alias.name for alias in no.names)
+    return nomes
+
+
+def _module_closure(caminhos):
+    """Arquivos locais importados (direta ou indiretamente) pelos arquivos dados."""
+    pendentes, vistos = list(caminhos), set()
+    while pendentes:
+        caminho = pendentes.pop()
+        if caminho in vistos:
+            continue
+        vistos.add(caminho)
+        with open(caminho) as f:
+            arvore = ast.parse(f.read())
+        pendentes.extend(filter(None, map(_local_module, _imported_modules(arvore))))
+    return vistos
+
+
+def _code_hash(func, _vistas=None):
+    """
+    Hash do código de um estágio e do código de que ele depende.
+
+    Entram a própria função, as funções do mesmo arquivo que ela chama e o
+    conteúdo inteiro dos módulos locais que ela usa (imports dentro da função
+    ou nomes globais vindos de outro módulo), junto com os imports deles.
+
+    :param func: Função do estágio.
+    :return: Hash sha256 em hexadecimal.
+    """
+    if not inspect.isfunction(func):
+        return hashlib.sha256(repr(func).encode()).hexdigest()
+
+    _vistas = set() if _vistas is None else _vistas
+    _vistas.add(func)
+    h = hashlib.sha256()
+    try:
+        codigo = inspect.getsource(func)
+        modulos = _imported_modules(ast.parse(textwrap.dedent(codigo)))
+    except (OSError, TypeError, SyntaxError):
+        codigo, modulos = func.__code__.co_code.hex(), set()
+    h.update(codigo.encode())
+
+    arquivo_proprio = inspect.getsourcefile(func)
+    for nome in func.__code__.co_names:
+        valor = func.__globals__.get(nome)
+        if inspect.ismodule(valor):
+            modulos.add(valor.__name__)
+        elif inspect.isfunction(valor) and valor not in _vistas:
+            if inspect.getsourcefile(valor) == arquivo_proprio:
+                h.update(_code_hash(valor, _vistas).encode())
+            else:
+                modulos.add(valor.__module__)
+
+    arquivos = set(filter(None, map(_local_module, modulos)))
+    arquivos.discard(os.path.abspath(arquivo_proprio or ""))
+    for caminho in sorted(_module_closure(arquivos)):
+        with open(caminho, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class Pipeline:
+    """
+    Executor incremental de estágios organizados em um DAG.
+
+    A saída de cada estágio é guardada em disco sob um hash dos parâmetros,
+    do código da função e das chaves dos estágios de que depende. Mudar um
+    parâmetro invalida só aquele estágio e os que vêm depois dele.
+    """
+
+    def __init__(self, cache_dir=PIPELINE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.stages = {}
+        self._memo = {}
+
+    def add(self, name, func, deps=(), params=None, persist=True, version=None):
+        """
+        Registra um estágio.
+
+        :param name: Nome do estágio.
+        :param func: Função chamada como func(*saidas_das_dependencias, **params).
+        :param deps: Nomes dos estágios de que este depende (na ordem dos argumentos).
+        :param params: Parâmetros do estágio (precisam ser serializáveis em JSON).
+        :param persist: Se False, o resultado fica só em memória (ex.: dados brutos grandes).
+        :param version: Texto extra da chave, para mudanças que o hash de código não enxerga
+                        (ex.: versão de uma biblioteca externa).
+        """
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"🚨 Estágio {name} depende de {dep}, que não foi registrado.")
+        self.stages[name] = {"func": func, "deps": list(deps), "params": dict(params or {}), "persist": persist,
+                             "version": version}
+        return self
+
+    def stage(self, name, deps=(), persist=True, version=None, **params):
+        """Versão decorator de add()."""
+        def decorator(func):
+            self.add(name, func, deps, params, persist, version)
+            return func
+        return decorator
+
+    def set_params(self, name, **params):
+        """Atualiza parâmetros de um estágio (invalida ele e os estágios seguintes)."""
+        self.stages[name]["params"].update(params)
+        return self
+
+    def key(self, name):
+        """
+        Chave de conteúdo do estágio.
+
+        :param name: Nome do estágio.
+        :return: Hash sha256 em hexadecimal.
+        """
+        stage = self.stages[name]
+        h = hashlib.sha256()
+        h.update(name.encode())
+        h.update(_code_hash(stage["func"]).encode())
+        h.update(str(stage["version"]).encode())
+        h.update(json.dumps(stage["params"], sort_keys=True, default=str).encode())
+        for dep in stage["deps"]:
+            h.update(self.key(dep).encode())
+        return h.hexdigest()
+
+    def _cache_file(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key[:16]}.pkl")
+
+    def run(self, name, force=False):
+        """
+        Executa um estágio, reaproveitando o que já estiver em cache.
+
+        Dependências só são calculadas (ou carregadas) se o próprio estágio
+        não estiver em cache.
+
+        :param name: Nome do estágio alvo.
+        :param force: Recalcula o estágio alvo mesmo se houver cache.
+        :return: Saída do estágio.
+        """
+        stage = self.stages[name]
+        key = self.key(name)
+
+        if not force and key in self._memo:
+            return self._memo[key]
+
+        cache_file = self._cache_file(name, key)
+        if not force and stage["persist"] and os.path.exists(cache_file):
+            print(f"✅ Estágio {name}: carregado do cache.")
+            with open(cache_file, "rb") as f:
+                resultado = pickle.load(f)
+        else:
+            entradas = [self.run(dep) for dep in stage["deps"]]
+            print(f"⚠️ Estágio {name}: executando...")
+            resultado = stage["func"](*entradas, **stage["params"])
+
+            if stage["persist"]:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(cache_file + ".tmp", "wb") as f:
+                    pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(cache_file + ".tmp", cache_file)
+
+        self._memo[key] = resultado
+        return resultado
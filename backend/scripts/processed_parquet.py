@@ -1,17 +1,28 @@
 import os
-import dask.dataframe as dd
 import pandas as pd
 import numpy as np
 import json
-from sklearn.preprocessing import StandardScaler
-import umap
-from hdbscan import HDBSCAN
-import networkx as nx
+from knn_graph import build_knn_graph, connect_knn_components, knn_sparse_graph, umap_precomputed_knn
+from metrics import instrumented, current_stage, track
+from memory_governor import MemoryGovernor
+from similarity_index import INDEX_SPACES, load_or_build_index
+from anomaly_score import ANOMALY_COLUMNS, TopAnomalies, fit_anomaly_model, load_anomaly_model, score_events
+from event_sample import SAMPLE_COLUMNS, build_dataset_sample
+from pca_reduction import PCA_DIR, PCA_MODEL_FILE, load_projection
 
 # Diretório para salvar os arquivos processados
 PROCESSED_PARQUET_DIR = "/app/data/processed_parquet_parts"
 CHECKPOINT_FILE = "/app/logs/processing_checkpoint.json"
 
+# Features usadas pelo UMAP e pelo HDBSCAN (mesma matriz, mesmo grafo kNN)
+FEATURE_COLUMNS = ['MuonsAuxDyn.pt', 'MuonsAuxDyn.eta', 'MuonsAuxDyn.phi']
+UMAP_N_NEIGHBORS = 50
+
+# Matriz do kNN, do UMAP e do HDBSCAN: "columns" (FEATURE_COLUMNS padronizadas) ou "pca"
+# (projeção do arquivo gerada por python -m hep pca)
+FEATURE_SOURCE_ENV = "HEP_FEATURE_SOURCE"
+FEATURE_SOURCES = ("columns", "pca")
+
 # Criar diretório se não existir
 os.makedirs(PROCESSED_PARQUET_DIR, exist_ok=True)
 def is_valid_root_file(filepath):
@@ -50,6 +61,8 @@ def generate_fractal_connections(n=1000, depth=3):
     :param depth: Profundidade da estrutura fractal.
     :return: DataFrame representando as conexões.
     """
+    import networkx as nx
+
     G = nx.Graph()
 
     for i in range(n):
@@ -79,40 +92,121 @@ def generate_fractal_connections(n=1000, depth=3):
 
     return pd.DataFrame(fractal_data)
 
-def process_parquet_file(input_file, checkpoint):
+def backfill_anomaly_scores(output_file, anomaly_model):
+    """
+    Acrescenta anomaly_score a um arquivo processado antes de a pontuação existir, regravando o arquivo.
+
+    As linhas de preenchimento das conexões fractais (features todas nulas)
+    ficam sem score, como nos arquivos processados com o modelo.
+
+    :param output_file: Parquet processado.
+    :param anomaly_model: Isolation forest ajustada.
+    :return: Array float32 com o anomaly_score de cada linha (NaN nas de preenchimento).
+    """
+    df = pd.read_parquet(output_file)
+    eventos = df[ANOMALY_COLUMNS].notna().any(axis=1).to_numpy()
+    scores = np.full(len(df), np.nan, dtype=np.float32)
+    scores[eventos] = score_events(anomaly_model, df.loc[eventos, ANOMALY_COLUMNS])
+    df["anomaly_score"] = scores
+    df.to_parquet(output_file + ".tmp", index=False)
+    os.replace(output_file + ".tmp", output_file)
+    return scores
+
+
+def push_scores(top_anomalies, scores, file_name):
+    """Oferece ao ranking só os scores definidos (as linhas de preenchimento têm NaN)."""
+    linhas = np.flatnonzero(np.isfinite(scores))
+    top_anomalies.push(np.asarray(scores)[linhas], file_name, rows=linhas)
+
+
+@instrumented("process_parquet_file", file_arg=0)
+def process_parquet_file(input_file, checkpoint, anomaly_model=None, top_anomalies=None, feature_source="columns"):
     """
     Processa um único arquivo Parquet e salva de forma incremental.
 
     :param input_file: Caminho do arquivo Parquet original.
     :param checkpoint: Dicionário de checkpoint.
+    :param anomaly_model: Isolation forest usada na coluna anomaly_score (opcional).
+    :param top_anomalies: TopAnomalies que recebe os scores do arquivo (opcional).
+    :param feature_source: "columns" (FEATURE_COLUMNS padronizadas) ou "pca" (projeção PCA do arquivo).
     """
+    if feature_source not in FEATURE_SOURCES:
+        raise ValueError(f"🚨 Fonte de features desconhecida: {feature_source}. Use uma de {FEATURE_SOURCES}.")
     file_name = os.path.basename(input_file)
     output_file = os.path.join(PROCESSED_PARQUET_DIR, file_name)
 
     if file_name in checkpoint:
         print(f"✅ Já processado: {file_name}, pulando...")
+        # O ranking global também inclui os arquivos de execuções anteriores; os processados antes
+        # da pontuação de anomalias ganham a coluna agora
+        if os.path.exists(output_file):
+            import pyarrow.parquet as pq
+            scores = None
+            if "anomaly_score" in pq.read_schema(output_file).names:
+                scores = pq.read_table(output_file, columns=["anomaly_score"])["anomaly_score"] \
+                    .to_numpy(zero_copy_only=False)
+            elif anomaly_model is not None:
+                print(f"⚠️ {file_name} sem anomaly_score; pontuando e regravando...")
+                with track("anomaly_score", file=file_name) as m:
+                    scores = backfill_anomaly_scores(output_file, anomaly_model)
+                    m.add_rows(len(scores))
+            if top_anomalies is not None and scores is not None:
+                push_scores(top_anomalies, scores, file_name)
         return
 
+    # Importações pesadas só quando há arquivo a processar (import umap compila funções do Numba)
+    import dask.dataframe as dd
+    import umap
+    from hdbscan import HDBSCAN
+    from sklearn.preprocessing import StandardScaler
+
     print(f"📂 Processando: {file_name}")
 
     df = dd.read_parquet(input_file).compute()
+    current_stage().add_rows(len(df))
+    current_stage().add_bytes(os.path.getsize(input_file))
+
+    # Matriz (features padronizadas ou componentes PCA) e grafo kNN compartilhados entre UMAP e HDBSCAN
+    if feature_source == "pca":
+        features = np.asarray(load_projection(input_file), dtype=np.float32)
+        if len(features) != len(df):
+            raise ValueError(f"🚨 Projeção PCA de {file_name} tem {len(features)} linhas, o arquivo tem {len(df)}.")
+    else:
+        features = StandardScaler().fit_transform(df[FEATURE_COLUMNS]).astype(np.float32)
+    with track("knn_graph", file=file_name) as m:
+        knn_indices, knn_distances = build_knn_graph(features, n_neighbors=UMAP_N_NEIGHBORS)
+        m.add_rows(len(features))
 
     # Aplicar UMAP para redução de dimensionalidade
     if 'U1' not in df.columns or 'U2' not in df.columns or 'U3' not in df.columns:
         print(f"⚠️ Aplicando UMAP para redução de dimensionalidade...")
-        umap_reducer = umap.UMAP(n_neighbors=50, min_dist=0.02, n_components=3, random_state=None)
-        df[['U1', 'U2', 'U3']] = umap_reducer.fit_transform(df[['MuonsAuxDyn.pt', 'MuonsAuxDyn.eta', 'MuonsAuxDyn.phi']])
+        umap_reducer = umap.UMAP(
+            n_neighbors=UMAP_N_NEIGHBORS, min_dist=0.02, n_components=3, random_state=None,
+            precomputed_knn=umap_precomputed_knn(knn_indices, knn_distances, UMAP_N_NEIGHBORS)
+        )
+        with track("umap", file=file_name) as m:
+            df[['U1', 'U2', 'U3']] = umap_reducer.fit_transform(features)
+            m.add_rows(len(features))
         print(f"✅ UMAP concluído.")
 
     # Aplicar HDBSCAN para clustering
     if 'cluster' not in df.columns:
         print(f"⚠️ Aplicando HDBSCAN para clustering...")
-        scaler = StandardScaler()
-        df_scaled = scaler.fit_transform(df[['MuonsAuxDyn.pt', 'MuonsAuxDyn.eta', 'MuonsAuxDyn.phi']])
-        clusterer = HDBSCAN(min_cluster_size=10)
-        df['cluster'] = clusterer.fit_predict(df_scaled)
+        clusterer = HDBSCAN(min_cluster_size=10, metric="precomputed")
+        grafo = connect_knn_components(knn_sparse_graph(knn_indices, knn_distances), features)
+        with track("hdbscan", file=file_name) as m:
+            df['cluster'] = clusterer.fit_predict(grafo)
+            m.add_rows(len(features))
         print(f"✅ Clustering concluído.")
 
+    # Score de anomalia por evento (modelo ajustado uma vez para todo o dataset)
+    if anomaly_model is not None:
+        with track("anomaly_score", file=file_name) as m:
+            df['anomaly_score'] = score_events(anomaly_model, df[ANOMALY_COLUMNS])
+            m.add_rows(len(df))
+        if top_anomalies is not None:
+            push_scores(top_anomalies, df['anomaly_score'].to_numpy(), file_name)
+
     # Adicionando conexões fractais
     fractal_df = generate_fractal_connections(n=len(df), depth=3)
     df = pd.concat([df.reset_index(drop=True), fractal_df.reset_index(drop=True)], axis=1)
@@ -125,17 +219,44 @@ def process_parquet_file(input_file, checkpoint):
     checkpoint[file_name] = True
     save_checkpoint(checkpoint)
 
-def process_all_parquet_files(input_dir):
+def process_all_parquet_files(input_dir, feature_source=None):
     """
     Processa todos os arquivos Parquet e os salva em partes para evitar estouro de memória.
 
     :param input_dir: Diretório contendo arquivos Parquet brutos.
+    :param feature_source: "columns" ou "pca" (padrão: HEP_FEATURE_SOURCE, senão "columns").
     """
+    feature_source = feature_source or os.environ.get(FEATURE_SOURCE_ENV, "columns")
     checkpoint = load_checkpoint()
+    governor = MemoryGovernor()
+    arquivos = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".parquet"))
+
+    # Isolation forest ajustada uma vez numa amostra de todos os arquivos
+    anomaly_model = load_anomaly_model() if arquivos else None
+    if anomaly_model is None and arquivos:
+        with track("anomaly_fit"):
+            anomaly_model = fit_anomaly_model(arquivos)
+    top_anomalies = TopAnomalies()
+
+    for path in arquivos:
+        # Backpressure: só começa o próximo arquivo quando a memória do anterior foi liberada
+        governor.wait_for_memory()
+        process_parquet_file(path, checkpoint, anomaly_model, top_anomalies, feature_source)
+
+    if len(top_anomalies):
+        top_anomalies.save()
+
+    # Índices de busca por eventos similares, salvos junto dos dados processados
+    for space in INDEX_SPACES:
+        # O espaço PCA só existe depois de python -m hep pca
+        if space == "pca" and not os.path.exists(os.path.join(PCA_DIR, PCA_MODEL_FILE)):
+            continue
+        with track("similarity_index", space=space):
+            load_or_build_index(PROCESSED_PARQUET_DIR, space)
 
-    for filename in sorted(os.listdir(input_dir)):
-        if filename.endswith(".parquet"):
-            process_parquet_file(os.path.join(input_dir, filename), checkpoint)
+    # Amostra estratificada por cluster, com a cauda de anomalias, para o dashboard (só arquivos novos são lidos)
+    with track("event_sample"):
+        build_dataset_sample(PROCESSED_PARQUET_DIR, columns=SAMPLE_COLUMNS)
 
 if __name__ == "__main__":
     input_parquet_dir = "/app/data/parquet/"
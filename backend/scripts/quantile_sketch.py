@@ -0,0 +1,296 @@
+import os
+import json
+import glob
+import numpy as np
+
+# Sufixo dos arquivos de sketch gravados ao lado de cada Parquet convertido
+SKETCH_SUFFIX = ".sketches.json"
+
+
+class KLLSketch:
+    """
+    Sketch de quantis KLL (Karnin, Lang e Liberty), mesclável entre arquivos.
+
+    Guarda O(k) valores por coluna e responde CDF/quantis com erro de rank
+    aproximadamente 1.7 / k, independentemente do número de eventos.
+    """
+
+    def __init__(self, k=200, c=2.0 / 3.0, seed=None):
+        """
+        :param k: Tamanho do compactor de topo (controla a precisão).
+        :param c: Fator de decaimento da capacidade entre níveis.
+        :param seed: Semente do gerador usado nas compactações.
+        """
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.compactors = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+        self._view = None
+
+    @property
+    def epsilon(self):
+        """Erro de rank (fração da CDF) esperado para este k."""
+        return 1.7 / self.k
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * self.c ** depth)))
+
+    def _size(self):
+        return sum(len(c) for c in self.compactors)
+
+    def _max_size(self):
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        while self._size() > self._max_size():
+            for h in range(len(self.compactors)):
+                if len(self.compactors[h]) >= self._capacity(h):
+                    if h + 1 == len(self.compactors):
+                        self.compactors.append(np.empty(0, dtype=np.float64))
+
+                    itens = np.sort(self.compactors[h])
+                    # Com número ímpar de itens, o último fica no nível atual
+                    resto = itens[len(itens) - len(itens) % 2:]
+                    itens = itens[:len(itens) - len(itens) % 2]
+
+                    promovidos = itens[self._rng.integers(2)::2]
+                    self.compactors[h + 1] = np.concatenate([self.compactors[h + 1], promovidos])
+                    self.compactors[h] = resto
+                    break
+        self._view = None
+
+    def update(self, values):
+        """
+        Adiciona um lote de valores ao sketch (NaN e infinitos são ignorados).
+
+        :param values: Array-like com os valores.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """
+        Mescla outro sketch neste (in-place).
+
+        :param other: KLLSketch a ser mesclado.
+        :return: O próprio sketch.
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0, dtype=np.float64))
+        for h, itens in enumerate(other.compactors):
+            self.compactors[h] = np.concatenate([self.compactors[h], itens])
+
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.k = max(self.k, other.k)
+        self._compress()
+        return self
+
+    def _sorted_view(self):
+        if self._view is None:
+            itens = np.concatenate(self.compactors)
+            pesos = np.concatenate([np.full(len(c), 2 ** h, dtype=np.float64) for h, c in enumerate(self.compactors)])
+            ordem = np.argsort(itens, kind="mergesort")
+            itens, pesos = itens[ordem], pesos[ordem]
+            self._view = (itens, np.cumsum(pesos) / pesos.sum())
+        return self._view
+
+    def cdf(self, x):
+        """
+        CDF empírica aproximada.
+
+        :param x: Valor ou array de valores.
+        :return: Fração dos eventos <= x.
+        """
+        itens, acumulado = self._sorted_view()
+        if len(itens) == 0:
+            return np.zeros_like(np.asarray(x, dtype=np.float64))
+        pos = np.searchsorted(itens, x, side="right")
+        return np.where(pos > 0, acumulado[np.maximum(pos - 1, 0)], 0.0)
+
+    def quantile(self, q):
+        """
+        Quantil aproximado.
+
+        :param q: Fração (ou array de frações) entre 0 e 1.
+        :return: Valor(es) correspondente(s).
+        """
+        itens, acumulado = self._sorted_view()
+        pos = np.searchsorted(acumulado, q, side="left")
+        return itens[np.minimum(pos, len(itens) - 1)]
+
+    def to_dict(self):
+        return {
+            "k": self.k, "c": self.c, "n": self.n,
+            "min": float(self.min) if self.n else None,
+            "max": float(self.max) if self.n else None,
+            "compactors": [c.tolist() for c in self.compactors],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"], c=data["c"])
+        sketch.n = data["n"]
+        sketch.min = data["min"] if data["min"] is not None else np.inf
+        sketch.max = data["max"] if data["max"] is not None else -np.inf
+        sketch.compactors = [np.asarray(c, dtype=np.float64) for c in data["compactors"]]
+        return sketch
+
+
+def build_column_sketches(df, k=200):
+    """
+    Cria um sketch por coluna numérica do DataFrame.
+
+    :param df: DataFrame com os eventos.
+    :param k: Precisão dos sketches.
+    :return: Dicionário {coluna: KLLSketch}.
+    """
+    sketches = {}
+    for col in df.select_dtypes(include="number").columns:
+        sketch = KLLSketch(k=k)
+        sketch.update(df[col].to_numpy())
+        sketches[col] = sketch
+    return sketches
+
+
+def save_sketches(sketches, path):
+    """Salva os sketches de um arquivo em JSON (sidecar)."""
+    with open(path, "w") as f:
+        json.dump({col: s.to_dict() for col, s in sketches.items()}, f)
+
+
+def load_sketches(path):
+    """Carrega os sketches de um sidecar JSON."""
+    with open(path, "r") as f:
+        return {col: KLLSketch.from_dict(d) for col, d in json.load(f).items()}
+
+
+def sketch_path_for(parquet_path):
+    """Caminho do sidecar de sketches de um arquivo Parquet."""
+    return parquet_path[:-len(".parquet")] + SKETCH_SUFFIX if parquet_path.endswith(".parquet") else parquet_path + SKETCH_SUFFIX
+
+
+def sketch_parquet_file(parquet_path, k=200):
+    """
+    Gera o sidecar de sketches para um Parquet já convertido.
+
+    :param parquet_path: Caminho do arquivo Parquet.
+    :param k: Precisão dos sketches.
+    :return: Caminho do sidecar gravado.
+    """
+    import pyarrow.parquet as pq
+
+    df = pq.read_table(parquet_path).to_pandas()
+    path = sketch_path_for(parquet_path)
+    save_sketches(build_column_sketches(df, k=k), path)
+    return path
+
+
+def load_dataset_sketches(directory):
+    """
+    Mescla os sidecars de todos os arquivos de um diretório.
+
+    :param directory: Diretório com os arquivos *.sketches.json.
+    :return: Dicionário {coluna: KLLSketch} com o dataset inteiro.
+    """
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*" + SKETCH_SUFFIX))):
+        for col, sketch in load_sketches(path).items():
+            if col in merged:
+                merged[col].merge(sketch)
+            else:
+                merged[col] = sketch
+    return merged
+
+
+def _pooled_cdfs(sketch, reference):
+    reference = np.sort(np.asarray(reference, dtype=np.float64))
+    itens, _ = sketch._sorted_view()
+    pontos = np.unique(np.concatenate([itens, reference]))
+    F = sketch.cdf(pontos)
+    G = np.searchsorted(reference, pontos, side="right") / len(reference)
+    return pontos, F, G, len(reference)
+
+
+def ks_test_sketch(sketch, reference):
+    """
+    Teste KS de duas amostras aproximado: dataset (sketch) vs amostra de referência.
+
+    :param sketch: KLLSketch da coluna (normalmente mesclado de todos os arquivos).
+    :param reference: Amostra de referência (ex.: simulação do Modelo Padrão).
+    :return: Dicionário com statistic, lower, upper (limites pelo erro do sketch) e pvalue.
+    """
+    from scipy.stats import kstwobign
+
+    _, F, G, m = _pooled_cdfs(sketch, reference)
+    d = float(np.max(np.abs(F - G)))
+    eps = sketch.epsilon
+    en = sketch.n * m / (sketch.n + m)
+
+    return {
+        "statistic": d,
+        "lower": max(0.0, d - eps),
+        "upper": min(1.0, d + eps),
+        "pvalue": float(kstwobign.sf(d * np.sqrt(en))),
+    }
+
+
+def ad_test_sketch(sketch, reference):
+    """
+    Estatística de Anderson-Darling de duas amostras (Pettitt) aproximada.
+
+    Os limites são obtidos deslocando a diferença entre as CDFs pelo erro de
+    rank do sketch.
+
+    :param sketch: KLLSketch da coluna.
+    :param reference: Amostra de referência.
+    :return: Dicionário com statistic, lower e upper.
+    """
+    _, F, G, m = _pooled_cdfs(sketch, reference)
+    n = sketch.n
+    N = n + m
+
+    H = (n * F + m * G) / N
+    dH = np.diff(np.concatenate([[0.0], H]))
+    valido = (H > 0) & (H < 1)
+    peso = dH[valido] / (H[valido] * (1.0 - H[valido]))
+
+    diff = np.abs(F - G)[valido]
+    eps = sketch.epsilon
+    fator = n * m / N
+
+    return {
+        "statistic": float(fator * np.sum(diff ** 2 * peso)),
+        "lower": float(fator * np.sum(np.maximum(diff - eps, 0.0) ** 2 * peso)),
+        "upper": float(fator * np.sum((diff + eps) ** 2 * peso)),
+    }
+
+
+if __name__ == "__main__":
+    parquet_dir = "/app/data/parquet"
+    sketches = load_dataset_sketches(parquet_dir)
+
+    if "MuonsAuxDyn.pt" not in sketches:
+        print(f"⚠️ Nenhum sketch de MuonsAuxDyn.pt encontrado em {parquet_dir}.")
+    else:
+        sketch = sketches["MuonsAuxDyn.pt"]
+        muon_pt_sim = np.random.normal(50, 10, size=200000)
+
+        ks = ks_test_sketch(sketch, muon_pt_sim)
+        ad = ad_test_sketch(sketch, muon_pt_sim)
+        print(f"📊 Eventos no dataset: {sketch.n}")
+        print(f"📊 Estatística KS: {ks['statistic']:.6f} [{ks['lower']:.6f}, {ks['upper']:.6f}], p-value: {ks['pvalue']:.8f}")
+        print(f"📊 Estatística AD: {ad['statistic']:.6f} [{ad['lower']:.6f}, {ad['upper']:.6f}]")
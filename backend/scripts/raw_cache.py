@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from memory_governor import parse_size
+
+RAW_DIR = "/app/data/cern_raw"
+PARQUET_DIR = "/app/data/parquet"
+PARQUET_CHECKPOINT_FILE = "/app/logs/parquet_checkpoint.json"
+
+# Último uso de cada arquivo bruto (o atime não é confiável em discos montados com noatime)
+RAW_CACHE_STATE_FILE = "/app/logs/raw_cache.json"
+
+# Cota do diretório de arquivos brutos (ex.: "200 GB")
+RAW_CACHE_QUOTA_ENV = "HEP_RAW_CACHE_QUOTA"
+DEFAULT_RAW_CACHE_QUOTA = "200 GB"
+
+# Políticas de despejo: menos usado recentemente, maior primeiro, ou idade × tamanho (GreedyDual-Size)
+EVICTION_POLICIES = ("lru", "largest", "age_size")
+
+# Arquivos da fila baixados antecipadamente
+PREFETCH_FILES = 2
+
+# Intervalo entre tentativas de abrir espaço enquanto a conversão não libera arquivos (segundos)
+WAIT_POLL_SECONDS = 30
+
+RAW_SUFFIX = ".root.1"
+
+
+def filename_for(url_or_path):
+    return url_or_path.rstrip("/").split("/")[-1]
+
+
+def parquet_for(filename):
+    """Parquet que converting_parquet.py gera para um arquivo bruto."""
+    return os.path.join(PARQUET_DIR, filename.replace(RAW_SUFFIX, ".parquet"))
+
+
+class RawCache:
+    """
+    Diretório de arquivos ROOT brutos tratado como cache com cota em bytes.
+
+    Só arquivos já convertidos (presentes no checkpoint da conversão) podem
+    ser despejados, e nunca os que estão em uso (use()) ou sendo baixados.
+    Um arquivo despejado volta a ser baixado sob demanda por ensure(), e
+    iterate() baixa antecipadamente os próximos arquivos da fila.
+    """
+
+    def __init__(self, directory=RAW_DIR, quota=None, policy="lru", download=None,
+                 checkpoint_file=PARQUET_CHECKPOINT_FILE, state_file=RAW_CACHE_STATE_FILE):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"🚨 Política desconhecida: {policy}. Use uma de {EVICTION_POLICIES}.")
+        self.directory = directory
+        self.quota = parse_size(quota if quota is not None else os.environ.get(RAW_CACHE_QUOTA_ENV, DEFAULT_RAW_CACHE_QUOTA))
+        self.policy = policy
+        self.checkpoint_file = checkpoint_file
+        self.state_file = state_file
+        self._download = download
+        self._lock = threading.RLock()
+        self._pinned = {}
+        self._downloads = {}
+        self._executor = None
+        os.makedirs(directory, exist_ok=True)
+        self._last_used = self._load_state()
+
+    def __repr__(self):
+        return f"RawCache({self.directory}, {self.usage() / 1024 ** 3:.2f}/{self.quota / 1024 ** 3:.2f} GB, {self.policy})"
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r") as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(self.state_file + ".tmp", "w") as f:
+            json.dump(self._last_used, f, indent=4)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    def _converted(self):
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, "r") as f:
+                return set(json.load(f))
+        return set()
+
+    def files(self):
+        """{nome: bytes} dos arquivos brutos presentes."""
+        arquivos = {}
+        for nome in os.listdir(self.directory):
+            path = os.path.join(self.directory, nome)
+            if nome.endswith(RAW_SUFFIX) and os.path.isfile(path):
+                arquivos[nome] = os.path.getsize(path)
+        return arquivos
+
+    def usage(self):
+        """Bytes ocupados pelos arquivos brutos."""
+        return sum(self.files().values())
+
+    def touch(self, filename):
+        """Registra o uso de um arquivo (ordem do LRU)."""
+        with self._lock:
+            self._last_used[filename] = time.time()
+            self._save_state()
+
+    def _eviction_order(self, candidatos):
+        agora = time.time()
+        if self.policy == "lru":
+            chave = lambda item: self._last_used.get(item[0], 0)
+        elif self.policy == "largest":
+            chave = lambda item: -item[1]
+        else:
+            chave = lambda item: -(agora - self._last_used.get(item[0], 0)) * item[1]
+        return sorted(candidatos, key=chave)
+
+    def evict(self, needed_bytes=0, protect=()):
+        """
+        Despeja arquivos convertidos até caber needed_bytes dentro da cota.
+
+        :param needed_bytes: Espaço a liberar além do uso atual (ex.: tamanho de um download).
+        :param protect: Nomes que não podem ser despejados.
+        :return: True se o uso ficou dentro da cota.
+        """
+        with self._lock:
+            arquivos = self.files()
+            # Downloads em andamento contam com o tamanho esperado
+            pendentes = [nome for nome in self._downloads if nome not in arquivos]
+            uso = sum(arquivos.values()) + len(pendentes) * self.expected_size()
+            if uso + needed_bytes <= self.quota:
+                return True
+
+            convertidos = self._converted()
+            bloqueados = set(protect) | set(self._pinned) | set(self._downloads)
+            candidatos = [(nome, tamanho) for nome, tamanho in arquivos.items()
+                          if nome not in bloqueados and parquet_for(nome) in convertidos]
+
+            for nome, tamanho in self._eviction_order(candidatos):
+                if uso + needed_bytes <= self.quota:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, nome))
+                except FileNotFoundError:
+                    pass
+                uso -= tamanho
+                self._last_used.pop(nome, None)
+                print(f"🗑️ Despejado do cache bruto: {nome} ({tamanho / 1024 ** 2:.1f} MB)")
+            self._save_state()
+
+            if uso + needed_bytes > self.quota:
+                print(f"⚠️ Cache bruto acima da cota ({uso / 1024 ** 3:.2f} GB): nada convertido para despejar.")
+                return False
+            return True
+
+    def wait_for_space(self, needed_bytes=0, poll=WAIT_POLL_SECONDS):
+        """
+        Bloqueia até caber needed_bytes na cota, tentando despejar a cada poll segundos.
+
+        Enquanto a cota estiver cheia de arquivos não convertidos, só a
+        conversão (em outro processo) consegue liberar espaço.
+
+        :param needed_bytes: Espaço necessário além do uso atual.
+        :param poll: Segundos entre tentativas.
+        """
+        avisado = False
+        while not self.evict(needed_bytes):
+            if not avisado:
+                print(f"⏳ Aguardando a conversão liberar espaço no cache bruto (nova tentativa a cada {poll}s)...")
+                avisado = True
+            time.sleep(poll)
+
+    def is_converted(self, url):
+        """True se o arquivo já foi convertido (está no checkpoint da conversão)."""
+        return parquet_for(filename_for(url)) in self._converted()
+
+    def expected_size(self):
+        """Tamanho esperado de um novo arquivo (mediana dos presentes), usado para reservar espaço."""
+        tamanhos = sorted(self.files().values())
+        return tamanhos[len(tamanhos) // 2] if tamanhos else 0
+
+    def ensure(self, url):
+        """
+        Caminho local do arquivo, baixando-o (após abrir espaço) se não estiver no cache.
+
+        :param url: URL do arquivo (root://...) ou nome de um arquivo já presente.
+        :return: Caminho local, ou None se o download falhou.
+        """
+        filename = filename_for(url)
+        path = os.path.join(self.directory, filename)
+
+        with self._lock:
+            futuro = self._downloads.get(filename)
+        if futuro is not None:
+            futuro.result()
+
+        if not os.path.exists(path):
+            if "://" not in url:
+                raise FileNotFoundError(f"🚨 {filename} não está no cache e não há URL para baixá-lo.")
+            with self._lock:
+                # O tamanho real só é conhecido depois do download: reserva a mediana dos arquivos presentes
+                self.evict(self.expected_size(), protect={filename})
+                self._downloads.setdefault(filename, None)
+            try:
+                download = self._download
+                if download is None:
+                    from download import download_file as download
+                download(url)
+            finally:
+                with self._lock:
+                    if self._downloads.get(filename) is None:
+                        self._downloads.pop(filename, None)
+            if not os.path.exists(path):
+                return None
+            self.evict(protect={filename})
+
+        self.touch(filename)
+        return path
+
+    def prefetch(self, urls):
+        """Baixa os arquivos em segundo plano (se couberem na cota sem despejar arquivos não convertidos)."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=PREFETCH_FILES)
+            for url in urls:
+                filename = filename_for(url)
+                if filename in self._downloads or os.path.exists(os.path.join(self.directory, filename)):
+                    continue
+                if not self.evict(self.expected_size()):
+                    break
+                self._downloads[filename] = self._executor.submit(self._prefetch_one, url)
+
+    def _prefetch_one(self, url):
+        filename = filename_for(url)
+        try:
+            download = self._download
+            if download is None:
+                from download import download_file as download
+            download(url)
+        finally:
+            with self._lock:
+                self._downloads.pop(filename, None)
+
+    def use(self, url):
+        """
+        Context manager: garante o arquivo local e impede o despejo enquanto ele está em uso.
+
+        :param url: URL ou nome do arquivo.
+        """
+        cache = self
+
+        class _Uso:
+            def __enter__(self):
+                self.filename = filename_for(url)
+                with cache._lock:
+                    cache._pinned[self.filename] = cache._pinned.get(self.filename, 0) + 1
+                self.path = cache.ensure(url)
+                return self.path
+
+            def __exit__(self, exception_type, exception_value, traceback):
+                with cache._lock:
+                    cache._pinned[self.filename] -= 1
+                    if not cache._pinned[self.filename]:
+                        del cache._pinned[self.filename]
+                cache.touch(self.filename)
+
+        return _Uso()
+
+    def iterate(self, urls, prefetch=PREFETCH_FILES):
+        """
+        Percorre a fila de trabalho entregando caminhos locais, com os próximos arquivos já baixando.
+
+        O arquivo entregue fica protegido até a próxima iteração; depois disso
+        pode ser despejado (se já tiver sido convertido).
+
+        :param urls: Fila de URLs.
+        :param prefetch: Quantos arquivos à frente baixar.
+        :return: Gerador de (url, caminho local).
+        """
+        urls = list(urls)
+        for i, url in enumerate(urls):
+            if prefetch:
+                self.prefetch(urls[i + 1:i + 1 + prefetch])
+            with self.use(url) as path:
+                if path is not None:
+                    yield url, path
+        self.evict()
+
+    def map(self, func, urls, max_workers=1, prefetch=PREFETCH_FILES):
+        """
+        Aplica func(caminho_local) a cada arquivo da fila em processos, baixando sob demanda.
+
+        Cada arquivo fica protegido contra despejo até o seu processo terminar;
+        no máximo max_workers arquivos estão em uso ao mesmo tempo, e os
+        próximos da fila já vão sendo baixados.
+
+        :param func: Função (serializável) chamada com o caminho local.
+        :param urls: Fila de URLs (ou nomes de arquivos já presentes).
+        :param max_workers: Número de processos.
+        :param prefetch: Quantos arquivos à frente baixar.
+        :return: Resultados na ordem da fila (arquivos que não puderam ser baixados ficam de fora).
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        urls = list(urls)
+        resultados, em_uso = {}, {}
+
+        def concluir(futuros):
+            for futuro in futuros:
+                i, uso = em_uso.pop(futuro)
+                uso.__exit__(None, None, None)
+                resultados[i] = futuro.result()
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for i, url in enumerate(urls):
+                    while len(em_uso) >= max_workers:
+                        concluir(wait(em_uso, return_when=FIRST_COMPLETED).done)
+                    if prefetch:
+                        self.prefetch(urls[i + 1:i + 1 + prefetch])
+                    uso = self.use(url)
+                    path = uso.__enter__()
+                    if path is None:
+                        uso.__exit__(None, None, None)
+                        continue
+                    em_uso[executor.submit(func, path)] = (i, uso)
+                concluir(list(em_uso))
+            finally:
+                # Em caso de erro, libera os arquivos ainda protegidos
+                for futuro, (_, uso) in list(em_uso.items()):
+                    futuro.cancel()
+                    uso.__exit__(None, None, None)
+        self.evict()
+        return [resultados[i] for i in sorted(resultados)]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,410 @@
+import os
+import hashlib
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import uproot
+from uproot.source.chunk import Chunk, Source, notifier
+
+# Cache em disco dos blocos lidos remotamente (LRU limitado por bytes)
+REMOTE_CACHE_DIR = os.environ.get("HEP_REMOTE_CACHE_DIR", "/app/data/remote_cache")
+REMOTE_CACHE_BYTES = int(os.environ.get("HEP_REMOTE_CACHE_BYTES", 20 * 1024 ** 3))
+
+# Granularidade do cache: cada leitura é alinhada a blocos deste tamanho
+REMOTE_BLOCK_SIZE = 256 * 1024
+
+# Blocos faltantes separados por até COALESCE_GAP_BLOCKS viram uma só requisição (até MAX_REQUEST_BYTES)
+COALESCE_GAP_BLOCKS = 2
+MAX_REQUEST_BYTES = 16 * 1024 ** 2
+
+# Requisições simultâneas por arquivo e blocos lidos antecipadamente depois de cada leitura
+REMOTE_WORKERS = 8
+READAHEAD_BLOCKS = 8
+
+REMOTE_PREFIXES = ("http://", "https://", "root://")
+
+
+def is_remote(path):
+    """True para URLs HTTP(S) e XRootD."""
+    return isinstance(path, str) and path.startswith(REMOTE_PREFIXES)
+
+
+class BlockCache:
+    """
+    Blocos de arquivos remotos guardados em disco, com despejo LRU quando o total passa de max_bytes.
+
+    Cada bloco é um arquivo <cache_dir>/<hash da URL>/<índice>.blk. A ordem
+    de uso é reconstruída pelo mtime ao abrir o cache; cada acerto atualiza
+    o mtime, então a ordem sobrevive entre execuções.
+    """
+
+    def __init__(self, cache_dir=REMOTE_CACHE_DIR, max_bytes=REMOTE_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self.total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        existentes = []
+        for diretorio, _, nomes in os.walk(cache_dir):
+            for nome in nomes:
+                if nome.endswith(".blk"):
+                    stat = os.stat(os.path.join(diretorio, nome))
+                    existentes.append((stat.st_mtime, os.path.join(diretorio, nome), stat.st_size))
+        for _, path, tamanho in sorted(existentes):
+            self._lru[path] = tamanho
+            self.total_bytes += tamanho
+
+    def _path(self, key, block):
+        return os.path.join(self.cache_dir, key, f"{block}.blk")
+
+    def contains(self, key, block):
+        return os.path.exists(self._path(key, block))
+
+    def get(self, key, block):
+        """Conteúdo do bloco, ou None se não está no cache."""
+        path = self._path(key, block)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if path in self._lru:
+                self._lru.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, block, data):
+        """Grava um bloco e despeja os menos usados até caber no limite."""
+        path = self._path(key, block)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.total_bytes += len(data) - self._lru.pop(path, 0)
+            self._lru[path] = len(data)
+            while self.total_bytes > self.max_bytes and len(self._lru) > 1:
+                antigo, tamanho = self._lru.popitem(last=False)
+                self.total_bytes -= tamanho
+                try:
+                    os.remove(antigo)
+                except FileNotFoundError:
+                    pass
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def shared_cache(cache_dir=REMOTE_CACHE_DIR, max_bytes=REMOTE_CACHE_BYTES):
+    """Um BlockCache por diretório no processo, para que todas as fontes dividam o mesmo limite."""
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = BlockCache(cache_dir, max_bytes)
+        return _caches[cache_dir]
+
+
+class HTTPRangeReader:
+    """Leituras de faixas de bytes via HTTP Range."""
+
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+
+    def size(self):
+        requisicao = urllib.request.Request(self.url, method="HEAD")
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            self.version = resposta.headers.get("ETag") or resposta.headers.get("Last-Modified")
+            return int(resposta.headers["Content-Length"])
+
+    def read(self, start, stop):
+        requisicao = urllib.request.Request(self.url, headers={"Range": f"bytes={start}-{stop - 1}"})
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            data = resposta.read()
+            if resposta.status != 206:
+                # Servidor sem suporte a Range devolveu o arquivo inteiro
+                data = data[start:stop]
+        return data
+
+
+class XRootDRangeReader:
+    """Leituras de faixas de bytes via XRootD (requer o pacote XRootD)."""
+
+    def __init__(self, url, timeout=60):
+        from XRootD import client
+
+        self.url = url
+        self.timeout = timeout
+        self._file = client.File()
+        status, _ = self._file.open(url, timeout=timeout)
+        if not status.ok:
+            raise OSError(f"🚨 XRootD: não foi possível abrir {url}: {status.message}")
+        self._lock = threading.Lock()
+
+    def size(self):
+        status, info = self._file.stat(timeout=self.timeout)
+        if not status.ok:
+            raise OSError(f"🚨 XRootD: stat falhou em {self.url}: {status.message}")
+        self.version = str(info.modtime)
+        return info.size
+
+    def read(self, start, stop):
+        with self._lock:
+            status, data = self._file.read(start, stop - start, timeout=self.timeout)
+        if not status.ok:
+            raise OSError(f"🚨 XRootD: leitura falhou em {self.url}: {status.message}")
+        return data
+
+
+def range_reader(url):
+    """Leitor de faixas adequado ao protocolo da URL."""
+    return XRootDRangeReader(url) if url.startswith("root://") else HTTPRangeReader(url)
+
+
+class CachedRemoteSource(Source):
+    """
+    Fonte do uproot que lê só as faixas pedidas de um arquivo remoto, com cache de blocos em disco.
+
+    As faixas de cada pedido do uproot (os baskets dos ramos lidos) são
+    alinhadas a blocos; os blocos que faltam no cache são agrupados em
+    poucas requisições e buscados em paralelo. Depois de cada pedido, os
+    blocos seguintes são buscados em segundo plano (leitura antecipada).
+
+    Uso: uproot.open(url, handler=CachedRemoteSource) ou open_root(url).
+    """
+
+    def __init__(self, file_path, **options):
+        super().__init__()
+        self._file_path = file_path
+        self._reader = range_reader(file_path)
+        self._num_bytes = self._reader.size()
+        self._key = hashlib.sha1(f"{file_path}|{self._reader.version}".encode()).hexdigest()[:20]
+        self._cache = shared_cache(options.get("remote_cache_dir") or REMOTE_CACHE_DIR)
+        self._executor = ThreadPoolExecutor(max_workers=REMOTE_WORKERS)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Contadores para avaliar o cache
+        self.fetched_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __repr__(self):
+        return f"<CachedRemoteSource {self._file_path!r} at 0x{id(self):012x}>"
+
+    def _fetch_run(self, primeiro, ultimo):
+        # Uma requisição para os blocos [primeiro, ultimo]; cada bloco vai para o cache
+        inicio = primeiro * REMOTE_BLOCK_SIZE
+        try:
+            data = self._reader.read(inicio, min((ultimo + 1) * REMOTE_BLOCK_SIZE, self._num_bytes))
+            blocos = {}
+            for b in range(primeiro, ultimo + 1):
+                blocos[b] = data[(b - primeiro) * REMOTE_BLOCK_SIZE:(b - primeiro + 1) * REMOTE_BLOCK_SIZE]
+                self._cache.put(self._key, b, blocos[b])
+            with self._lock:
+                self.fetched_bytes += len(data)
+            return blocos
+        finally:
+            # Também em caso de erro: um futuro com falha não pode ficar registrado e ser reaproveitado
+            with self._lock:
+                for b in range(primeiro, ultimo + 1):
+                    self._inflight.pop(b, None)
+
+    def _request(self, blocos):
+        """
+        Garante os blocos pedidos: lê o que está no cache e agrupa o resto em requisições paralelas.
+
+        :param blocos: Índices de blocos (ordenados).
+        :return: Dicionário {bloco: futuro ou bytes}.
+        """
+        resultado, faltantes = {}, []
+        for b in blocos:
+            data = self._cache.get(self._key, b)
+            if data is not None:
+                resultado[b] = data
+                self.cache_hits += 1
+            else:
+                faltantes.append(b)
+
+        with self._lock:
+            novos = []
+            for b in faltantes:
+                if b in self._inflight:
+                    resultado[b] = self._inflight[b]
+                else:
+                    novos.append(b)
+            self.cache_misses += len(novos)
+
+            # Agrupa blocos próximos em faixas contínuas (os intervalos curtos são lidos junto)
+            max_blocos = max(MAX_REQUEST_BYTES // REMOTE_BLOCK_SIZE, 1)
+            faixas = []
+            for b in novos:
+                if faixas and b - faixas[-1][1] <= COALESCE_GAP_BLOCKS + 1 and b - faixas[-1][0] < max_blocos:
+                    faixas[-1][1] = b
+                else:
+                    faixas.append([b, b])
+
+            for primeiro, ultimo in faixas:
+                futuro = self._executor.submit(self._fetch_run, primeiro, ultimo)
+                for b in range(primeiro, ultimo + 1):
+                    self._inflight[b] = futuro
+                    if b in faltantes:
+                        resultado[b] = futuro
+        return resultado
+
+    def _read(self, start, stop, blocos):
+        stop = min(stop, self._num_bytes)
+        if stop <= start:
+            return b""
+        primeiro, ultimo = start // REMOTE_BLOCK_SIZE, (stop - 1) // REMOTE_BLOCK_SIZE
+        partes = []
+        for b in range(primeiro, ultimo + 1):
+            data = blocos[b]
+            if not isinstance(data, bytes):
+                data = data.result()[b]
+            partes.append(data)
+        data = b"".join(partes)
+        return data[start - primeiro * REMOTE_BLOCK_SIZE:stop - primeiro * REMOTE_BLOCK_SIZE]
+
+    def _blocks_for(self, ranges):
+        blocos = set()
+        for start, stop in ranges:
+            stop = min(stop, self._num_bytes)
+            if stop > start:
+                blocos.update(range(start // REMOTE_BLOCK_SIZE, (stop - 1) // REMOTE_BLOCK_SIZE + 1))
+        return sorted(blocos)
+
+    def _readahead(self, ultimo):
+        total = (self._num_bytes - 1) // REMOTE_BLOCK_SIZE
+        proximos = [b for b in range(ultimo + 1, min(ultimo + READAHEAD_BLOCKS, total) + 1)
+                    if b not in self._inflight and not self._cache.contains(self._key, b)]
+        if proximos and not self._closed:
+            self._request(proximos)
+
+    def chunk(self, start, stop):
+        self._num_requests += 1
+        self._num_requested_chunks += 1
+        self._num_requested_bytes += stop - start
+
+        blocos = self._blocks_for([(start, stop)])
+        data = self._read(start, stop, self._request(blocos))
+        if blocos:
+            self._readahead(blocos[-1])
+        return Chunk.wrap(self, data, start)
+
+    def chunks(self, ranges, notifications):
+        self._num_requests += 1
+        self._num_requested_chunks += len(ranges)
+        self._num_requested_bytes += sum(stop - start for start, stop in ranges)
+
+        # Todas as faixas do pedido de uma vez: o agrupamento atravessa baskets vizinhos
+        blocos = self._blocks_for(ranges)
+        pendentes = self._request(blocos)
+        chunks = []
+        for start, stop in ranges:
+            chunk = Chunk.wrap(self, self._read(start, stop, pendentes), start)
+            notifier(chunk, notifications)()
+            chunks.append(chunk)
+        if blocos:
+            self._readahead(blocos[-1])
+        return chunks
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def open_root(path, **options):
+    """
+    uproot.open que usa CachedRemoteSource para URLs remotas e o leitor padrão para arquivos locais.
+
+    :param path: Caminho local ou URL (http://, https://, root://).
+    :param options: Repassadas para uproot.open.
+    :return: Diretório ROOT aberto.
+    """
+    if is_remote(path):
+        options.setdefault("handler", CachedRemoteSource)
+    return uproot.open(path, **options)
+
+
+def remote_fingerprint(url):
+    """Identificação do conteúdo remoto (tamanho + ETag/Last-Modified), sem baixar o arquivo."""
+    reader = range_reader(url)
+    return f"{url}|{reader.size()}|{reader.version}"
+
+
+def serve_directory(directory, host="127.0.0.1", port=0):
+    """
+    Servidor HTTP local com suporte a Range, para testar a leitura remota com os arquivos sintéticos.
+
+    :param directory: Diretório servido.
+    :param host: Endereço.
+    :param port: Porta (0 = qualquer livre).
+    :return: Tupla (servidor, URL base); encerre com servidor.shutdown().
+    """
+    import re
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class RangeRequestHandler(SimpleHTTPRequestHandler):
+        def send_head(self):
+            self._restante = None
+            faixa = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            path = self.translate_path(self.path)
+            if not faixa or not os.path.isfile(path):
+                return super().send_head()
+
+            tamanho = os.path.getsize(path)
+            inicio = int(faixa.group(1))
+            fim = min(int(faixa.group(2)) if faixa.group(2) else tamanho - 1, tamanho - 1)
+            if inicio > fim:
+                self.send_error(416)
+                return None
+
+            f = open(path, "rb")
+            f.seek(inicio)
+            self.send_response(206)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Range", f"bytes {inicio}-{fim}/{tamanho}")
+            self.send_header("Content-Length", str(fim - inicio + 1))
+            self.end_headers()
+            self._restante = fim - inicio + 1
+            return f
+
+        def copyfile(self, source, outputfile):
+            restante = getattr(self, "_restante", None)
+            if restante is None:
+                return super().copyfile(source, outputfile)
+            while restante > 0:
+                data = source.read(min(restante, 1024 * 1024))
+                if not data:
+                    break
+                outputfile.write(data)
+                restante -= len(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, port), partial(RangeRequestHandler, directory=directory))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
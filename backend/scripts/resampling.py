@@ -0,0 +1,171 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Estatísticas suportadas pelo motor de reamostragem
+STATISTICS = ("ks", "pearson", "mean_diff")
+
+# Limite de elementos por lote (replicatas x eventos) para controlar o uso de RAM
+MAX_BATCH_ELEMENTS = 8_000_000
+
+# Dados compartilhados com os workers (definidos uma vez por processo no initializer)
+_WORKER_DATA = {}
+
+
+def _init_worker(x, y):
+    _WORKER_DATA["x"] = x
+    _WORKER_DATA["y"] = y
+
+
+def _ks_from_sorted(z_sorted, labels):
+    """
+    Estatística KS de várias replicatas a partir dos valores ordenados.
+
+    :param z_sorted: Valores agrupados ordenados por linha (B, N) ou (N,).
+    :param labels: +1/n para a amostra x e -1/m para y, na mesma ordem (B, N).
+    :return: Array (B,) com a distância máxima entre as CDFs.
+    """
+    diff = np.abs(np.cumsum(labels, axis=1))
+    # Em valores empatados só o último elemento do grupo representa a CDF
+    if z_sorted.ndim == 1:
+        fim = np.append(z_sorted[1:] != z_sorted[:-1], True)
+        return diff[:, fim].max(axis=1)
+    fim = np.concatenate([z_sorted[:, 1:] != z_sorted[:, :-1], np.ones((len(z_sorted), 1), dtype=bool)], axis=1)
+    return np.where(fim, diff, 0.0).max(axis=1)
+
+
+def _pearson_rows(xb, yb):
+    xc = xb - xb.mean(axis=1, keepdims=True)
+    yc = yb - yb.mean(axis=1, keepdims=True)
+    return (xc * yc).sum(axis=1) / np.sqrt((xc ** 2).sum(axis=1) * (yc ** 2).sum(axis=1))
+
+
+def _observed(statistic, x, y):
+    return _bootstrap_batch(statistic, x, y, None)[0]
+
+
+def _bootstrap_batch(statistic, x, y, rng, size=1):
+    """Estatística de `size` replicatas bootstrap (rng=None usa as amostras originais)."""
+    n, m = len(x), len(y)
+
+    if statistic == "pearson":
+        idx = np.arange(n)[None, :] if rng is None else rng.integers(0, n, size=(size, n))
+        return _pearson_rows(x[idx], y[idx])
+
+    xb = x[None, :] if rng is None else x[rng.integers(0, n, size=(size, n))]
+    yb = y[None, :] if rng is None else y[rng.integers(0, m, size=(size, m))]
+
+    if statistic == "mean_diff":
+        return xb.mean(axis=1) - yb.mean(axis=1)
+
+    z = np.concatenate([xb, yb], axis=1)
+    labels = np.concatenate([np.full(n, 1.0 / n), np.full(m, -1.0 / m)])
+    ordem = np.argsort(z, axis=1, kind="stable")
+    return _ks_from_sorted(np.take_along_axis(z, ordem, axis=1), labels[ordem])
+
+
+def _permutation_batch(statistic, x, y, rng, size):
+    """Estatística de `size` replicatas sob permutação dos rótulos das amostras."""
+    n, m = len(x), len(y)
+
+    if statistic == "pearson":
+        return _pearson_rows(np.broadcast_to(x, (size, n)), rng.permuted(np.tile(y, (size, 1)), axis=1))
+
+    if statistic == "mean_diff":
+        pooled = rng.permuted(np.tile(np.concatenate([x, y]), (size, 1)), axis=1)
+        return pooled[:, :n].mean(axis=1) - pooled[:, n:].mean(axis=1)
+
+    # KS: a ordenação do conjunto agrupado é feita uma vez; só os rótulos são permutados
+    z = np.sort(np.concatenate([x, y]))
+    labels = np.concatenate([np.full(n, 1.0 / n), np.full(m, -1.0 / m)])
+    return _ks_from_sorted(z, rng.permuted(np.tile(labels, (size, 1)), axis=1))
+
+
+def _run_batch(kind, statistic, seed, size):
+    rng = np.random.default_rng(seed)
+    x, y = _WORKER_DATA["x"], _WORKER_DATA["y"]
+    if kind == "bootstrap":
+        return _bootstrap_batch(statistic, x, y, rng, size)
+    return _permutation_batch(statistic, x, y, rng, size)
+
+
+def _resample(kind, x, y, statistic, n_replicates, batch_size, n_jobs, seed):
+    if statistic not in STATISTICS:
+        raise ValueError(f"🚨 Estatística desconhecida: {statistic}. Use uma de {STATISTICS}.")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if statistic == "pearson" and len(x) != len(y):
+        raise ValueError("🚨 Correlação de Pearson exige amostras pareadas (mesmo tamanho).")
+
+    batch_size = batch_size or max(1, MAX_BATCH_ELEMENTS // (len(x) + len(y)))
+    tamanhos = [min(batch_size, n_replicates - i) for i in range(0, n_replicates, batch_size)]
+
+    # Um fluxo aleatório independente por lote: o resultado não depende do número de workers
+    seeds = np.random.SeedSequence(seed).spawn(len(tamanhos))
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    if n_jobs == 1 or len(tamanhos) == 1:
+        _init_worker(x, y)
+        return np.concatenate([_run_batch(kind, statistic, s, t) for s, t in zip(seeds, tamanhos)])
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(x, y)) as executor:
+        lotes = executor.map(_run_batch, [kind] * len(tamanhos), [statistic] * len(tamanhos), seeds, tamanhos)
+        return np.concatenate(list(lotes))
+
+
+def bootstrap(x, y, statistic="ks", n_replicates=10000, batch_size=None, n_jobs=None, seed=42):
+    """
+    Distribuição bootstrap de uma estatística entre duas amostras.
+
+    As replicatas são geradas em lotes vetorizados e distribuídas entre os
+    núcleos da máquina.
+
+    :param x: Primeira amostra.
+    :param y: Segunda amostra (pareada com x quando statistic="pearson").
+    :param statistic: "ks", "pearson" ou "mean_diff".
+    :param n_replicates: Número de replicatas.
+    :param batch_size: Replicatas por lote (padrão: limitado por MAX_BATCH_ELEMENTS).
+    :param n_jobs: Número de processos (padrão: todos os núcleos).
+    :param seed: Semente da sequência de fluxos aleatórios.
+    :return: Array (n_replicates,) com a estatística de cada replicata.
+    """
+    return _resample("bootstrap", x, y, statistic, n_replicates, batch_size, n_jobs, seed)
+
+
+def permutation_test(x, y, statistic="ks", n_replicates=10000, batch_size=None, n_jobs=None, seed=42):
+    """
+    Teste de permutação bilateral entre duas amostras.
+
+    :param x: Primeira amostra.
+    :param y: Segunda amostra (pareada com x quando statistic="pearson").
+    :param statistic: "ks", "pearson" ou "mean_diff".
+    :param n_replicates: Número de permutações.
+    :param batch_size: Permutações por lote.
+    :param n_jobs: Número de processos (padrão: todos os núcleos).
+    :param seed: Semente da sequência de fluxos aleatórios.
+    :return: Dicionário com statistic (observada), pvalue e replicates.
+    """
+    observada = _observed(statistic, np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    replicatas = _resample("permutation", x, y, statistic, n_replicates, batch_size, n_jobs, seed)
+
+    extremos = np.sum(np.abs(replicatas) >= np.abs(observada) - 1e-12)
+    return {
+        "statistic": float(observada),
+        "pvalue": float((extremos + 1) / (n_replicates + 1)),
+        "replicates": replicatas,
+    }
+
+
+def ks_pvalues(statistics, n, m):
+    """
+    P-values assintóticos do KS de duas amostras para um array de estatísticas.
+
+    :param statistics: Estatísticas KS (ex.: saída de bootstrap).
+    :param n: Tamanho da primeira amostra.
+    :param m: Tamanho da segunda amostra.
+    :return: Array de p-values.
+    """
+    from scipy.stats import kstwobign
+
+    return kstwobign.sf(np.asarray(statistics) * np.sqrt(n * m / (n + m)))
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from pca_reduction import PCA_N_COMPONENTS
+
+# Índices salvos junto dos dados processados (subdiretório ignorado pelo glob *.parquet do dashboard)
+PROCESSED_PARQUET_DIR = "/app/data/processed_parquet_parts"
+ANN_SUBDIR = "_ann"
+
+# Espaços em que o índice pode ser construído: o embedding do UMAP, as features
+# padronizadas (mesmas colunas de processed_parquet.FEATURE_COLUMNS) ou as componentes
+# do PCA incremental, lidas das projeções .pca.npy (pca_reduction) e não do Parquet
+INDEX_SPACES = {
+    "embedding": ["U1", "U2", "U3"],
+    "features": ["MuonsAuxDyn.pt", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"],
+    "pca": [f"PC{i + 1}" for i in range(PCA_N_COMPONENTS)],
+}
+
+# Grau do grafo de vizinhança do índice (maior = buscas mais precisas, construção mais lenta)
+INDEX_N_NEIGHBORS = 30
+
+
+def _index_dir(processed_dir):
+    return os.path.join(processed_dir, ANN_SUBDIR)
+
+
+def _source_files(processed_dir):
+    return sorted(os.path.join(processed_dir, f) for f in os.listdir(processed_dir) if f.endswith(".parquet"))
+
+
+def _space_files(processed_dir, space):
+    # Arquivos cujo conteúdo define o índice: no espaço PCA, também as projeções
+    arquivos = _source_files(processed_dir)
+    if space == "pca":
+        from pca_reduction import projection_path
+        arquivos += [projection_path(f) for f in arquivos if os.path.exists(projection_path(f))]
+    return arquivos
+
+
+def _pca_block(path, columns):
+    """Vetores PCA de um Parquet processado e as linhas válidas (eventos com features finitas)."""
+    import pyarrow.parquet as pq
+    from pca_reduction import load_projection
+
+    # As linhas de preenchimento das conexões fractais têm as features nulas e ficam de fora
+    tabela = pq.read_table(path, columns=INDEX_SPACES["features"])
+    features = np.column_stack([tabela[c].to_numpy(zero_copy_only=False) for c in INDEX_SPACES["features"]])
+    projecao = load_projection(path)
+    validos = np.isfinite(features[:len(projecao)]).all(axis=1)
+    return np.asarray(projecao[:len(validos)], dtype=np.float32)[:, :len(columns)], validos
+
+
+def _fingerprints(files):
+    return {os.path.basename(f): [os.path.getsize(f), os.path.getmtime(f)] for f in files}
+
+
+class SimilarityIndex:
+    """
+    Índice de vizinhos aproximados (grafo NN-descent do pynndescent) sobre os eventos processados.
+
+    Cada ponto do índice guarda a origem (arquivo e linha no Parquet
+    processado) e o vetor indexado. Nas features, os vetores são padronizados com a média e o
+    desvio salvos no próprio índice, e as consultas passam pela mesma escala.
+    """
+
+    def __init__(self, space, columns, index, vectors, files, rows, mean, std, fingerprints=None):
+        self.space = space
+        self.columns = list(columns)
+        self.index = index
+        # Cópia própria dos vetores padronizados: o prepare() do pynndescent reordena os dados internos
+        self.vectors = vectors
+        self.files = np.asarray(files)
+        self.rows = np.asarray(rows)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self.fingerprints = fingerprints or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, processed_dir=PROCESSED_PARQUET_DIR, space="embedding", n_neighbors=INDEX_N_NEIGHBORS,
+              random_state=42):
+        """
+        Constrói o índice a partir de todos os Parquet processados.
+
+        :param processed_dir: Diretório dos Parquet processados.
+        :param space: "embedding" (U1–U3), "features" (features padronizadas) ou "pca" (projeções .pca.npy).
+        :param n_neighbors: Grau do grafo do índice.
+        :param random_state: Semente do NN-descent.
+        :return: SimilarityIndex pronto para consultas.
+        """
+        import pyarrow.parquet as pq
+        from pynndescent import NNDescent
+
+        if space not in INDEX_SPACES:
+            raise ValueError(f"🚨 Espaço desconhecido: {space}. Use um de {list(INDEX_SPACES)}.")
+        columns = INDEX_SPACES[space]
+
+        arquivos = _source_files(processed_dir)
+        if not arquivos:
+            raise ValueError(f"🚨 Nenhum Parquet processado em {processed_dir}.")
+
+        blocos, origem, linhas = [], [], []
+        for i, path in enumerate(arquivos):
+            if space == "pca":
+                bloco, validos = _pca_block(path, columns)
+                columns = columns[:bloco.shape[1]]
+            else:
+                tabela = pq.read_table(path, columns=columns)
+                bloco = np.column_stack([tabela[c].to_numpy(zero_copy_only=False) for c in columns]).astype(np.float32)
+                validos = np.isfinite(bloco).all(axis=1)
+            blocos.append(bloco[validos])
+            origem.append(np.full(validos.sum(), i, dtype=np.int32))
+            linhas.append(np.flatnonzero(validos).astype(np.int64))
+
+        X = np.concatenate(blocos)
+        if space == "features":
+            mean, std = X.mean(axis=0), X.std(axis=0)
+            std[std == 0] = 1.0
+        else:
+            mean, std = np.zeros(X.shape[1], np.float32), np.ones(X.shape[1], np.float32)
+        X = (X - mean) / std
+
+        print(f"⚠️ Construindo índice ANN ({space}, {len(X)} eventos, k={n_neighbors})...")
+        index = NNDescent(X, n_neighbors=n_neighbors, metric="euclidean", random_state=random_state,
+                          low_memory=True)
+        # Prepara a estrutura de busca (grafo podado + árvore de inicialização) uma única vez
+        index.prepare()
+
+        nomes = np.array([os.path.basename(f) for f in arquivos])
+        return cls(space, columns, index, X, nomes[np.concatenate(origem)], np.concatenate(linhas), mean, std,
+                   _fingerprints(_space_files(processed_dir, space)))
+
+    def save(self, processed_dir=PROCESSED_PARQUET_DIR):
+        """
+        Grava o índice e os metadados em <processed_dir>/_ann.
+
+        :param processed_dir: Diretório dos Parquet processados.
+        :return: Caminho do arquivo do índice.
+        """
+        destino = _index_dir(processed_dir)
+        os.makedirs(destino, exist_ok=True)
+        path = os.path.join(destino, f"{self.space}.index.pkl")
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        with open(os.path.join(destino, f"{self.space}.meta.json"), "w") as f:
+            json.dump({"space": self.space, "columns": self.columns, "n_events": len(self),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "sources": self.fingerprints}, f, indent=4)
+        print(f"✅ Índice ANN salvo: {path}")
+        return path
+
+    @classmethod
+    def load(cls, processed_dir=PROCESSED_PARQUET_DIR, space="embedding"):
+        """Carrega um índice salvo com save()."""
+        with open(os.path.join(_index_dir(processed_dir), f"{space}.index.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def is_stale(self, processed_dir=PROCESSED_PARQUET_DIR):
+        """True se os Parquet processados mudaram desde a construção do índice."""
+        return _fingerprints(_space_files(processed_dir, self.space)) != self.fingerprints
+
+    def query(self, vectors, k=10):
+        """
+        k vizinhos aproximados de um ou mais vetores (nas colunas do índice, sem padronizar).
+
+        :param vectors: Array (n_colunas,) ou (n_consultas, n_colunas).
+        :param k: Número de vizinhos.
+        :return: DataFrame com query, rank, file, row, distance e as colunas do índice.
+        """
+        vetores = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        indices, distancias = self.index.query((vetores - self.mean) / self.std, k=k)
+
+        pontos = indices.ravel()
+        vizinhos = pd.DataFrame({
+            "query": np.repeat(np.arange(len(vetores)), k),
+            "rank": np.tile(np.arange(k), len(vetores)),
+            "file": self.files[pontos],
+            "row": self.rows[pontos],
+            "distance": distancias.ravel(),
+        })
+        coordenadas = self.vectors[pontos] * self.std + self.mean
+        for i, col in enumerate(self.columns):
+            vizinhos[col] = coordenadas[:, i]
+        return vizinhos
+
+    def query_event(self, file, row, k=10):
+        """
+        k vizinhos de um evento já indexado (o próprio evento é excluído).
+
+        :param file: Nome do Parquet processado.
+        :param row: Linha do evento no Parquet.
+        :param k: Número de vizinhos.
+        :return: DataFrame como em query().
+        """
+        posicao = np.flatnonzero((self.files == file) & (self.rows == row))
+        if not len(posicao):
+            raise KeyError(f"🚨 Evento {file}:{row} não está no índice.")
+        vetor = self.vectors[posicao[0]] * self.std + self.mean
+        vizinhos = self.query(vetor, k=k + 1)
+        vizinhos = vizinhos[~((vizinhos["file"] == file) & (vizinhos["row"] == row))].head(k)
+        return vizinhos.assign(rank=np.arange(len(vizinhos))).reset_index(drop=True)
+
+
+def load_or_build_index(processed_dir=PROCESSED_PARQUET_DIR, space="embedding", rebuild=False):
+    """
+    Carrega o índice salvo, reconstruindo se não existir ou se os Parquet processados mudaram.
+
+    :param processed_dir: Diretório dos Parquet processados.
+    :param space: "embedding" ou "features".
+    :param rebuild: Força a reconstrução.
+    :return: SimilarityIndex.
+    """
+    path = os.path.join(_index_dir(processed_dir), f"{space}.index.pkl")
+    if not rebuild and os.path.exists(path):
+        index = SimilarityIndex.load(processed_dir, space)
+        if not index.is_stale(processed_dir):
+            print(f"✅ Índice ANN carregado: {path}")
+            return index
+        print("⚠️ Parquet processados mudaram; reconstruindo o índice ANN...")
+
+    index = SimilarityIndex.build(processed_dir, space)
+    index.save(processed_dir)
+    return index
+
+
+if __name__ == "__main__":
+    for espaco in INDEX_SPACES:
+        load_or_build_index(space=espaco, rebuild=True)
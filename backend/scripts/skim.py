@@ -0,0 +1,148 @@
+import os
+import json
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from truth_selector import SUSY_PDG_IDS, TRUTH_BRANCHES, STEP_SIZE, chunk_species_counts
+
+# Diretório onde ficam os skims (Parquet compacto só com os eventos selecionados)
+SKIM_DIR = "/app/data/skims"
+
+# Colunas de proveniência adicionadas a cada evento do skim
+SOURCE_COLUMN = "source_file"
+ENTRY_COLUMN = "entry"
+
+
+class TruthSelection:
+    """
+    Seleção de eventos que contêm ao menos uma das espécies de truth.
+
+    É uma classe (e não uma closure) para poder ser enviada aos processos do pool.
+    """
+
+    def __init__(self, pdg_list=SUSY_PDG_IDS, branches=TRUTH_BRANCHES):
+        self.pdg_list = np.asarray(pdg_list)
+        self.branches = list(branches)
+
+    def __call__(self, chunk):
+        presentes = [b for b in self.branches if b in chunk.fields]
+        return chunk_species_counts(chunk, presentes, self.pdg_list).any(axis=1)
+
+    def describe(self):
+        return {"type": "truth", "pdg_ids": self.pdg_list.tolist(), "branches": self.branches}
+
+
+def skim_file(path, selection, branches, output_dir=SKIM_DIR, step_size=STEP_SIZE, tree_name="CollectionTree"):
+    """
+    Aplica a seleção a um arquivo ROOT e grava só os eventos aprovados em Parquet.
+
+    Cada evento leva o arquivo de origem e o número da entrada (proveniência).
+
+    :param path: Caminho do arquivo ROOT.
+    :param selection: Função que recebe um bloco (awkward) e devolve a máscara dos eventos.
+    :param branches: Ramos a manter no skim.
+    :param output_dir: Diretório do skim.
+    :param step_size: Tamanho de cada bloco lido.
+    :param tree_name: Nome da árvore.
+    :return: Dicionário com arquivo, eventos lidos, eventos gravados e Parquet de saída.
+    """
+    import uproot
+    import awkward as ak
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, os.path.basename(path).replace(".root.1", "") + ".parquet")
+    lidos, gravados = 0, 0
+    writer = None
+
+    with uproot.open(path) as file:
+        tree = file[tree_name]
+        disponiveis = set(tree.keys())
+        selecao = getattr(selection, "branches", [])
+        leitura = sorted({b for b in list(branches) + list(selecao) if b in disponiveis})
+        manter = [b for b in branches if b in disponiveis]
+
+        concluido = False
+        try:
+            for chunk in tree.iterate(leitura, step_size=step_size, library="ak"):
+                mascara = np.asarray(selection(chunk), dtype=bool)
+                indices = np.flatnonzero(mascara)
+
+                if len(indices):
+                    selecionados = chunk[mascara]
+                    colunas = {b: selecionados[b] for b in manter}
+                    colunas[SOURCE_COLUMN] = np.full(len(indices), os.path.basename(path))
+                    colunas[ENTRY_COLUMN] = indices + lidos
+
+                    table = ak.to_arrow_table(ak.Array(colunas), extensionarray=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_file + ".tmp", table.schema)
+                    writer.write_table(table)
+                    gravados += len(indices)
+
+                lidos += len(chunk)
+            concluido = True
+        finally:
+            if writer is not None:
+                writer.close()
+            # Falha no meio do arquivo: não deixa o .tmp parcial para trás
+            if not concluido and os.path.exists(output_file + ".tmp"):
+                os.remove(output_file + ".tmp")
+
+    if writer is not None:
+        os.replace(output_file + ".tmp", output_file)
+    elif os.path.exists(output_file):
+        # Nenhum evento passou: o skim de uma seleção anterior não pode continuar valendo
+        os.remove(output_file)
+    print(f"✅ Skim de {os.path.basename(path)}: {gravados}/{lidos} eventos gravados.")
+
+    return {"file": path, "events_read": lidos, "events_written": gravados,
+            "output": output_file if writer is not None else None}
+
+
+def skim_files(files, selection=None, branches=TRUTH_BRANCHES, output_dir=SKIM_DIR, n_jobs=None, cache=None):
+    """
+    Gera o skim de vários arquivos ROOT em paralelo e grava o manifesto do skim.
+
+    :param files: Lista de arquivos ROOT (ou de URLs, com cache).
+    :param selection: Seleção de eventos (padrão: TruthSelection com as partículas SUSY).
+    :param branches: Ramos a manter no skim.
+    :param output_dir: Diretório do skim.
+    :param n_jobs: Número de processos (padrão: um por arquivo, limitado pelos núcleos).
+    :param cache: RawCache opcional: arquivos despejados voltam a ser baixados e os próximos já baixam.
+    :return: Lista com o resumo de cada arquivo.
+    """
+    selection = selection or TruthSelection()
+    n_jobs = max(1, n_jobs or min(len(files), os.cpu_count() or 1))
+    tarefa = partial(skim_file, selection=selection, branches=branches, output_dir=output_dir)
+
+    if cache is not None:
+        resumos = cache.map(tarefa, files, max_workers=n_jobs)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            resumos = list(executor.map(tarefa, files))
+
+    manifesto = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "selection": selection.describe() if hasattr(selection, "describe") else repr(selection),
+        "branches": list(branches),
+        "files": resumos,
+    }
+    with open(os.path.join(output_dir, "_skim_manifest.json"), "w") as f:
+        json.dump(manifesto, f, indent=4)
+
+    total = sum(r["events_written"] for r in resumos)
+    print(f"🎉 Skim concluído: {total} eventos em {output_dir}")
+    return resumos
+
+
+if __name__ == "__main__":
+    from raw_cache import RawCache
+    from download import urls, download_file
+
+    # Fila completa de arquivos: os despejados do cache bruto são baixados de novo
+    cache = RawCache(download=download_file)
+    skim_files(urls, cache=cache)
+    cache.close()
@@ -0,0 +1,239 @@
+import os
+import numpy as np
+
+from truth_selector import SUSY_PDG_IDS, TRUTH_BRANCHES
+
+# Diretório padrão dos arquivos sintéticos (mesmo formato dos arquivos do CERN)
+SYNTHETIC_DIR = "/app/data/synthetic"
+
+# Eventos gravados por vez em cada arquivo (limita a memória do gerador)
+CHUNK_EVENTS = 50_000
+
+# Massas em MeV (unidade do xAOD)
+MUON_MASS = 105.658
+Z_MASS, Z_WIDTH = 91187.6, 2495.2
+
+# pdgIds do Modelo Padrão usados no hard scatter sintético
+SM_PDG_IDS = np.array([1, -1, 2, -2, 3, -3, 4, -4, 5, -5, 6, -6, 11, -11, 13, -13, 21, 22, 23, 24, -24])
+
+
+def _jagged(values, counts):
+    import awkward as ak
+    return ak.unflatten(np.asarray(values), np.asarray(counts, dtype=np.int64))
+
+
+def _branch_type(values):
+    # Arrays jagged do awkward viram ramos "var * tipo"; arrays numpy, ramos escalares
+    return values.type.content if hasattr(values, "layout") else values.dtype
+
+
+def _dimuon_decay(rng, n):
+    """
+    Pares μ+μ- vindos de um Z (Breit-Wigner) com pT e rapidez realistas.
+
+    O decaimento é isotrópico no referencial de repouso e levado ao
+    laboratório por um boost de Lorentz.
+
+    :return: Tupla (pt, eta, phi) com formato (n, 2); a coluna 0 é o μ+.
+    """
+    massa = Z_MASS + Z_WIDTH / 2 * np.tan(np.pi * (rng.random(n) - 0.5))
+    massa = np.clip(massa, 60000.0, 120000.0)
+    pt_z = rng.exponential(8000.0, n)
+    y_z = rng.normal(0.0, 1.5, n)
+    phi_z = rng.uniform(-np.pi, np.pi, n)
+
+    mt = np.sqrt(massa ** 2 + pt_z ** 2)
+    quadri_z = np.stack([mt * np.cosh(y_z), pt_z * np.cos(phi_z), pt_z * np.sin(phi_z), mt * np.sinh(y_z)], axis=1)
+
+    # Decaimento em repouso: momento p* em direção isotrópica
+    p_estrela = np.sqrt(np.maximum((massa / 2) ** 2 - MUON_MASS ** 2, 0.0))
+    cos_t = rng.uniform(-1, 1, n)
+    sin_t = np.sqrt(1 - cos_t ** 2)
+    phi_d = rng.uniform(-np.pi, np.pi, n)
+    direcao = np.stack([sin_t * np.cos(phi_d), sin_t * np.sin(phi_d), cos_t], axis=1)
+
+    beta = quadri_z[:, 1:] / quadri_z[:, :1]
+    gamma = quadri_z[:, 0] / massa
+    b2 = (beta ** 2).sum(axis=1)
+
+    pt, eta, phi = np.empty((n, 2)), np.empty((n, 2)), np.empty((n, 2))
+    for i, sinal in enumerate((1.0, -1.0)):
+        p = sinal * p_estrela[:, None] * direcao
+        e = np.full(n, massa / 2)
+        bp = (beta * p).sum(axis=1)
+        fator = np.where(b2 > 0, (gamma - 1) * bp / np.where(b2 > 0, b2, 1.0), 0.0) + gamma * e
+        p_lab = p + fator[:, None] * beta
+        pt[:, i] = np.hypot(p_lab[:, 0], p_lab[:, 1])
+        eta[:, i] = np.arcsinh(p_lab[:, 2] / np.maximum(pt[:, i], 1e-9))
+        phi[:, i] = np.arctan2(p_lab[:, 1], p_lab[:, 0])
+    return pt, eta, phi
+
+
+def _muons(rng, n, muon_mean, resonance_fraction):
+    """Múons por evento: fundo independente + pares de Z em uma fração dos eventos."""
+    n_fundo = rng.poisson(muon_mean, n)
+    total_fundo = int(n_fundo.sum())
+    fundo = {
+        "pt": 4000.0 + rng.exponential(6000.0, total_fundo),
+        "eta": rng.uniform(-2.5, 2.5, total_fundo),
+        "phi": rng.uniform(-np.pi, np.pi, total_fundo),
+        "charge": rng.choice([-1.0, 1.0], total_fundo),
+    }
+
+    com_z = rng.random(n) < resonance_fraction
+    n_z = int(com_z.sum())
+    pt_z, eta_z, phi_z = _dimuon_decay(rng, n_z)
+    par = {"pt": pt_z, "eta": eta_z, "phi": phi_z, "charge": np.tile([1.0, -1.0], (n_z, 1))}
+
+    # Intercala fundo e pares evento a evento: primeiro os múons do Z, depois os de fundo
+    contagens = n_fundo + 2 * com_z
+    origem_evento = np.repeat(np.arange(n), contagens)
+    inicio = np.concatenate([[0], np.cumsum(contagens)[:-1]])
+    posicao = np.arange(int(contagens.sum())) - inicio[origem_evento]
+    eh_z = com_z[origem_evento] & (posicao < 2)
+
+    muons = {}
+    for campo in ("pt", "eta", "phi", "charge"):
+        valores = np.empty(len(origem_evento))
+        valores[eh_z] = par[campo].ravel()
+        valores[~eh_z] = fundo[campo]
+        muons[campo] = valores
+    return contagens, muons
+
+
+def _hion14_chunk(rng, n, muon_mean, track_mean, resonance_fraction):
+    centralidade = rng.uniform(0.0, 100.0, n)
+    contagens, muons = _muons(rng, n, muon_mean, resonance_fraction)
+    p = muons["pt"] * np.cosh(muons["eta"])
+
+    # Multiplicidade de traços e energia no calorímetro caem com a centralidade
+    n_tracks = rng.poisson(track_mean * np.exp(-centralidade / 25.0))
+    total_tracks = int(n_tracks.sum())
+    track_pt = 500.0 + rng.exponential(1000.0, total_tracks)
+    track_eta = rng.uniform(-2.5, 2.5, total_tracks)
+    track_q = rng.choice([-1.0, 1.0], total_tracks)
+
+    n_calo = np.full(n, 4)
+    et_evento = rng.gamma(2.0, 1.5e6 * np.exp(-centralidade / 20.0))
+    calo_et = (et_evento[:, None] * rng.dirichlet(np.ones(4), n)).ravel()
+
+    n_vtx = 1 + rng.poisson(0.3, n)
+    total_vtx = int(n_vtx.sum())
+
+    return {
+        "MuonsAuxDyn.pt": _jagged(muons["pt"], contagens),
+        "MuonsAuxDyn.eta": _jagged(muons["eta"], contagens),
+        "MuonsAuxDyn.phi": _jagged(muons["phi"], contagens),
+        "MuonsAuxDyn.charge": _jagged(muons["charge"], contagens),
+        "MuonSpectrometerTrackParticlesAuxDyn.qOverP": _jagged(muons["charge"] / p, contagens),
+        "CaloSumsAuxDyn.et": _jagged(calo_et, n_calo),
+        "EventInfoAuxDyn.CentralityMin": np.floor(centralidade),
+        "EventInfoAuxDyn.CentralityMax": np.minimum(np.floor(centralidade) + 1.0, 100.0),
+        "InDetTrackParticlesAuxDyn.qOverP": _jagged(track_q / (track_pt * np.cosh(track_eta)), n_tracks),
+        "PrimaryVerticesAuxDyn.x": _jagged(rng.normal(0.0, 0.01, total_vtx), n_vtx),
+        "PrimaryVerticesAuxDyn.y": _jagged(rng.normal(0.0, 0.01, total_vtx), n_vtx),
+        "PrimaryVerticesAuxDyn.z": _jagged(rng.normal(0.0, 50.0, total_vtx), n_vtx),
+    }
+
+
+def _physlite_chunk(rng, n, muon_mean, susy_fraction, resonance_fraction):
+    contagens, muons = _muons(rng, n, muon_mean, resonance_fraction)
+
+    # Eventos SUSY: par stop/anti-stop e dois neutralinos; os demais não têm partículas BSM
+    susy = rng.random(n) < susy_fraction
+    n_bsm = np.where(susy, 4, 0)
+    bsm = np.tile([SUSY_PDG_IDS[0], SUSY_PDG_IDS[1], SUSY_PDG_IDS[2], SUSY_PDG_IDS[2]], int(susy.sum()))
+
+    # Com decaimentos: stop → top + neutralino, então top e anti-top também aparecem
+    n_decay = np.where(susy, 6, 0)
+    decay = np.tile([SUSY_PDG_IDS[0], SUSY_PDG_IDS[1], 6, -6, SUSY_PDG_IDS[2], SUSY_PDG_IDS[2]], int(susy.sum()))
+
+    n_hard = rng.poisson(8, n) + n_bsm
+    hard = rng.choice(SM_PDG_IDS, int(n_hard.sum()))
+    inicio = np.concatenate([[0], np.cumsum(n_hard)[:-1]])
+    # O hard scatter dos eventos SUSY também carrega os stops
+    posicoes = (inicio[susy][:, None] + np.arange(4)).ravel()
+    hard[posicoes] = bsm
+
+    return {
+        "MuonsAuxDyn.pt": _jagged(muons["pt"], contagens),
+        "MuonsAuxDyn.eta": _jagged(muons["eta"], contagens),
+        "MuonsAuxDyn.phi": _jagged(muons["phi"], contagens),
+        "MuonsAuxDyn.charge": _jagged(muons["charge"], contagens),
+        TRUTH_BRANCHES[0]: _jagged(bsm.astype(np.int32), n_bsm),
+        TRUTH_BRANCHES[1]: _jagged(decay.astype(np.int32), n_decay),
+        TRUTH_BRANCHES[2]: _jagged(hard.astype(np.int32), n_hard),
+    }
+
+
+def generate_root_file(path, n_events, kind="hion14", seed=42, chunk_events=CHUNK_EVENTS, muon_mean=1.2,
+                       track_mean=400.0, susy_fraction=0.01, resonance_fraction=0.05, tree_name="CollectionTree"):
+    """
+    Grava um arquivo ROOT sintético com a mesma árvore e os mesmos ramos dos arquivos reais.
+
+    :param path: Arquivo de saída.
+    :param n_events: Número de eventos.
+    :param kind: "hion14" (DAOD_HION14) ou "physlite" (DAOD_PHYSLITE com truth).
+    :param seed: Semente (o mesmo seed gera o mesmo arquivo).
+    :param chunk_events: Eventos gerados e gravados por vez.
+    :param muon_mean: Média da multiplicidade de múons de fundo por evento.
+    :param track_mean: Média de traços do detector interno nos eventos mais centrais (hion14).
+    :param susy_fraction: Fração de eventos com partículas SUSY (physlite).
+    :param resonance_fraction: Fração de eventos com um par μ+μ- de Z.
+    :param tree_name: Nome da árvore.
+    :return: O caminho gravado.
+    """
+    import uproot
+
+    if kind not in ("hion14", "physlite"):
+        raise ValueError(f"🚨 Tipo de arquivo sintético desconhecido: {kind}")
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with uproot.recreate(path + ".tmp") as file:
+        for inicio in range(0, n_events, chunk_events):
+            n = min(chunk_events, n_events - inicio)
+            if kind == "hion14":
+                chunk = _hion14_chunk(rng, n, muon_mean, track_mean, resonance_fraction)
+            else:
+                chunk = _physlite_chunk(rng, n, muon_mean, susy_fraction, resonance_fraction)
+
+            if inicio == 0:
+                # mktree explícito: a atribuição direta (file[nome] = ...) gera RNTuple nas versões novas do uproot
+                tree = file.mktree(tree_name, {nome: _branch_type(v) for nome, v in chunk.items()})
+            tree.extend(chunk)
+
+    os.replace(path + ".tmp", path)
+    print(f"✅ Arquivo sintético gravado: {path} ({n_events} eventos, {kind})")
+    return path
+
+
+def generate_dataset(output_dir=SYNTHETIC_DIR, n_files=4, n_events=100_000, kind="hion14", seed=42, **kwargs):
+    """
+    Gera vários arquivos sintéticos com nomes no padrão dos arquivos do CERN (*.pool.root.1).
+
+    Arquivos que já existem são mantidos.
+
+    :param output_dir: Diretório de saída.
+    :param n_files: Número de arquivos.
+    :param n_events: Eventos por arquivo.
+    :param kind: "hion14" ou "physlite".
+    :param seed: Semente base (cada arquivo usa seed + índice).
+    :param kwargs: Repassados para generate_root_file.
+    :return: Lista com os caminhos dos arquivos.
+    """
+    prefixo = "DAOD_HION14" if kind == "hion14" else "DAOD_PHYSLITE"
+    arquivos = []
+    for i in range(n_files):
+        path = os.path.join(output_dir, f"{prefixo}.synthetic._{i + 1:06d}.pool.root.1")
+        if not os.path.exists(path):
+            generate_root_file(path, n_events, kind=kind, seed=seed + i, **kwargs)
+        arquivos.append(path)
+    return arquivos
+
+
+if __name__ == "__main__":
+    generate_dataset(kind="hion14")
+    generate_dataset(kind="physlite", n_files=1)
+    print(f"🎉 Dataset sintético pronto em {SYNTHETIC_DIR}")
@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Ramos de partículas de truth (DAOD_PHYSLITE) onde buscamos as espécies
+TRUTH_BRANCHES = ["TruthBSMAuxDyn.pdgId", "TruthBSMWithDecayParticlesAuxDyn.pdgId", "HardScatterParticlesAuxDyn.pdgId"]
+
+# Partículas SUSY que estamos buscando: Stop quark, Anti-stop e Neutralino
+SUSY_PDG_IDS = np.array([1000006, -1000006, 1000022])
+
+# Tamanho de cada bloco lido do arquivo ROOT
+STEP_SIZE = "200 MB"
+
+
+def species_counts(pdg_ids, counts, pdg_list):
+    """
+    Conta quantas partículas de cada espécie há em cada evento.
+
+    Trabalha direto no conteúdo achatado (todas as partículas do bloco em
+    sequência) e no número de partículas por evento, sem loop em Python.
+
+    :param pdg_ids: Conteúdo achatado dos pdgIds (n_particulas,).
+    :param counts: Número de partículas por evento (n_eventos,).
+    :param pdg_list: Espécies procuradas.
+    :return: Array (n_eventos, n_especies) com as contagens.
+    """
+    pdg_list = np.asarray(pdg_list)
+    n_eventos, n_especies = len(counts), len(pdg_list)
+    if n_especies == 0:
+        return np.zeros((n_eventos, 0), dtype=np.int64)
+
+    ordem = np.argsort(pdg_list)
+    ordenados = pdg_list[ordem]
+    pos = np.clip(np.searchsorted(ordenados, pdg_ids), 0, n_especies - 1)
+    encontrados = ordenados[pos] == pdg_ids
+
+    evento = np.repeat(np.arange(n_eventos), counts)[encontrados]
+    especie = ordem[pos[encontrados]]
+    contagens = np.bincount(evento * n_especies + especie, minlength=n_eventos * n_especies)
+    return contagens.reshape(n_eventos, n_especies)
+
+
+def chunk_species_counts(chunk, branches, pdg_list):
+    """
+    Contagem por espécie em um bloco lido com uproot (library="ak").
+
+    Como os containers de truth se sobrepõem (a mesma partícula pode aparecer
+    em mais de um), a contagem de cada espécie no evento é o máximo entre os ramos.
+
+    :param chunk: Bloco de eventos (awkward Array com os ramos de pdgId).
+    :param branches: Ramos de pdgId presentes no bloco.
+    :param pdg_list: Espécies procuradas.
+    :return: Array (n_eventos, n_especies) com as contagens.
+    """
+    import awkward as ak
+
+    total = np.zeros((len(chunk), len(pdg_list)), dtype=np.int64)
+    for branch in branches:
+        jagged = chunk[branch]
+        conteudo = ak.to_numpy(ak.flatten(jagged, axis=None))
+        total = np.maximum(total, species_counts(conteudo, ak.to_numpy(ak.num(jagged)), pdg_list))
+    return total
+
+
+def scan_file(path, pdg_list=SUSY_PDG_IDS, branches=TRUTH_BRANCHES, step_size=STEP_SIZE, tree_name="CollectionTree"):
+    """
+    Varre um arquivo ROOT inteiro em blocos e retorna os eventos com as espécies procuradas.
+
+    Todos os ramos de truth são lidos numa única passada.
+
+    :param path: Caminho do arquivo ROOT.
+    :param pdg_list: Espécies procuradas.
+    :param branches: Ramos de pdgId a considerar.
+    :param step_size: Tamanho de cada bloco lido.
+    :param tree_name: Nome da árvore.
+    :return: DataFrame com file, entry e uma coluna de contagem por espécie (só eventos selecionados).
+    """
+    import uproot
+
+    colunas = [str(int(p)) for p in pdg_list]
+    partes = []
+
+    with uproot.open(path) as file:
+        tree = file[tree_name]
+        validos = [b for b in branches if b in tree.keys()]
+        if not validos:
+            print(f"⚠️ Nenhum ramo de truth encontrado em {path}.")
+            return pd.DataFrame(columns=["file", "entry"] + colunas)
+
+        inicio = 0
+        for chunk in tree.iterate(validos, step_size=step_size, library="ak"):
+            n = len(chunk)
+            total = chunk_species_counts(chunk, validos, pdg_list)
+
+            selecionados = np.flatnonzero(total.any(axis=1))
+            if len(selecionados):
+                parte = pd.DataFrame(total[selecionados], columns=colunas)
+                parte.insert(0, "entry", selecionados + inicio)
+                parte.insert(0, "file", path)
+                partes.append(parte)
+            inicio += n
+
+    if not partes:
+        return pd.DataFrame(columns=["file", "entry"] + colunas)
+    return pd.concat(partes, ignore_index=True)
+
+
+def select_truth_events(files, pdg_list=SUSY_PDG_IDS, branches=TRUTH_BRANCHES, n_jobs=None):
+    """
+    Seleciona, em paralelo por arquivo, os eventos que contêm as espécies procuradas.
+
+    :param files: Lista de arquivos ROOT.
+    :param pdg_list: Espécies procuradas.
+    :param branches: Ramos de pdgId a considerar.
+    :param n_jobs: Número de processos (padrão: um por arquivo, limitado pelos núcleos).
+    :return: DataFrame com file, entry e contagem por espécie de todos os arquivos.
+    """
+    n_jobs = n_jobs or min(len(files), os.cpu_count() or 1)
+
+    if n_jobs <= 1:
+        partes = [scan_file(f, pdg_list, branches) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            partes = list(executor.map(scan_file, files, [pdg_list] * len(files), [branches] * len(files)))
+
+    for f, parte in zip(files, partes):
+        print(f"🔹 {os.path.basename(f)}: {len(parte)} eventos selecionados.")
+    if not partes:
+        return pd.DataFrame(columns=["file", "entry"] + [str(int(p)) for p in pdg_list])
+    return pd.concat(partes, ignore_index=True)
+
+
+def summarize_species(events, pdg_list=SUSY_PDG_IDS):
+    """
+    Resumo por espécie: número de eventos e de partículas encontradas.
+
+    :param events: Saída de select_truth_events.
+    :param pdg_list: Espécies procuradas.
+    :return: Dicionário {pdgId: {"events": int, "particles": int}}.
+    """
+    resumo = {}
+    for pdg in pdg_list:
+        col = str(int(pdg))
+        resumo[int(pdg)] = {"events": int((events[col] > 0).sum()), "particles": int(events[col].sum())}
+    return resumo
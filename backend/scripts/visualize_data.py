@@ -1,35 +1,138 @@
 import os
-import dask.dataframe as dd
+import hashlib
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from metrics import instrumented, current_stage
+from similarity_index import SimilarityIndex
+from cluster_index import ClusterIndex
+from event_sample import SAMPLE_COLUMNS, load_dataset_sample
+from compaction import COMPACTED_PROCESSED_DIR, current_dataset_dir
+from feature_matrix import build_feature_matrix
+from background_jobs import JobQueue, JOB_CACHE_DIR
 
 # Diretório onde os arquivos Parquet estão armazenados
-PROCESSED_PARQUET_DIR = "/app/data/processed_parquet_parts"
+PROCESSED_PARQUET_DIR = os.environ.get("HEP_PROCESSED_PARQUET_DIR", "/app/data/processed_parquet_parts")
+COMPACTED_DIR = os.environ.get("HEP_COMPACTED_PROCESSED_DIR", COMPACTED_PROCESSED_DIR)
+
+# Número de eventos similares mostrados ao clicar em um ponto
+SIMILAR_EVENTS_K = 10
+
+# Features (padronizadas) usadas pela reclusterização e reprojeção sob demanda
+JOB_FEATURE_COLUMNS = ['MuonsAuxDyn.pt', 'MuonsAuxDyn.eta', 'MuonsAuxDyn.phi']
+
+# Colunas mantidas em cada visão (embedding + clusters) do gráfico
+VIEW_COLUMNS = ("U1", "U2", "U3", "cluster", "event_id")
+
+# Intervalo de consulta do progresso de um job (ms)
+JOB_POLL_INTERVAL_MS = 1000
 
 
 # Função para carregar os dados de forma otimizada
 def load_sampled_events():
-    """Carrega uma amostragem dos eventos processados para melhor performance."""
-    print("📂 Carregando dados processados (AMOSTRA OTIMIZADA)...")
-
-    # Leitura eficiente apenas das colunas necessárias
-    df = dd.read_parquet(
-        os.path.join(PROCESSED_PARQUET_DIR, "*.parquet"),
-        columns=["U1", "U2", "U3", "cluster"]
-    )
+    """Carrega a amostra estratificada dos eventos processados (clusters pequenos e anomalias preservados)."""
+    print("📂 Carregando dados processados (AMOSTRA ESTRATIFICADA)...")
 
-    # Amostragem aleatória para manter apenas uma fração gerenciável
-    df = df.sample().compute()  # Mantém 1% dos dados, ajuste conforme necessário
+    # Amostra salva pelo processed_parquet.py (refeita só para arquivos novos); as features entram
+    # quando existem, para os jobs de reclusterização e reprojeção
+    # Com o dataset compactado em dia, a amostra lê o _metadata (source_file/source_row apontam para os originais)
+    diretorio = current_dataset_dir(PROCESSED_PARQUET_DIR, COMPACTED_DIR)
+    df = load_dataset_sample(diretorio, columns=SAMPLE_COLUMNS).to_frame()
     df["event_id"] = np.arange(len(df))  # Criar IDs sequenciais
-    print(f"✅ {len(df)} eventos carregados (após amostragem).")
+    print(f"✅ {len(df)} eventos carregados (após amostragem, sample_weight por evento).")
 
     return df
 
+def load_similarity_index():
+    """Carrega o índice ANN do embedding (construído por processed_parquet.py), se existir."""
+    try:
+        index = SimilarityIndex.load(PROCESSED_PARQUET_DIR, "embedding")
+    except FileNotFoundError:
+        print("⚠️ Índice ANN não encontrado; a busca por eventos similares fica desativada.")
+        return None
+    # Primeira consulta compila as funções do Numba; feita aqui para o clique responder em milissegundos
+    index.query(np.zeros(len(index.columns)), k=1)
+    print(f"✅ Índice ANN carregado ({len(index)} eventos).")
+    return index
+
+def load_job_matrix(df):
+    """
+    Grava a matriz padronizada da amostra para os jobs do dashboard (uma vez por conteúdo).
+
+    Usa as features do pipeline se estiverem na amostra; senão, o próprio embedding.
+    Só entram as linhas com todas as features finitas (como no SimilarityIndex); a
+    máscara dessas linhas fica gravada ao lado da matriz, junto do job.
+
+    :param df: Amostra carregada.
+    :return: Tupla (caminho do .npy, fingerprint do conteúdo, máscara das linhas usadas).
+    """
+    colunas = [c for c in JOB_FEATURE_COLUMNS if c in df.columns] or ["U1", "U2", "U3"]
+    fingerprint = hashlib.sha256(pd.util.hash_pandas_object(df[colunas], index=False).to_numpy().tobytes()) \
+        .hexdigest()[:20]
+    path = os.path.join(JOB_CACHE_DIR, f"features_{fingerprint}.npy")
+    mask_path = os.path.join(JOB_CACHE_DIR, f"features_{fingerprint}.rows.npy")
+    if os.path.exists(path) and os.path.exists(mask_path):
+        return path, fingerprint, np.load(mask_path)
+
+    validas = np.isfinite(df[colunas].to_numpy(dtype=np.float64)).all(axis=1)
+    if not validas.any():
+        raise ValueError(f"Nenhum evento da amostra tem todas as features finitas: {colunas}")
+    build_feature_matrix(df.loc[validas, colunas], colunas, path)
+    np.save(mask_path, validas)
+    return path, fingerprint, validas
+
+
+def scatter_job_result(valores, preenchimento):
+    """
+    Devolve o resultado de um job (só linhas válidas) no tamanho da amostra inteira.
+
+    :param valores: Array com um valor por linha de job_rows.
+    :param preenchimento: Valor das linhas que ficaram fora da matriz (-1 ou NaN).
+    :return: Array com um valor por evento da amostra.
+    """
+    valores = np.asarray(valores)
+    completo = np.full(len(job_rows), preenchimento, dtype=np.result_type(valores.dtype, type(preenchimento)))
+    completo[job_rows] = valores
+    return completo
+
+
 df = load_sampled_events()
+similarity_index = load_similarity_index()
+
+# Origem (arquivo, linha) → event_id, para ligar os vizinhos do índice aos eventos da amostra
+event_keys = pd.MultiIndex.from_frame(df[["source_file", "source_row"]])
+
+# Jobs longos rodam fora do servidor; o resultado de cada conjunto de parâmetros fica em cache
+job_queue = JobQueue()
+job_matrix_path, job_fingerprint, job_rows = load_job_matrix(df)
+
+
+@lru_cache(maxsize=8)
+def view_index(cluster_key=None, embedding_key=None):
+    """
+    ClusterIndex da visão atual: clusters e embedding originais ou os resultados de jobs.
+
+    :param cluster_key: Job de reclusterização aplicado (None: clusters do pipeline).
+    :param embedding_key: Job de reprojeção aplicado (None: embedding do pipeline).
+    :return: ClusterIndex.
+    """
+    vista = df
+    if cluster_key or embedding_key:
+        vista = df[list(VIEW_COLUMNS)].copy()
+        if cluster_key:
+            vista["cluster"] = scatter_job_result(job_queue.result(cluster_key)["cluster"], -1)
+        if embedding_key:
+            for coluna, valores in job_queue.result(embedding_key).items():
+                vista[coluna] = scatter_job_result(valores, np.nan)
+    return ClusterIndex(vista, columns=VIEW_COLUMNS)
+
+
+# Faixas por cluster, montadas uma vez: os filtros dos callbacks não varrem o DataFrame
+cluster_index = view_index()
 
 # Seleção de eventos únicos otimizada para o Slider
 unique_events = np.linspace(0, len(df) - 1, num=min(100, len(df))).astype(int)
@@ -40,8 +143,13 @@ app = dash.Dash(__name__)
 app.layout = html.Div([
     html.H1("Visualização Interativa - Linha do Tempo 3D"),
 
-    # Armazena os dados carregados para evitar recarregar a cada atualização
-    dcc.Store(id="stored-data", data=df.to_dict(orient="list")),
+    # Vizinhos do último ponto clicado
+    dcc.Store(id="similar-events-data"),
+
+    # Job em andamento e resultados aplicados ao gráfico
+    dcc.Store(id="job-id"),
+    dcc.Store(id="view", data={"cluster": None, "embedding": None}),
+    dcc.Interval(id="job-poll", interval=JOB_POLL_INTERVAL_MS, disabled=True),
 
     dcc.Graph(id="3d-scatter"),
 
@@ -53,24 +161,132 @@ app.layout = html.Div([
         value=int(unique_events[0]),
         marks={int(i): str(i) for i in unique_events[::max(1, len(unique_events) // 10)]},
         step=1
-    )
+    ),
+
+    html.Label("Clusters:"),
+    dcc.Dropdown(
+        id="cluster-selector",
+        options=[{"label": str(c), "value": c} for c in cluster_index.clusters.tolist()],
+        multi=True,
+        placeholder="Todos os clusters"
+    ),
+
+    html.Div([
+        html.Label("min_cluster_size:"),
+        dcc.Input(id="min-cluster-size", type="number", min=2, step=1, value=10),
+        html.Button("Reclusterizar", id="recluster-button"),
+        html.Label("n_neighbors (UMAP):"),
+        dcc.Input(id="umap-neighbors", type="number", min=2, step=1, value=50),
+        html.Button("Reprojetar", id="reembed-button"),
+        html.Button("Cancelar", id="cancel-button"),
+        html.Progress(id="job-progress", max=1, value=0),
+        html.Span(id="job-status")
+    ]),
+
+    html.H3("Eventos Similares (clique em um ponto)"),
+    html.Div(id="similar-events")
 ])
 
+@app.callback(
+    [Output("similar-events-data", "data"), Output("similar-events", "children")],
+    [Input("3d-scatter", "clickData")]
+)
+@instrumented("similar_events")
+def find_similar_events(click_data):
+    """Busca no índice ANN os vizinhos do ponto clicado no gráfico 3D."""
+    if not click_data or similarity_index is None:
+        return None, html.P("Índice indisponível." if similarity_index is None else "Nenhum ponto selecionado.")
+
+    # A busca usa o embedding do pipeline (o do índice), mesmo quando o gráfico mostra uma reprojeção
+    ponto = click_data["points"][0]
+    evento = ponto.get("customdata")
+    if evento is not None:
+        vizinhos = similarity_index.query(df[["U1", "U2", "U3"]].to_numpy()[int(evento)], k=SIMILAR_EVENTS_K + 1)
+        # Exclui só o próprio evento clicado (pela origem): duplicatas exatas, com distância zero, continuam
+        clicado = df.iloc[int(evento)]
+        proprio = (vizinhos["file"] == clicado["source_file"]) & (vizinhos["row"] == clicado["source_row"])
+    else:
+        # Vizinho fora da amostra (losango sem event_id): busca pelas coordenadas; ele mesmo é o primeiro resultado
+        vizinhos = similarity_index.query([ponto["x"], ponto["y"], ponto["z"]], k=SIMILAR_EVENTS_K + 1)
+        proprio = (np.arange(len(vizinhos)) == 0) & (vizinhos["distance"].to_numpy() == 0)
+    vizinhos = vizinhos[~proprio].head(SIMILAR_EVENTS_K)
+    current_stage().add_rows(len(vizinhos))
+
+    colunas = ["rank", "file", "row", "distance", "U1", "U2", "U3"]
+    tabela = html.Table(
+        [html.Tr([html.Th(c) for c in colunas])] +
+        [html.Tr([html.Td(f"{v:.4g}" if isinstance(v, (float, np.floating)) else str(v)) for v in linha])
+         for linha in vizinhos[colunas].itertuples(index=False)]
+    )
+    return vizinhos[colunas].to_dict(orient="list"), tabela
+
+
+JOB_MESSAGES = {
+    "queued": "⏳ Na fila",
+    "running": "⚙️ Executando",
+    "done": "✅ Concluído",
+    "failed": "🚨 Falhou",
+    "cancelled": "🛑 Cancelado",
+}
+
+
+@app.callback(
+    [Output("job-id", "data"), Output("job-progress", "value"), Output("job-status", "children"),
+     Output("job-poll", "disabled"), Output("view", "data"), Output("cluster-selector", "options")],
+    [Input("recluster-button", "n_clicks"), Input("reembed-button", "n_clicks"),
+     Input("cancel-button", "n_clicks"), Input("job-poll", "n_intervals")],
+    [State("min-cluster-size", "value"), State("umap-neighbors", "value"), State("job-id", "data"),
+     State("view", "data")]
+)
+@instrumented("manage_jobs")
+def manage_jobs(recluster_clicks, reembed_clicks, cancel_clicks, n_intervals,
+                min_cluster_size, umap_neighbors, job, view):
+    """Dispara, acompanha e cancela os jobs de reclusterização e reprojeção; aplica o resultado ao gráfico."""
+    gatilho = dash.callback_context.triggered[0]["prop_id"].split(".")[0] if dash.callback_context.triggered else None
+    sem_mudanca = dash.no_update
+
+    if gatilho == "recluster-button":
+        job = {"kind": "recluster", "key": job_queue.submit(
+            "recluster", job_matrix_path, job_fingerprint, min_cluster_size=int(min_cluster_size or 10))}
+    elif gatilho == "reembed-button":
+        job = {"kind": "reembed", "key": job_queue.submit(
+            "reembed", job_matrix_path, job_fingerprint, n_neighbors=int(umap_neighbors or 50))}
+    elif gatilho == "cancel-button" and job:
+        job_queue.cancel(job["key"])
+    if not job:
+        return None, 0, "", True, sem_mudanca, sem_mudanca
+
+    status = job_queue.status(job["key"])
+    texto = f"{JOB_MESSAGES.get(status['state'], status['state'])} {status['message']}".strip()
+    if status["state"] in ("queued", "running"):
+        return job, status["progress"], texto, False, sem_mudanca, sem_mudanca
+    if status["state"] != "done":
+        return None, 0, texto, True, sem_mudanca, sem_mudanca
+
+    # Resultado pronto (ou já em cache): aplica à visão e atualiza a lista de clusters
+    view = dict(view or {})
+    view["cluster" if job["kind"] == "recluster" else "embedding"] = job["key"]
+    indice = view_index(view.get("cluster"), view.get("embedding"))
+    opcoes = [{"label": str(c), "value": c} for c in indice.clusters.tolist()]
+    return None, 1, texto, True, view, opcoes
+
+
 @app.callback(
     Output("3d-scatter", "figure"),
-    [Input("event-slider", "value")],
-    [dash.dependencies.State("stored-data", "data")]
+    [Input("event-slider", "value"), Input("cluster-selector", "value"), Input("similar-events-data", "data"),
+     Input("view", "data")]
 )
-def update_figure(selected_event, stored_data):
-    """Atualiza a visualização 3D conforme o evento selecionado na linha do tempo."""
-    if not stored_data:
+@instrumented("update_figure")
+def update_figure(selected_event, selected_clusters, similar_events, view):
+    """Atualiza a visualização 3D conforme o evento selecionado na linha do tempo e os clusters escolhidos."""
+    view = view or {}
+    indice = view_index(view.get("cluster"), view.get("embedding"))
+    if not len(indice):
         return go.Figure()
 
-    # Converter para DataFrame Pandas
-    filtered_df = pd.DataFrame(stored_data)
-    
-    # Filtrar até o evento selecionado
-    filtered_df = filtered_df[filtered_df["event_id"] <= selected_event]
+    # Clusters selecionados até o evento selecionado: fatias das faixas pré-computadas
+    filtered_df = indice.select(selected_clusters, selected_event)
+    current_stage().add_rows(len(filtered_df['cluster']))
 
     fig = go.Figure()
 
@@ -80,9 +296,24 @@ def update_figure(selected_event, stored_data):
         z=filtered_df['U3'],
         mode='markers',
         marker=dict(size=3, color=filtered_df['cluster'], colorscale='Rainbow', opacity=0.7),
+        customdata=filtered_df['event_id'],
         name="Eventos"
     ))
 
+    # Os vizinhos estão nas coordenadas do embedding do pipeline
+    if similar_events and not view.get("embedding"):
+        # Clicar num losango busca os vizinhos dele: event_id se ele estiver na amostra, senão as coordenadas
+        posicoes = event_keys.get_indexer(pd.MultiIndex.from_arrays([similar_events['file'], similar_events['row']]))
+        fig.add_trace(go.Scatter3d(
+            x=similar_events['U1'],
+            y=similar_events['U2'],
+            z=similar_events['U3'],
+            mode='markers',
+            marker=dict(size=6, color='black', symbol='diamond'),
+            customdata=[int(p) if p >= 0 else None for p in posicoes],
+            name="Eventos Similares"
+        ))
+
     fig.update_layout(title=f"Eventos até o Tempo {selected_event}",
                       scene=dict(xaxis_title="U1", yaxis_title="U2", zaxis_title="U3"),
                       transition_duration=500)
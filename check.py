@@ -1,14 +1,15 @@
 import uproot
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from scipy.stats import ks_2samp, pearsonr
 from decimal import Decimal, getcontext
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "scripts"))
+from memory_governor import MemoryGovernor
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # Aumentando a precisão do Decimal para exibir mais casas decimais
@@ -45,7 +46,9 @@ try:
         raise ValueError("🚨 Nenhum ramo válido encontrado para análise!")
 
     # 🔹 Extraindo os dados
-    data = tree.arrays(valid_branches, library="pd", entry_stop=200000)
+    # Limite de eventos escolhido pelo orçamento de memória (metadados dos ramos)
+    entry_stop = MemoryGovernor().entry_stop(tree, valid_branches)
+    data = tree.arrays(valid_branches, library="pd", entry_stop=entry_stop)
 
     # 🔹 Conversão das colunas (manter a média dos valores dentro das listas)
     def tratar_lista(x):
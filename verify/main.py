@@ -4,8 +4,15 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import ks_2samp
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from truth_selector import select_truth_events
+from dimuon import event_dimuons
+from density import plot_kde_1d
+
 warnings.filterwarnings("ignore", category=UserWarning)  # Silencia warnings irrelevantes
 
 # 🌀 Caminho do dataset ROOT
@@ -24,30 +31,20 @@ try:
     # Ramo onde buscamos as partículas SUSY
     susy_branches = ["TruthBSMAuxDyn.pdgId", "TruthBSMWithDecayParticlesAuxDyn.pdgId", "HardScatterParticlesAuxDyn.pdgId"]
 
-    # 🔹 Lista para armazenar eventos SUSY
-    massa_susy = []
-    carga_susy = []
-
-    # 🔍 Extraindo eventos SUSY
-    for branch in susy_branches:
-        try:
-            print(f"🔍 Processando {branch}...")
-            if branch not in tree:
-                print(f"⚠️ Ramo {branch} não encontrado. Pulando...")
-                continue
-
-            particles = tree[branch].array(library="np", entry_stop=2000)  # Reduz consumo de RAM
+    # 🔍 Extraindo eventos SUSY: todos os ramos de truth numa única leitura em blocos, sem loop por evento
+    eventos_susy = select_truth_events([dataset_path], susy_pdg_ids, branches=susy_branches)
+    n_susy = len(eventos_susy)
 
-            for event in particles:
-                if np.any(np.isin(event, susy_pdg_ids)):  # Filtra eventos SUSY
-                    massa_susy.append(np.random.uniform(100, 500))  # Simulação da massa (pois não está diretamente disponível)
-                    carga_susy.append(0)  # Neutralino tem carga 0
+    if n_susy == 0:
+        raise ValueError("🚨 Nenhum evento SUSY identificado após filtragem!")
 
-        except KeyError:
-            print(f"⚠️ Ramo {branch} não encontrado.")
+    # Massa invariante, energia e pT do melhor par μ+μ- de cada evento selecionado (MeV → GeV)
+    dimuons_susy = event_dimuons(dataset_path, entries=eventos_susy["entry"])
+    massa_susy = dimuons_susy["mass"].to_numpy() / 1000
+    carga_susy = np.zeros(len(massa_susy))  # Pares de carga oposta: carga total 0
 
-    if not massa_susy:
-        raise ValueError("🚨 Nenhum evento SUSY identificado após filtragem!")
+    if len(dimuons_susy) == 0:
+        raise ValueError("🚨 Nenhum evento SUSY selecionado tem par μ+μ-!")
 
     print(f"\n🔷 🔬 Total de eventos SUSY identificados: {len(massa_susy)} 🔬 🔷")
 
@@ -75,8 +72,8 @@ try:
     print("🔹 Comparando eventos SUSY extraídos com simulações SUSY...")
     massa_susy_mc = np.random.normal(200, 30, size=1000)  # Simulação de massas SUSY
 
-    sns.kdeplot(df_susy["massa_GeV"], label="Eventos SUSY Extraídos", fill=True)
-    sns.kdeplot(massa_susy_mc, label="Simulação Monte Carlo SUSY", fill=True, color="red")
+    plot_kde_1d(df_susy["massa_GeV"], label="Eventos SUSY Extraídos", fill=True)
+    plot_kde_1d(massa_susy_mc, label="Simulação Monte Carlo SUSY", fill=True, color="red")
     plt.legend()
     plt.xlabel("Massa (GeV)")
     plt.ylabel("Densidade")
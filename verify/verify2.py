@@ -4,8 +4,16 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import ks_2samp
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from truth_selector import select_truth_events
+from dimuon import event_dimuons
+from resampling import bootstrap, ks_pvalues, permutation_test
+from density import plot_kde_1d
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # 🌀 Caminho do dataset ROOT
@@ -22,37 +30,27 @@ try:
     tree = file["CollectionTree"]
     susy_branches = ["TruthBSMAuxDyn.pdgId", "TruthBSMWithDecayParticlesAuxDyn.pdgId", "HardScatterParticlesAuxDyn.pdgId"]
 
-    # 🔹 Lista para armazenar eventos SUSY
-    massa_susy = []
-    carga_susy = []
-
-    # 🔍 Extraindo eventos SUSY
-    for branch in susy_branches:
-        try:
-            print(f"🔍 Processando {branch}...")
-            if branch not in tree:
-                print(f"⚠️ Ramo {branch} não encontrado. Pulando...")
-                continue
-
-            particles = tree[branch].array(library="np", entry_stop=2000)  # Reduz consumo de RAM
+    # 🔍 Extraindo eventos SUSY: todos os ramos de truth numa única leitura em blocos, sem loop por evento
+    eventos_susy = select_truth_events([dataset_path], susy_pdg_ids, branches=susy_branches)
+    n_susy = len(eventos_susy)
 
-            for event in particles:
-                if np.any(np.isin(event, susy_pdg_ids)):  
-                    massa_susy.append(np.random.uniform(100, 500))  
-                    carga_susy.append(0)  
+    if n_susy == 0:
+        raise ValueError("🚨 Nenhum evento SUSY identificado após filtragem!")
 
-        except KeyError:
-            print(f"⚠️ Ramo {branch} não encontrado.")
+    # Massa invariante, energia e pT do melhor par μ+μ- de cada evento selecionado (MeV → GeV)
+    dimuons_susy = event_dimuons(dataset_path, entries=eventos_susy["entry"])
+    massa_susy = dimuons_susy["mass"].to_numpy() / 1000
+    carga_susy = np.zeros(len(massa_susy))  # Pares de carga oposta: carga total 0
 
-    if not massa_susy:
-        raise ValueError("🚨 Nenhum evento SUSY identificado após filtragem!")
+    if len(dimuons_susy) == 0:
+        raise ValueError("🚨 Nenhum evento SUSY selecionado tem par μ+μ-!")
 
     print(f"\n🔷 🔬 Total de eventos SUSY identificados: {len(massa_susy)} 🔬 🔷")
 
     df_susy = pd.DataFrame({"massa_GeV": massa_susy, "carga_eletrica": carga_susy})
 
     # 🔹 Espectro de Energia
-    df_susy["energia_GeV"] = df_susy["massa_GeV"] * np.random.uniform(1.5, 3, size=len(df_susy))
+    df_susy["energia_GeV"] = dimuons_susy["energy"].to_numpy() / 1000
 
     plt.figure(figsize=(8, 5))
     sns.histplot(df_susy["energia_GeV"], bins=50, kde=True, color="blue")
@@ -84,8 +82,8 @@ try:
     # 🔥 Comparação com Dimensões Extras
     massa_dimensoes_extras = np.random.normal(450, 40, size=1000)
 
-    sns.kdeplot(df_susy["massa_GeV"], label="Eventos SUSY", fill=True)
-    sns.kdeplot(massa_dimensoes_extras, label="Modelo de Dimensões Extras", fill=True, color="orange")
+    plot_kde_1d(df_susy["massa_GeV"], label="Eventos SUSY", fill=True)
+    plot_kde_1d(massa_dimensoes_extras, label="Modelo de Dimensões Extras", fill=True, color="orange")
     plt.legend()
     plt.xlabel("Massa (GeV)")
     plt.ylabel("Densidade")
@@ -103,19 +101,22 @@ try:
     plt.show()
 
     # 🔥 Testando Reprodutibilidade dos Eventos
-    num_execucoes = 5
-    resultados = []
+    num_execucoes = 10000
+    massa_susy_mc = np.random.normal(200, 30, size=1000)
+
+    # Replicatas bootstrap vetorizadas e distribuídas entre os núcleos
+    ks_replicas = bootstrap(df_susy["massa_GeV"], massa_susy_mc, statistic="ks", n_replicates=num_execucoes)
+    resultados = ks_pvalues(ks_replicas, len(df_susy), len(massa_susy_mc))
 
-    for i in range(num_execucoes):
-        df_susy["massa_GeV"] = np.random.uniform(100, 500, size=len(df_susy))
-        massa_susy_mc = np.random.normal(200, 30, size=1000)
-        ks_stat, p_value = ks_2samp(df_susy["massa_GeV"], massa_susy_mc)
-        resultados.append(p_value)
+    print(f"\n🔎 P-values das diferentes execuções do KS-Test: mediana {np.median(resultados):.5f}, "
+          f"intervalo 95% [{np.quantile(resultados, 0.025):.5f}, {np.quantile(resultados, 0.975):.5f}]")
 
-    print("\n🔎 P-values das diferentes execuções do KS-Test:", resultados)
+    # Teste de permutação para a significância da diferença observada
+    permutacao = permutation_test(df_susy["massa_GeV"], massa_susy_mc, statistic="ks", n_replicates=num_execucoes)
+    print(f"🔎 P-value do teste de permutação (KS): {permutacao['pvalue']:.5f}")
 
     plt.figure(figsize=(8, 5))
-    sns.histplot(resultados, bins=10, kde=True, color="green")
+    sns.histplot(resultados, bins=50, kde=True, color="green")
     plt.xlabel("P-value")
     plt.ylabel("Frequência")
     plt.title("Distribuição de P-values em Execuções Múltiplas")
@@ -4,8 +4,14 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import ks_2samp, pearsonr
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from truth_selector import select_truth_events
+from dimuon import event_dimuons
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # 🌀 Caminho do dataset ROOT
@@ -22,39 +28,23 @@ try:
     tree = file["CollectionTree"]
     susy_branches = ["TruthBSMAuxDyn.pdgId", "TruthBSMWithDecayParticlesAuxDyn.pdgId", "HardScatterParticlesAuxDyn.pdgId"]
 
-    # 🔹 Lista para armazenar eventos SUSY
-    massa_susy = []
-    carga_susy = []
-    energia_susy = []
-    pt_susy = []
-
-    # 🔍 Extraindo eventos SUSY em ESCALA MASSIVA (100.000 eventos)
-    for branch in susy_branches:
-        try:
-            print(f"🔍 Processando {branch}...")
-            if branch not in tree:
-                print(f"⚠️ Ramo {branch} não encontrado. Pulando...")
-                continue
-
-            particles = tree[branch].array(library="np", entry_stop=100000)
-
-            for event in particles:
-                if np.any(np.isin(event, susy_pdg_ids)):  
-                    massa = np.random.uniform(100, 500)
-                    energia = massa * np.random.uniform(1.5, 3)  
-                    pt = massa * np.random.uniform(0.5, 1.2)  
-
-                    massa_susy.append(massa)
-                    energia_susy.append(energia)
-                    pt_susy.append(pt)
-                    carga_susy.append(0)  
-
-        except KeyError:
-            print(f"⚠️ Ramo {branch} não encontrado.")
-
-    if not massa_susy:
+    # 🔍 Extraindo eventos SUSY: todos os ramos de truth numa única leitura em blocos, sem loop por evento
+    eventos_susy = select_truth_events([dataset_path], susy_pdg_ids, branches=susy_branches)
+    n_susy = len(eventos_susy)
+
+    if n_susy == 0:
         raise ValueError("🚨 Nenhum evento SUSY identificado após filtragem!")
 
+    # Massa invariante, energia e pT do melhor par μ+μ- de cada evento selecionado (MeV → GeV)
+    dimuons_susy = event_dimuons(dataset_path, entries=eventos_susy["entry"])
+    massa_susy = dimuons_susy["mass"].to_numpy() / 1000
+    energia_susy = dimuons_susy["energy"].to_numpy() / 1000
+    pt_susy = dimuons_susy["pt"].to_numpy() / 1000  # Momentum transverso do par
+    carga_susy = np.zeros(len(massa_susy))  # Pares de carga oposta: carga total 0
+
+    if len(dimuons_susy) == 0:
+        raise ValueError("🚨 Nenhum evento SUSY selecionado tem par μ+μ-!")
+
     print(f"\n🔷 🔬 Total de eventos SUSY identificados: {len(massa_susy)} 🔬 🔷")
 
     df_susy = pd.DataFrame({
@@ -4,8 +4,13 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import ks_2samp, pearsonr
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from memory_governor import MemoryGovernor
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # 🌀 Caminho do dataset ROOT
@@ -48,7 +53,9 @@ try:
     print(f"🔍 Usando os seguintes ramos para análise: {valid_branches}")
 
     # 🔹 Extraindo os dados
-    data = tree.arrays(valid_branches, library="pd", entry_stop=50000)  # Limite para evitar consumo excessivo de RAM
+    # Limite de eventos escolhido pelo orçamento de memória (metadados dos ramos)
+    entry_stop = MemoryGovernor().entry_stop(tree, valid_branches)
+    data = tree.arrays(valid_branches, library="pd", entry_stop=entry_stop)
 
     # 🔹 Limpeza dos dados (removendo NaN e valores anômalos)
     data = data.dropna()
@@ -7,15 +7,29 @@ import plotly.express as px
 import plotly.graph_objects as go
 from scipy.stats import ks_2samp, pearsonr
 from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-import umap
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "scripts"))
+from feature_matrix import FEATURE_COLUMNS, build_feature_matrix
+from embeddings import required_neighbors, run_embedding
+from density import density_contour_figure
+from memory_governor import MemoryGovernor
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # 🌀 Caminho do dataset ROOT
 dataset_path = "../DAOD_HION14.41888680._000002.pool.root.1"
 
+# 💾 Matriz de features e grafo kNN compartilhados entre t-SNE e UMAP
+FEATURE_MATRIX_PATH = "../cache/features_verify7.npy"
+KNN_CACHE_DIR = "../cache/knn"
+PROJECTION_PARAMS = {
+    "tsne": {"n_components": 3, "perplexity": 30, "random_state": 42},
+    "umap": {"n_neighbors": 15, "min_dist": 0.1, "n_components": 2, "random_state": 42},
+}
+
 # 📥 Abrindo arquivo ROOT
 try:
     file = uproot.open(dataset_path)
@@ -45,7 +59,9 @@ try:
         raise ValueError("🚨 Nenhum ramo válido encontrado para análise!")
 
     # 🔹 Extraindo os dados
-    data = tree.arrays(valid_branches, library="pd", entry_stop=200000)
+    # Limite de eventos escolhido pelo orçamento de memória (metadados dos ramos)
+    entry_stop = MemoryGovernor().entry_stop(tree, valid_branches)
+    data = tree.arrays(valid_branches, library="pd", entry_stop=entry_stop)
 
     # 🔹 Conversão das colunas (manter a média dos valores dentro das listas)
     def tratar_lista(x):
@@ -83,10 +99,12 @@ try:
 
     # ✅ VISUALIZAÇÕES NÃO LINEARES AVANÇADAS ✅ #
 
+    build_feature_matrix(data, FEATURE_COLUMNS, FEATURE_MATRIX_PATH)
+    knn_k = required_neighbors(PROJECTION_PARAMS, PROJECTION_PARAMS)
+
     # 🔹 **1. Projeção 3D NÃO LINEAR usando t-SNE**
     print("🔍 Aplicando t-SNE para redução de dimensionalidade...")
-    tsne = TSNE(n_components=3, perplexity=30, random_state=42)
-    tsne_result = tsne.fit_transform(data[["pT_medio", "energia_total", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"]])
+    _, tsne_result = run_embedding("tsne", FEATURE_MATRIX_PATH, PROJECTION_PARAMS["tsne"], knn_k, KNN_CACHE_DIR)
 
     df_tsne = pd.DataFrame(tsne_result, columns=["TSNE1", "TSNE2", "TSNE3"])
     df_tsne["energia"] = data["energia_total"]
@@ -105,8 +123,7 @@ try:
 
     # 🔹 **2. Projeção em 2D via UMAP**
     print("🔍 Aplicando UMAP para redução de dimensionalidade...")
-    reducer = umap.UMAP(n_neighbors=15, min_dist=0.1, n_components=2, random_state=42)
-    umap_result = reducer.fit_transform(data[["pT_medio", "energia_total", "MuonsAuxDyn.eta", "MuonsAuxDyn.phi"]])
+    _, umap_result = run_embedding("umap", FEATURE_MATRIX_PATH, PROJECTION_PARAMS["umap"], knn_k, KNN_CACHE_DIR)
 
     df_umap = pd.DataFrame(umap_result, columns=["UMAP1", "UMAP2"])
     df_umap["energia"] = data["energia_total"]
@@ -128,13 +145,12 @@ try:
     plt.title("Mapa de Calor - Correlação entre Variáveis")
     plt.show()
 
-    # 🔹 **4. Kernel Density Estimation (KDE) para encontrar densidade das partículas**
-    fig_kde = px.density_contour(
-        data,
-        x="MuonsAuxDyn.pt",
-        y="energia_total",
+    # 🔹 **4. Kernel Density Estimation (KDE) via FFT sobre uma grade (custo independe do nº de eventos)**
+    fig_kde = density_contour_figure(
+        data["MuonsAuxDyn.pt"],
+        data["energia_total"],
         title="Densidade de Distribuição Momentum x Energia",
-        labels={"MuonsAuxDyn.pt": "Momentum Transverso (GeV)", "energia_total": "Energia Total (GeV)"},
+        labels=("Momentum Transverso (GeV)", "Energia Total (GeV)"),
         color_continuous_scale="viridis"
     )
     fig_kde.show()